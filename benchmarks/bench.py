@@ -0,0 +1,237 @@
+"""
+オフラインベンチマーク（ローカル偽 API に対して取得・集計の経路を計測する）
+
+    python -m benchmarks.bench                      # 全シナリオ
+    python -m benchmarks.bench --scenario cohort --latency-ms 80 --json bench.json
+
+シナリオごとに空のキャッシュ・台帳で「cold」を1回、続けて同じ状態で「warm」を --repeat 回実行し、
+経過時間・API 呼び出し数（偽サーバ側で数えた実数）・消費ユニット・キャッシュヒット・Python のピークメモリを出す。
+startup シナリオは毎回新しいプロセスで import から最初の単体集計までを計り、import 時間（import_s）も出す。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from vtuber_analyzer import (
+    RECENT_WINDOWS,
+    RunUsage,
+    analyze_cohort,
+    catalog_distribution,
+    compute_channel_metrics,
+    configure,
+    crawl_catalog,
+    current_run,
+    fetch_channel_data,
+    resolve_channels,
+)
+from vtuber_analyzer.cache import get_response_cache, get_video_stats_cache
+from vtuber_analyzer.history import get_snapshot_store
+from vtuber_analyzer.keypool import get_key_pool
+from vtuber_analyzer.quota import get_quota_ledger
+from vtuber_analyzer.resolver import get_alias_index
+from vtuber_analyzer.scheduler import get_request_scheduler
+
+from .fake_api import FakeApiServer, FakeYouTubeData, synthetic_channel_id
+
+API_KEY = "bench-key"
+SCENARIOS = ("startup", "single", "catalog", "cohort")
+
+
+def _use_fresh_state(workdir: str, requests_per_second: float) -> None:
+    """
+    キャッシュ・台帳・履歴を workdir 以下の新しいファイルに向け、プロセス内で共有しているインスタンスを作り直す
+    """
+    configure(
+        cache_db_path=os.path.join(workdir, "cache.sqlite3"),
+        quota_db_path=os.path.join(workdir, "quota.sqlite3"),
+        history_db_path=os.path.join(workdir, "history.sqlite3"),
+        alias_db_path=os.path.join(workdir, "aliases.sqlite3"),
+        daily_quota_budget=10**9,
+        requests_per_second=requests_per_second,
+    )
+    for getter in (
+        get_response_cache,
+        get_video_stats_cache,
+        get_snapshot_store,
+        get_quota_ledger,
+        get_alias_index,
+        get_key_pool,
+        get_request_scheduler,
+    ):
+        getter.cache_clear()
+
+
+def _measure(server: FakeApiServer, fn: Callable[[], object]) -> Dict:
+    usage = RunUsage()
+    token = current_run.set(usage)
+    calls_before = server.total_calls()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        fn()
+    finally:
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        current_run.reset(token)
+    totals = usage.totals()
+    return {
+        "wall_s": round(wall, 3),
+        "api_calls": server.total_calls() - calls_before,
+        "units": totals["units"],
+        "cache_hits": totals["cache_hits"],
+        "errors": totals["errors"],
+        "peak_mem_mb": round(peak / 2**20, 2),
+    }
+
+
+# ===== シナリオ =====
+def scenario_single(args) -> Callable[[], object]:
+    cid = synthetic_channel_id(0)
+
+    def run():
+        data = fetch_channel_data(cid, API_KEY, True)
+        return compute_channel_metrics(data["basic"], data["timeline"], len(data["playlists"]))
+
+    return run
+
+
+def scenario_catalog(args) -> Callable[[], object]:
+    cid = synthetic_channel_id(1)
+
+    def run():
+        return catalog_distribution(crawl_catalog(cid, API_KEY))
+
+    return run
+
+
+def scenario_cohort(args) -> Callable[[], object]:
+    # 半分は UC〜、半分は @handle で渡して解決の経路も通す
+    entries = [
+        synthetic_channel_id(i) if i % 2 == 0 else f"@ch{i}"
+        for i in range(args.cohort_size)
+    ]
+
+    def run():
+        channel_ids, _ = resolve_channels(entries, API_KEY)
+        return analyze_cohort(channel_ids, API_KEY, include_playlists=True, store=get_snapshot_store())
+
+    return run
+
+
+def _measure_startup(server: FakeApiServer, workdir: str) -> Dict:
+    """
+    新しいプロセスで import → 最初の単体集計（benchmarks.startup）を実行し、その出力を結果にする
+    """
+    calls_before = server.total_calls()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.startup",
+            "--endpoint",
+            server.endpoint,
+            "--workdir",
+            workdir,
+            "--channel",
+            synthetic_channel_id(0),
+            "--api-key",
+            API_KEY,
+        ],
+        cwd=root,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    return {
+        "wall_s": result["wall_s"],
+        "import_s": result["import_s"],
+        "api_calls": server.total_calls() - calls_before,
+        "units": result["units"],
+        "cache_hits": result["cache_hits"],
+        "errors": result["errors"],
+    }
+
+
+SCENARIO_BUILDERS = {
+    "single": scenario_single,
+    "catalog": scenario_catalog,
+    "cohort": scenario_cohort,
+}
+
+
+def run_benchmarks(args) -> List[Dict]:
+    data = FakeYouTubeData(
+        channels=max(args.cohort_size, 2),
+        uploads_per_channel=args.uploads,
+        catalog_sizes={1: args.catalog_size},
+        page_size=args.page_size,
+    )
+    results: List[Dict] = []
+    with FakeApiServer(data, latency_ms=args.latency_ms) as server:
+        configure(api_endpoint=server.endpoint)
+        for name in args.scenario or SCENARIOS:
+            with tempfile.TemporaryDirectory(prefix=f"vta-bench-{name}-") as workdir:
+                if name == "startup":
+                    # 2回目以降（warm）はキャッシュのあるディスクで新しいプロセスを起動する
+                    for i in range(args.repeat + 1):
+                        run = "cold" if i == 0 else f"warm{i}"
+                        results.append({"scenario": name, "run": run, **_measure_startup(server, workdir)})
+                    continue
+                _use_fresh_state(workdir, args.rate)
+                fn = SCENARIO_BUILDERS[name](args)
+                results.append({"scenario": name, "run": "cold", **_measure(server, fn)})
+                for i in range(args.repeat):
+                    results.append({"scenario": name, "run": f"warm{i + 1}", **_measure(server, fn)})
+    return results
+
+
+def _print_table(results: List[Dict], fp=sys.stdout) -> None:
+    columns = ["scenario", "run", "wall_s", "import_s", "api_calls", "units", "cache_hits", "errors", "peak_mem_mb"]
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns), file=fp)
+    for r in results:
+        print("  ".join(str(r.get(c, "-")).ljust(widths[c]) for c in columns), file=fp)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description="ローカル偽 API に対するベンチマーク")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="実行するシナリオ（複数指定可、既定: 全て）")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="偽 API の1リクエストあたりの遅延（ミリ秒）")
+    parser.add_argument("--page-size", type=int, default=50, help="偽 API の1ページの最大件数")
+    parser.add_argument("--uploads", type=int, default=300, help="チャンネルあたりの動画本数")
+    parser.add_argument("--catalog-size", type=int, default=10000, help="catalog シナリオのチャンネルの動画本数")
+    parser.add_argument("--cohort-size", type=int, default=100, help="cohort シナリオのチャンネル数")
+    parser.add_argument("--repeat", type=int, default=1, help="cold の後に続けて実行する warm の回数")
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="送信レート上限（リクエスト/秒、0 で無制限）"
+    )
+    parser.add_argument("--json", metavar="FILE", help="結果を JSON でも書き出す")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    results = run_benchmarks(args)
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"windows": list(RECENT_WINDOWS), "params": vars(args), "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
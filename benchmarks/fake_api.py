@@ -0,0 +1,405 @@
+"""
+ベンチマーク用のローカル偽 YouTube Data API
+
+search / channels / playlists / playlistItems / videos の list を、合成データ
+（または記録済みのレスポンスキャッシュ）で返す HTTP サーバ。1回ごとの遅延とページサイズを設定できる。
+POST /batch（multipart/mixed の HTTP バッチ）にも対応し、バッチ1回を HTTP 往復1回として数える。
+
+    python -m benchmarks.fake_api --port 8765 --latency-ms 80
+    VTA_API_ENDPOINT=http://127.0.0.1:8765/youtube/v3/ streamlit run streamlit_app.py
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import Parser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+_ID_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def _encode(n: int, width: int) -> str:
+    out = []
+    for _ in range(width):
+        n, r = divmod(n, 64)
+        out.append(_ID_CHARS[r])
+    return "".join(reversed(out))
+
+
+def synthetic_channel_id(index: int) -> str:
+    return "UC" + _encode(index, 22)
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _replay_key(endpoint: str, params: Dict) -> str:
+    # 記録時は int、HTTP 経由では文字列になるので文字列に揃えて比較する
+    clean = {k: str(v) for k, v in params.items() if v is not None and k not in ("key", "alt")}
+    return endpoint + "?" + json.dumps(clean, sort_keys=True, ensure_ascii=False)
+
+
+class FakeYouTubeData:
+    """
+    決定的な合成データ。チャンネル i は uploads_for(i) 本の動画を upload_interval_hours 間隔で公開している。
+    """
+
+    def __init__(
+        self,
+        channels: int = 100,
+        uploads_per_channel: int = 300,
+        catalog_sizes: Optional[Dict[int, int]] = None,
+        upload_interval_hours: float = 12.0,
+        playlists_per_channel: int = 20,
+        page_size: int = 50,
+    ):
+        self.channels = channels
+        self.uploads_per_channel = uploads_per_channel
+        self.catalog_sizes = catalog_sizes or {}
+        self.upload_interval_hours = upload_interval_hours
+        self.playlists_per_channel = playlists_per_channel
+        self.page_size = page_size
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.index = {synthetic_channel_id(i): i for i in range(channels)}
+
+    def uploads_for(self, ch: int) -> int:
+        return self.catalog_sizes.get(ch, self.uploads_per_channel)
+
+    def video_id(self, ch: int, j: int) -> str:
+        return _encode(ch * 1_000_000 + j, 11)
+
+    def _video(self, vid: str) -> Optional[Tuple[int, int]]:
+        n = 0
+        for c in vid:
+            pos = _ID_CHARS.find(c)
+            if pos < 0:
+                return None
+            n = n * 64 + pos
+        ch, j = divmod(n, 1_000_000)
+        if ch >= self.channels or j >= self.uploads_for(ch):
+            return None
+        return ch, j
+
+    def _views(self, ch: int, j: int) -> int:
+        h = int.from_bytes(hashlib.blake2b(f"{ch}:{j}".encode(), digest_size=4).digest(), "big")
+        # 新しい動画ほど少なく、ばらつきは対数的に
+        return int((h % 10_000 + 100) * (1 + j) ** 0.5)
+
+    def _published(self, j: int) -> datetime:
+        return self.now - timedelta(hours=self.upload_interval_hours * j + 1)
+
+    def _page(self, total: int, params: Dict) -> Tuple[int, int, Optional[str]]:
+        size = min(int(params.get("maxResults", 5) or 5), self.page_size)
+        start = int(params.get("pageToken") or 0)
+        end = min(start + size, total)
+        return start, end, (str(end) if end < total else None)
+
+    def _channel_item(self, ch: int) -> Dict:
+        cid = synthetic_channel_id(ch)
+        uploads = self.uploads_for(ch)
+        return {
+            "id": cid,
+            "snippet": {"title": f"Channel {ch}", "publishedAt": _iso(self.now - timedelta(days=365 * 3 + ch))},
+            "statistics": {
+                "subscriberCount": str(1000 * (ch + 1)),
+                "viewCount": str(uploads * 5000 * (ch + 1)),
+                "videoCount": str(uploads),
+            },
+            "contentDetails": {"relatedPlaylists": {"uploads": "UU" + cid[2:]}},
+        }
+
+    def channels_list(self, params: Dict) -> Dict:
+        if params.get("forHandle") or params.get("forUsername"):
+            name = (params.get("forHandle") or params.get("forUsername")).lstrip("@").lower()
+            ch = int(name[2:]) if name.startswith("ch") and name[2:].isdigit() else None
+            items = [self._channel_item(ch)] if ch is not None and ch < self.channels else []
+        else:
+            ids = (params.get("id") or "").split(",")
+            items = [self._channel_item(self.index[c]) for c in ids if c in self.index]
+        return {"kind": "youtube#channelListResponse", "items": items}
+
+    def _playlist_item_count(self, k: int) -> int:
+        return (k * 7) % 97
+
+    def _playlist_members(self, pid: str, params: Dict) -> Dict:
+        # 通常のプレイリスト PL{ch}_{k}: 自チャンネルの動画を飛び飛びに収録し、10 本に 1 本は他チャンネルの動画
+        ch, _, k = pid[2:].partition("_")
+        ch, k = int(ch), int(k)
+        start, end, next_token = self._page(self._playlist_item_count(k), params)
+        items = []
+        for m in range(start, end):
+            owner = (ch + 1) % self.channels if m % 10 == 9 else ch
+            vid = self.video_id(owner, (k * 13 + m * 3) % self.uploads_for(owner))
+            items.append(
+                {
+                    "snippet": {
+                        "resourceId": {"kind": "youtube#video", "videoId": vid},
+                        "videoOwnerChannelId": synthetic_channel_id(owner),
+                    },
+                    "contentDetails": {"videoId": vid},
+                }
+            )
+        resp = {"kind": "youtube#playlistItemListResponse", "items": items}
+        if next_token:
+            resp["nextPageToken"] = next_token
+        return resp
+
+    def playlistItems_list(self, params: Dict) -> Dict:
+        if (params.get("playlistId") or "").startswith("PL"):
+            return self._playlist_members(params["playlistId"], params)
+        cid = "UC" + (params.get("playlistId") or "")[2:]
+        ch = self.index.get(cid)
+        total = self.uploads_for(ch) if ch is not None else 0
+        start, end, next_token = self._page(total, params)
+        items = [
+            {
+                "contentDetails": {
+                    "videoId": self.video_id(ch, j),
+                    "videoPublishedAt": _iso(self._published(j)),
+                }
+            }
+            for j in range(start, end)
+        ]
+        resp = {"kind": "youtube#playlistItemListResponse", "items": items}
+        if next_token:
+            resp["nextPageToken"] = next_token
+        return resp
+
+    def videos_list(self, params: Dict) -> Dict:
+        items = []
+        for vid in (params.get("id") or "").split(","):
+            pos = self._video(vid)
+            if pos is None:
+                continue
+            ch, j = pos
+            published = self._published(j)
+            # 11本に1本は #shorts 付きのショート、それ以外は 1〜50 分
+            seconds = 30 + j % 120 if j % 11 == 0 else (j % 50 + 1) * 60 + j % 60
+            items.append(
+                {
+                    "id": vid,
+                    "snippet": {
+                        "title": f"Video {j} of channel {ch}" + (" #shorts" if j % 11 == 0 else ""),
+                        "publishedAt": _iso(published),
+                        "channelId": synthetic_channel_id(ch),
+                    },
+                    "statistics": {"viewCount": str(self._views(ch, j)), "likeCount": str(self._views(ch, j) // 20)},
+                    "contentDetails": {"duration": "PT%dM%dS" % divmod(seconds, 60)},
+                }
+            )
+            if j % 7 == 0 or j % 13 == 0:
+                # 7本に1本はライブ配信のアーカイブ、13本に1本はプレミア公開（配信枠がカウントダウン 2 分のぶん長い）
+                span = seconds if j % 7 == 0 else seconds + 120
+                items[-1]["liveStreamingDetails"] = {
+                    "actualStartTime": _iso(published),
+                    "actualEndTime": _iso(published + timedelta(seconds=span)),
+                }
+        return {"kind": "youtube#videoListResponse", "items": items}
+
+    def playlists_list(self, params: Dict) -> Dict:
+        ch = self.index.get(params.get("channelId") or "")
+        total = self.playlists_per_channel if ch is not None else 0
+        start, end, next_token = self._page(total, params)
+        items = [
+            {
+                "id": f"PL{ch}_{k}",
+                "snippet": {"title": f"Playlist {k}"},
+                "contentDetails": {"itemCount": self._playlist_item_count(k)},
+            }
+            for k in range(start, end)
+        ]
+        resp = {"kind": "youtube#playlistListResponse", "items": items}
+        if next_token:
+            resp["nextPageToken"] = next_token
+        return resp
+
+    def search_list(self, params: Dict) -> Dict:
+        q = params.get("q") or ""
+        ch = int(hashlib.md5(q.encode()).hexdigest(), 16) % self.channels
+        return {
+            "kind": "youtube#searchListResponse",
+            "items": [{"id": {"kind": "youtube#channel", "channelId": synthetic_channel_id(ch)}}],
+        }
+
+
+class FakeApiServer:
+    """
+    FakeYouTubeData（と任意の記録済みレスポンス）を HTTP で返すサーバ。with 文でバックグラウンド起動する。
+    """
+
+    def __init__(
+        self,
+        data: FakeYouTubeData,
+        latency_ms: float = 0.0,
+        replay: Optional[Dict[str, Dict]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.data = data
+        self.latency = latency_ms / 1000.0
+        self.replay = replay or {}
+        # HTTP 往復の回数（バッチは "batch" として1回）と、バッチの中で処理したリクエスト数
+        self.calls: Dict[str, int] = {}
+        self.batched: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/youtube/v3/"
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _count(self, counter: Dict[str, int], endpoint: str) -> None:
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def dispatch(self, path: str, counter: Dict[str, int]) -> Tuple[int, Optional[Dict]]:
+        """
+        GET <path> を処理して (ステータス, 本文) を返す
+        """
+        url = urlparse(path)
+        resource = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        endpoint = f"{resource}.list"
+        self._count(counter, endpoint)
+        body = self.replay.get(_replay_key(endpoint, params))
+        if body is None:
+            handler = getattr(self.data, f"{resource}_list", None)
+            if handler is None:
+                return 404, None
+            body = handler(params)
+        return 200, body
+
+    def dispatch_batch(self, content_type: str, body: str) -> Tuple[str, bytes]:
+        """
+        multipart/mixed のバッチを処理し、(Content-Type, 本文) を返す
+        """
+        message = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+        boundary = uuid.uuid4().hex
+        out: List[str] = []
+        for part in message.get_payload():
+            request_line = part.get_payload().split("\n", 1)[0].strip()
+            _, path, _ = request_line.split(" ", 2)
+            status, resp = self.dispatch(path, self.batched)
+            payload = json.dumps(resp) if resp is not None else ""
+            content_id = part["Content-ID"][1:-1]
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{payload}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode("utf-8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, content_type: str, payload: bytes):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                status, body = server.dispatch(self.path, server.calls)
+                if body is None:
+                    self.send_error(status)
+                    return
+                self._send("application/json; charset=UTF-8", json.dumps(body).encode("utf-8"))
+
+            def do_POST(self):
+                if urlparse(self.path).path.rstrip("/") != "/batch":
+                    self.send_error(404)
+                    return
+                server._count(server.calls, "batch")
+                if server.latency:
+                    time.sleep(server.latency)
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                self._send(*server.dispatch_batch(self.headers["Content-Type"], body))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeApiServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeApiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def load_replay(cache_db_path: str) -> Dict[str, Dict]:
+    """
+    本物の API で記録したレスポンスキャッシュ（vtuber_analyzer の SQLite）を再生用に読み込む
+    """
+    conn = sqlite3.connect(cache_db_path)
+    try:
+        out: Dict[str, Dict] = {}
+        for key, body in conn.execute("SELECT key, body FROM responses"):
+            endpoint, _, params = key.partition("?")
+            out[_replay_key(endpoint, json.loads(params))] = json.loads(body)
+        return out
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ローカル偽 YouTube Data API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="1リクエストごとの遅延（ミリ秒）")
+    parser.add_argument("--page-size", type=int, default=50, help="1ページの最大件数")
+    parser.add_argument("--channels", type=int, default=100, help="合成チャンネル数")
+    parser.add_argument("--uploads", type=int, default=300, help="チャンネルあたりの動画本数")
+    parser.add_argument("--replay", metavar="CACHE_DB", help="記録済みレスポンスキャッシュ（SQLite）を優先して返す")
+    args = parser.parse_args(argv)
+
+    data = FakeYouTubeData(channels=args.channels, uploads_per_channel=args.uploads, page_size=args.page_size)
+    server = FakeApiServer(
+        data,
+        latency_ms=args.latency_ms,
+        replay=load_replay(args.replay) if args.replay else None,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"fake YouTube Data API: VTA_API_ENDPOINT={server.endpoint}")
+    print(f"sample channel: {synthetic_channel_id(0)}（@ch0 〜 @ch{args.channels - 1} も解決できます）")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+"""
+新しいプロセスでの起動時間の計測（bench の startup シナリオが子プロセスとして実行する）
+
+    python -m benchmarks.startup --endpoint http://127.0.0.1:8765/youtube/v3/ --workdir /tmp/vta
+
+vtuber_analyzer の import（ページを開いただけで払う分）と、最初の1チャンネル取得・集計
+（クライアントの準備を含む）までの時間を JSON 1行で標準出力に書く。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--endpoint", required=True)
+    parser.add_argument("--workdir", required=True)
+    parser.add_argument("--channel", required=True)
+    parser.add_argument("--api-key", default="bench-key")
+    args = parser.parse_args()
+
+    # tracemalloc は import を数倍遅くするので使わない（ピークメモリは計らない）
+    started = time.perf_counter()
+    import vtuber_analyzer as va
+
+    imported = time.perf_counter()
+    heavy_loaded = "googleapiclient.discovery" in sys.modules
+
+    va.configure(
+        api_endpoint=args.endpoint,
+        cache_db_path=os.path.join(args.workdir, "cache.sqlite3"),
+        quota_db_path=os.path.join(args.workdir, "quota.sqlite3"),
+        alias_db_path=os.path.join(args.workdir, "aliases.sqlite3"),
+        daily_quota_budget=10**9,
+        requests_per_second=0.0,
+    )
+    usage = va.RunUsage()
+    va.current_run.set(usage)
+    data = va.fetch_channel_data(args.channel, args.api_key, True)
+    va.compute_channel_metrics(data["basic"], data["timeline"], len(data["playlists"]))
+    finished = time.perf_counter()
+
+    totals = usage.totals()
+    print(
+        json.dumps(
+            {
+                "import_s": round(imported - started, 3),
+                "first_fetch_s": round(finished - imported, 3),
+                "wall_s": round(finished - started, 3),
+                "units": totals["units"],
+                "cache_hits": totals["cache_hits"],
+                "errors": totals["errors"],
+                "googleapiclient_at_import": heavy_loaded,
+            }
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
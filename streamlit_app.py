@@ -1,235 +1,452 @@
 import streamlit as st
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional
 import io
 import json
+import os
+import tempfile
+import threading
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from vtuber_analyzer import (
+    GROWTH_PERIODS,
+    RANKED_METRICS,
+    RECENT_WINDOWS,
+    STAGE_BASIC,
+    STAGE_PLAYLISTS,
+    STAGE_RECENT,
+    SUBSCRIBER_BANDS,
+    SUMMARY_TABLE,
+    VIDEO_FORMATS,
+    CohortDetails,
+    PlaylistDigest,
+    QuotaError,
+    RunUsage,
+    Trace,
+    UploadTimeline,
+    analyze_cohort,
+    cohort_output_columns,
+    compute_channel_metrics,
+    configure,
+    current_run,
+    current_trace,
+    estimate_run_cost,
+    finish_trace,
+    format_rank,
+    iter_channel_data,
+    get_key_pool,
+    get_quota_ledger,
+    get_ranking_index,
+    get_report_store,
+    get_slow_run_log,
+    get_snapshot_store,
+    parse_channel_list,
+    plan_quota,
+    quota_day,
+    resolve_channel_id_simple,
+    resolve_channels,
+    settings,
+    span,
+    top_playlists,
+    traced,
+    write_cohort_csv,
+    write_xlsx,
+)
+from vtuber_analyzer.concurrency import add_context_propagator
 
 st.set_page_config(page_title="解析ツール", layout="wide")
 
 # ===== APIキー（推奨：Streamlit secrets に YOUTUBE_API_KEY を設定） =====
-API_KEY = st.secrets.get("YOUTUBE_API_KEY", None)
+# 複数のキーを YOUTUBE_API_KEYS（リストまたはカンマ区切り）に設定すると、キープールとして順に使う
+_secret_keys = st.secrets.get("YOUTUBE_API_KEYS", None)
+if isinstance(_secret_keys, (list, tuple)):
+    _secret_keys = ",".join(_secret_keys)
+API_KEY = _secret_keys or st.secrets.get("YOUTUBE_API_KEY", None)
 if not API_KEY:
     API_KEY = st.sidebar.text_input("YouTube API Key (一時入力可)", type="password")
 
-
-# ===== YouTube client =====
-@st.cache_resource
-def get_youtube_client(api_key: str):
+# ===== ライブラリ設定（secrets で上書き可能） =====
+configure(
+    cache_db_path=st.secrets.get("CACHE_DB_PATH"),
+    cache_max_bytes=int(st.secrets["CACHE_MAX_BYTES"]) if "CACHE_MAX_BYTES" in st.secrets else None,
+    quota_db_path=st.secrets.get("QUOTA_DB_PATH"),
+    history_db_path=st.secrets.get("HISTORY_DB_PATH"),
+    alias_db_path=st.secrets.get("ALIAS_DB_PATH"),
+    report_db_path=st.secrets.get("REPORT_DB_PATH"),
+    ranking_db_path=st.secrets.get("RANKING_DB_PATH"),
+    slow_log_db_path=st.secrets.get("SLOW_LOG_DB_PATH"),
+    playlist_index_db_path=st.secrets.get("PLAYLIST_INDEX_DB_PATH"),
+    slow_run_seconds=float(st.secrets["SLOW_RUN_SECONDS"]) if "SLOW_RUN_SECONDS" in st.secrets else None,
+    daily_quota_budget=int(st.secrets["DAILY_QUOTA_BUDGET"]) if "DAILY_QUOTA_BUDGET" in st.secrets else None,
+    requests_per_second=float(st.secrets["REQUESTS_PER_SECOND"]) if "REQUESTS_PER_SECOND" in st.secrets else None,
+)
+
+
+def _capture_script_run_ctx():
     """
-    YouTube Data API クライアント（APIキーごとに1インスタンス）
+    ワーカースレッドにも ScriptRunContext を引き継ぐ（ワーカーから st.* を使うため）
     """
-    if not api_key:
-        raise RuntimeError("YouTube API key is not configured.")
-    return build("youtube", "v3", developerKey=api_key)
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
 
+add_context_propagator(_capture_script_run_ctx)
 
-# ===== 共通：URL/表示名 → チャンネルID解決 =====
-@st.cache_data(ttl=3600)
-def resolve_channel_id_simple(url_or_id: str, api_key: str) -> Optional[str]:
+
+# ===== 注釈付きメトリクス 1行表示用ヘルパ =====
+def metric_line(label: str, value, note: Optional[str] = None, buf: Optional[list] = None, rank: str = ""):
     """
-    URL / ID / 表示名 からチャンネルID(UC〜)を推定して返す。
-    - 既に UC〜24桁 → それを返す
-    - URLに channel/UC〜 が含まれていれば抜き出す
-    - それ以外は search().list(type=channel) で検索し、最初のチャンネルIDを返す
+    label: 左側の指標名
+    value: 値
+    note : コピー用テキストにだけ付ける注釈
+    buf  : コピー用テキストを蓄積するリスト（任意）
+    rank : 集計済みチャンネル全体での順位（format_rank の表記、任意）
     """
-    s = (url_or_id or "").strip()
-    if not s:
-        return None
-
-    # 生のチャンネルID（UC〜で始まる24桁）
-    if s.startswith("UC") and len(s) == 24:
-        return s
+    rank_label = f"［{rank}］" if rank else ""
+    # UI には注釈を表示しない
+    st.write(f"{label}: {value}{rank_label}")
+    # コピー用テキストには注釈を含める
+    if buf is not None:
+        if note:
+            buf.append(f"{label}: {value}（{note}）{rank_label}")
+        else:
+            buf.append(f"{label}: {value}{rank_label}")
 
-    # https://www.youtube.com/channel/UC... 形式
-    if "channel/" in s:
-        return s.split("channel/")[1].split("/")[0]
 
-    youtube = get_youtube_client(api_key)
+def rank_labels(m: dict) -> Dict[str, str]:
+    """
+    指標ごとの順位表記（集計済みの全チャンネルの中での位置）
+    """
+    index = get_ranking_index()
+    return {name: format_rank(pct, index.count(name)) for name, pct in index.percentiles(m).items()}
+
+
+# ===== 単体モードの表示セクション =====
+# 各関数は placeholder（st.empty()）の中身を描き直し、そのセクションのコピー用テキストの行を返す
+STAGE_LABELS = {STAGE_BASIC: "チャンネル情報", STAGE_PLAYLISTS: "プレイリスト", STAGE_RECENT: "直近の動画"}
+EMPTY_TIMELINE = UploadTimeline([], {})
+FORMAT_LABELS = {"short": "ショート（推定）", "live": "ライブ配信", "vod": "通常動画"}
+# 形式の分類の注記（API に Shorts・プレミア公開の項目がないため推定している）
+FORMAT_NOTE = (
+    "形式は推定: ショートは 60 秒以下か #shorts 付きの 3 分以下の動画、"
+    "プレミア公開はライブ配信ではなく通常動画として数える"
+)
+
+
+@traced("render.basic")
+def render_basic_section(placeholder, channel_id: str, basic: dict, m: dict, data_date: str) -> List[str]:
+    months_active = m["months_active"]
+    months_label = months_active if months_active is not None else "-"
+    published_label = m["publishedDate"] or "不明"
+    with placeholder.container():
+        st.subheader("基本情報")
+        st.write(f"データ取得日: {data_date}")
+        st.write(f"チャンネルID: {channel_id}")
+        st.write(f"チャンネル名: {basic.get('title')}")
+        st.write(f"登録者数: {m['subscriberCount']}")
+        st.write(f"動画本数: {m['videoCount']}")
+        st.write(f"総再生回数: {m['viewCount']}")
+        st.write(f"活動開始日: {published_label}")
+        st.write(f"活動月数: {months_label}")
+    return [
+        "■ 基本情報",
+        f"データ取得日: {data_date}（このツールで集計を行った日）",
+        f"チャンネルID: {channel_id}（UCから始まる固有ID）",
+        f"チャンネル名: {basic.get('title')}",
+        f"登録者数: {m['subscriberCount']}（現在の登録者総数）",
+        f"動画本数: {m['videoCount']}（公開済み動画の本数）",
+        f"総再生回数: {m['viewCount']}（公開済み動画の累計再生数）",
+        f"活動開始日: {published_label}（チャンネル作成日）",
+        f"活動月数: {months_label}（チャンネル開設からの日数 ÷ 30 を概算）",
+    ]
+
+
+# 集計セクションの (表示名, 指標, 注釈)
+RATIO_LINES = [
+    ("累計登録者数/活動月", "subs_per_month", "現在の登録者数 ÷ 活動月数"),
+    ("累計登録者数/動画", "subs_per_video", "現在の登録者数 ÷ 動画本数"),
+    ("累計動画あたり総再生回数", "views_per_video", "総再生回数 ÷ 動画本数"),
+    ("累計総再生回数/登録者数", "views_per_sub", "総再生回数 ÷ 登録者数"),
+    ("1再生あたり登録者増", "subs_per_total_view", "登録者数 ÷ 総再生回数"),
+    ("動画あたりプレイリスト数", "playlists_per_video", "プレイリスト総数 ÷ 動画本数"),
+    ("活動月あたり動画本数", "videos_per_month", "動画本数 ÷ 活動月数"),
+    ("登録者あたり動画本数", "videos_per_subscriber", "動画本数 ÷ 登録者数"),
+]
+
+
+@traced("render.ratios")
+def render_ratio_section(placeholder, m: dict, ranks: Dict[str, str], playlists_pending: bool = False) -> List[str]:
+    lines: List[str] = []
+    with placeholder.container():
+        st.subheader("集計")
+        for label, key, note in RATIO_LINES:
+            if key == "playlists_per_video" and playlists_pending:
+                st.write(f"{label}: 取得中…")
+                continue
+            metric_line(label, m[key], note, lines, ranks.get(key, ""))
+        # 収録動画の索引を作ったときだけ
+        if m.get("playlist_coverage") is not None and not playlists_pending:
+            metric_line(
+                "プレイリスト収録率",
+                m["playlist_coverage"],
+                "いずれかのプレイリストに入っている自チャンネルの動画本数 ÷ 動画本数",
+                lines,
+                ranks.get("playlist_coverage", ""),
+            )
+    return lines
 
-    try:
-        resp = youtube.search().list(
-            q=s,
-            type="channel",
-            part="id,snippet",
-            maxResults=3,
-        ).execute()
-        items = resp.get("items", [])
-        if not items:
-            return None
-
-        # 正しいパスは item["id"]["channelId"]
-        return items[0].get("id", {}).get("channelId")
-    except Exception:
-        return None
 
+@traced("render.playlists")
+def render_playlist_section(placeholder, top5: List[dict]) -> List[str]:
+    lines = ["■ 上位プレイリスト（件数順）"]
+    with placeholder.container():
+        st.subheader("上位プレイリスト（件数順）")
+        for i, pl in enumerate(top5, start=1):
+            line = f"{i}位: {pl['title']} → {pl['itemCount']}本"
+            st.write(line)
+            lines.append(line)
+    return lines
 
-# ===== チャンネル基本情報 =====
-@st.cache_data(ttl=3600)
-def get_channel_basic(channel_id: str, api_key: str) -> Optional[Dict]:
-    youtube = get_youtube_client(api_key)
-    try:
-        resp = youtube.channels().list(
-            part="snippet,statistics,contentDetails",
-            id=channel_id,
-            maxResults=1,
-        ).execute()
-        items = resp.get("items", [])
-        if not items:
-            return None
-
-        it = items[0]
-        snippet = it.get("snippet", {}) or {}
-        stats = it.get("statistics", {}) or {}
-        uploads = it.get("contentDetails", {}).get("relatedPlaylists", {}) or {}
-
-        return {
-            "channelId": channel_id,
-            "title": snippet.get("title"),
-            "publishedAt": snippet.get("publishedAt"),
-            "subscriberCount": int(stats.get("subscriberCount", 0) or 0),
-            "videoCount": int(stats.get("videoCount", 0) or 0),
-            "viewCount": int(stats.get("viewCount", 0) or 0),
-            "uploadsPlaylistId": uploads.get("uploads"),
-        }
-    except Exception:
-        return None
 
+@traced("render.recent")
+def render_recent_section(placeholder, m: dict, ranks: Dict[str, str]) -> List[str]:
+    lines = ["■ 直近指標"]
+    with placeholder.container():
+        st.subheader("直近指標")
+        for idx, days in enumerate(RECENT_WINDOWS):
+            if idx > 0:
+                st.markdown("---")
+
+            metric_line(
+                f"直近{days}日 合計再生数",
+                m[f"total_views_last{days}"],
+                f"直近{days}日間に公開された動画の再生数合計",
+                lines,
+                ranks.get(f"total_views_last{days}", ""),
+            )
+            metric_line(
+                f"直近{days}日 投稿数",
+                m[f"num_videos_last{days}"],
+                f"直近{days}日間に公開された公開動画本数",
+                lines,
+                ranks.get(f"num_videos_last{days}", ""),
+            )
 
-# ===== プレイリスト情報 =====
-@st.cache_data(ttl=1800)
-def get_playlists_meta(channel_id: str, api_key: str) -> List[Dict]:
-    youtube = get_youtube_client(api_key)
-    pls: List[Dict] = []
-    next_page: Optional[str] = None
+            st.write(f"直近{days}日 トップ動画:")
+            lines.append(f"直近{days}日 トップ動画:")
+            top_video_id = m[f"top_video_id_last{days}"]
+            top_title = m[f"top_title_last{days}"]
+            top_views = m[f"top_views_last{days}"]
+            top_share = m[f"top_share_last{days}"]
+            if top_video_id:
+                url = f"https://www.youtube.com/watch?v={top_video_id}"
+                # UI: ハイパーリンク付き
+                st.markdown(
+                    f"- [{top_title}]({url}) — "
+                    f"views: {top_views} | "
+                    f"share: {top_share*100:.2f}%",
+                    unsafe_allow_html=False,
+                )
+                # コピー用: URL なしで注釈付き
+                lines.append(
+                    f"- {top_title} — "
+                    f"views: {top_views}（この動画単体の再生数） | "
+                    f"share: {top_share*100:.2f}%（直近{days}日の合計再生数に占める割合）"
+                )
+            else:
+                st.write(f"- 該当する直近{days}日間の公開動画がありません。")
+                lines.append(f"- 該当する直近{days}日間の公開動画がありません。")
+
+            metric_line(
+                f"直近{days}日 平均再生",
+                m[f"avg_views_per_video_last{days}"],
+                f"直近{days}日間の合計再生数 ÷ 投稿数",
+                lines,
+                ranks.get(f"avg_views_per_video_last{days}", ""),
+            )
+            metric_line(
+                f"直近{days}日 視聴/登録比",
+                m[f"views_per_sub_last{days}"],
+                f"直近{days}日の合計再生数 ÷ 現在の登録者数",
+                lines,
+                ranks.get(f"views_per_sub_last{days}", ""),
+            )
+            if m.get(f"playlisted_view_share_last{days}") is not None:
+                metric_line(
+                    f"直近{days}日 プレイリスト収録動画の再生比率",
+                    m[f"playlisted_view_share_last{days}"],
+                    f"直近{days}日の合計再生数のうち、いずれかのプレイリストに入っている動画の再生数の割合"
+                    f"（{m[f'playlisted_videos_last{days}']}/{m[f'num_videos_last{days}']}本が収録済み）",
+                    lines,
+                    ranks.get(f"playlisted_view_share_last{days}", ""),
+                )
 
-    try:
-        while True:
-            resp = youtube.playlists().list(
-                part="snippet,contentDetails",
-                channelId=channel_id,
-                maxResults=50,
-                pageToken=next_page,
-            ).execute()
-            for pl in resp.get("items", []):
-                pls.append(
-                    {
-                        "playlistId": pl.get("id"),
-                        "title": pl.get("snippet", {}).get("title"),
-                        "itemCount": int(pl.get("contentDetails", {}).get("itemCount", 0) or 0),
-                    }
+            # 形式別の内訳（形式の分類を始める前に保存されたレポートには無い）
+            if f"num_videos_vod_last{days}" not in m:
+                continue
+            st.markdown(f"直近{days}日 形式別:", help=FORMAT_NOTE)
+            lines.append(f"直近{days}日 形式別:（{FORMAT_NOTE}）")
+            for video_format in VIDEO_FORMATS:
+                w = f"{video_format}_last{days}"
+                line = (
+                    f"- {FORMAT_LABELS[video_format]}: {m[f'num_videos_{w}']}本 / "
+                    f"合計再生 {m[f'total_views_{w}']} / 平均再生 {m[f'avg_views_per_video_{w}']} / "
+                    f"share: {m[f'top_share_{w}']*100:.2f}%"
                 )
-            next_page = resp.get("nextPageToken")
-            if not next_page:
-                break
-    except Exception:
-        # 取得失敗時は空リストを返す
-        pass
+                st.write(line)
+                lines.append(line + "（share はその形式の合計再生数に占めるトップ動画の割合）")
+    return lines
 
-    return pls
 
+@traced("render.growth")
+def render_growth_section(placeholder, growth: dict) -> List[str]:
+    lines = ["■ 成長指標"]
+    with placeholder.container():
+        st.markdown("---")
+        st.subheader("成長指標")
+        for days in GROWTH_PERIODS:
+            baseline = growth[f"baseline_date_{days}d"]
+            if baseline is None:
+                line = f"{days}日間: 比較できる過去のスナップショットがありません。"
+                st.write(line)
+                lines.append(line)
+                continue
+            for name, label in (("subs", "登録者増"), ("views", "総再生回数増"), ("videos", "動画本数増")):
+                metric_line(
+                    f"{days}日間 {label}",
+                    growth[f"{name}_delta_{days}d"],
+                    f"{baseline} のスナップショットとの差",
+                    lines,
+                )
+    return lines
+
+
+# ===== クォータ表示・予算チェック =====
+def render_quota_sidebar():
+    ledger = get_quota_ledger()
+    if API_KEY:
+        get_key_pool(API_KEY)  # キーを台帳に登録して、予算をキーの数だけ数える
+    budget = ledger.total_budget
+    used = budget - ledger.remaining_today()
+    st.sidebar.subheader("本日のクォータ使用量")
+    st.sidebar.write(f"{used} / {budget} units（太平洋時間 {quota_day()}）")
+    st.sidebar.progress(min(used / budget, 1.0) if budget > 0 else 1.0)
+    if len(ledger.key_ids) > 1:
+        st.sidebar.dataframe(ledger.key_rows(), use_container_width=True)
+
+
+def render_run_usage(usage: RunUsage):
+    totals = usage.totals()
+    if totals["errors"] > 0:
+        st.warning(
+            f"API呼び出しで {totals['errors']} 件のエラーがありました。一部の指標が欠けている可能性があります。"
+        )
+    with st.expander(
+        f"API使用量（今回の集計）: {totals['units']} units / "
+        f"{totals['calls']} 呼び出し / キャッシュヒット {totals['cache_hits']}"
+    ):
+        st.dataframe(usage.rows(), use_container_width=True)
 
-# ===== 期間指定で動画ID取得 =====
-@st.cache_data(ttl=900)
-def search_video_ids_published_after(
-    channel_id: str,
-    days: int,
-    api_key: str,
-) -> List[str]:
-    youtube = get_youtube_client(api_key)
-    video_ids: List[str] = []
 
-    published_after = (
-        datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=days)
-    ).isoformat().replace("+00:00", "Z")
+# ===== 処理時間（トレース）の表示 =====
+def render_trace(trace: Trace):
+    """
+    トレースを閉じて段階ごとの所要時間を表示する（閾値を超えていれば遅い実行ログにも保存される）
+    """
+    slow = finish_trace(trace)
+    label = f"処理時間（段階別）: {trace.duration:.2f} 秒"
+    if slow:
+        label += "（遅い実行としてログに保存しました）"
+    with st.expander(label):
+        st.dataframe(trace.rows(), use_container_width=True)
+        st.download_button(
+            "トレースを JSON でダウンロード",
+            data=trace.to_json().encode("utf-8"),
+            file_name="vt_trace.json",
+            mime="application/json",
+        )
 
-    next_page: Optional[str] = None
 
-    try:
-        while True:
-            resp = youtube.search().list(
-                part="id",
-                channelId=channel_id,
-                publishedAfter=published_after,
-                type="video",
-                maxResults=50,
-                pageToken=next_page,
-            ).execute()
-            for item in resp.get("items", []):
-                vid = item.get("id", {}).get("videoId")
-                if vid:
-                    video_ids.append(vid)
-            next_page = resp.get("nextPageToken")
-            if not next_page:
-                break
-    except Exception:
-        pass
-
-    return video_ids
-
-
-# ===== 複数動画の統計 =====
-@st.cache_data(ttl=1800)
-def get_videos_stats(video_ids: Tuple[str, ...], api_key: str) -> Dict[str, Dict]:
-    youtube = get_youtube_client(api_key)
-    out: Dict[str, Dict] = {}
-
-    if not video_ids:
-        return out
-
-    for i in range(0, len(video_ids), 50):
-        chunk = video_ids[i : i + 50]
-        try:
-            resp = youtube.videos().list(
-                part="snippet,statistics",
-                id=",".join(chunk),
-                maxResults=50,
-            ).execute()
-            for it in resp.get("items", []):
-                vid = it.get("id")
-                if not vid:
-                    continue
-                snippet = it.get("snippet", {}) or {}
-                stats = it.get("statistics", {}) or {}
-                out[vid] = {
-                    "title": snippet.get("title", "") or "",
-                    "viewCount": int(stats.get("viewCount", 0) or 0),
-                    "likeCount": int(stats.get("likeCount", 0) or 0),
+def render_slow_runs_sidebar():
+    runs = get_slow_run_log().recent(10)
+    if not runs:
+        return
+    with st.sidebar.expander(f"遅い実行ログ（{settings.slow_run_seconds:g} 秒以上、直近 {len(runs)} 件）"):
+        st.dataframe(
+            [
+                {
+                    "id": r["id"],
+                    "日時": datetime.fromtimestamp(r["started_at"]).strftime("%m/%d %H:%M:%S"),
+                    "モード": r["label"],
+                    "秒": round(r["duration_ms"] / 1000, 2),
                 }
-        except Exception:
-            continue
+                for r in runs
+            ],
+            use_container_width=True,
+        )
 
-    return out
 
+def export_path(file_name: str) -> str:
+    """
+    書き出しファイルの一時パス（セッションごとのディレクトリ。実行のたびに同じ名前で上書きする）
+    """
+    if "export_dir" not in st.session_state:
+        st.session_state["export_dir"] = tempfile.mkdtemp(prefix="vta_export_")
+    return os.path.join(st.session_state["export_dir"], file_name)
 
-# ===== 注釈付きメトリクス 1行表示用ヘルパ =====
-def metric_line(label: str, value, note: Optional[str] = None, buf: Optional[list] = None):
+
+def check_quota(entries: List[str], include_playlists: bool, playlist_index: bool = False) -> bool:
     """
-    label: 左側の指標名
-    value: 値
-    note : コピー用テキストにだけ付ける注釈
-    buf  : コピー用テキストを蓄積するリスト（任意）
+    本日のクォータ残りで集計できるかを確認する。
+    足りなければプレイリスト集計（と収録率の索引）を省いて続行し、それでも足りなければ集計を中止する。
+    戻り値: プレイリストを集計するかどうか
     """
-    # UI には注釈を表示しない
-    st.write(f"{label}: {value}")
-    # コピー用テキストには注釈を含める
-    if buf is not None:
-        if note:
-            buf.append(f"{label}: {value}（{note}）")
-        else:
-            buf.append(f"{label}: {value}")
+    planned = plan_quota(entries, include_playlists, RECENT_WINDOWS, playlist_index)
+    if planned is None:
+        st.error(
+            f"本日のクォータ残り（{get_quota_ledger().remaining_today()} units）では集計できません"
+            f"（見積もり {estimate_run_cost(entries, False)} units）。"
+        )
+        st.stop()
+    if planned != include_playlists:
+        st.warning("本日のクォータ残りが少ないため、プレイリストの集計を省略します。")
+    return planned
 
 
 # ==================== UI / Main ====================
 
 st.title("解析ツール")
 
+render_quota_sidebar()
+render_slow_runs_sidebar()
+
+mode = st.radio("モード", ["単体", "コホート", "ランキング"], horizontal=True)
+
 # top row: input | buttons (集計 + ダウンロード) | info
 col_input, col_buttons, col_info = st.columns([3, 1, 1])
 
 with col_input:
-    url_or_id = st.text_input("URL / ID / 表示名 を入力")
+    if mode == "単体":
+        url_or_id = st.text_input("URL / ID / 表示名 を入力")
+        playlist_index = st.checkbox(
+            "プレイリストの収録率も集計する（プレイリストごとに追加のAPI呼び出し。前回から変わったものだけ取り直す）",
+            value=False,
+        )
+    elif mode == "ランキング":
+        rank_metric = st.selectbox("指標", RANKED_METRICS, index=RANKED_METRICS.index("views_per_sub"))
+        rank_band = st.selectbox("登録者数帯", ["全て"] + [label for label, _, _ in SUBSCRIBER_BANDS])
+        rank_top = st.number_input("上位", min_value=1, max_value=1000, value=50, step=10)
+    else:
+        cohort_text = st.text_area("URL / ID / 表示名 を1行に1つずつ入力")
+        cohort_file = st.file_uploader("またはチャンネル一覧ファイル（TXT / CSV）", type=["txt", "csv"])
+        include_playlists = st.checkbox("プレイリスト数も集計する（チャンネルごとに追加のAPI呼び出し）", value=True)
+        playlist_index = st.checkbox(
+            "プレイリストの収録率も集計する（プレイリストごとに追加のAPI呼び出し。前回から変わったものだけ取り直す）",
+            value=False,
+        )
 
 with col_buttons:
     run_btn = st.button("集計")
@@ -241,288 +458,236 @@ with col_info:
     st.write("- APIキーは Streamlit secrets に設定してください。")
     st.write("- キャッシュを活用してクォータを節約しています。")
 
-if run_btn:
+if mode == "ランキング":
+    # API は呼ばず、これまでに集計した全チャンネルの順位索引から引く
+    index = get_ranking_index()
+    band = None if rank_band == "全て" else rank_band
+    ranked = index.top(rank_metric, int(rank_top), band)
+    st.header(f"{rank_metric} の上位（集計済み {index.count(rank_metric, band)} チャンネル中）")
+    if not ranked:
+        st.info("まだ集計済みのチャンネルがありません。単体・コホートで集計すると追加されます。")
+    else:
+        for i, row in enumerate(ranked, start=1):
+            row["rank"] = i
+            row["percentile"] = round(index.percentile(rank_metric, row[rank_metric]), 1)
+        st.dataframe(
+            [{col: r.get(col) for col in ("rank", "channelId", "title", "subscriberBand", rank_metric, "percentile")} for r in ranked],
+            use_container_width=True,
+        )
+
+if run_btn and mode == "コホート":
     if not API_KEY:
         st.error("APIキー未設定です。サイドバーまたは secrets に設定してください。")
         st.stop()
 
-    # ここから先の全API呼び出しは同じ API_KEY を明示的に渡す
-    channel_id = resolve_channel_id_simple(url_or_id, API_KEY)
-    if not channel_id:
-        st.error("チャンネルIDを解決できませんでした。URL / ID / 表示名を確認してください。")
+    entries = parse_channel_list(cohort_text)
+    if cohort_file is not None:
+        for entry in parse_channel_list(cohort_file.getvalue().decode("utf-8-sig")):
+            if entry not in entries:
+                entries.append(entry)
+    if not entries:
+        st.error("チャンネルが入力されていません。")
         st.stop()
 
-    basic = get_channel_basic(channel_id, API_KEY)
-    if not basic:
-        st.error("チャンネル情報の取得に失敗しました。")
+    include_playlists = check_quota(entries, include_playlists, playlist_index)
+    usage = RunUsage()
+    current_run.set(usage)
+    trace = Trace(mode)
+    current_trace.set(trace)
+
+    details = CohortDetails()
+    try:
+        channel_ids, unresolved = resolve_channels(entries, API_KEY)
+        rows = analyze_cohort(
+            channel_ids,
+            API_KEY,
+            include_playlists=include_playlists,
+            store=get_snapshot_store(),
+            details=details,
+            ranking=get_ranking_index(),
+            playlist_index=playlist_index,
+        )
+    except QuotaError as e:
+        st.error(str(e))
+        render_run_usage(usage)
+        render_trace(trace)
         st.stop()
 
-    # データ取得日
-    data_date = datetime.utcnow().strftime("%Y/%m/%d")
+    st.header(f"集計結果（{len(rows)} チャンネル）")
+    if unresolved:
+        st.warning("チャンネルIDを解決できなかった入力: " + ", ".join(unresolved))
+    missing = [cid for cid in channel_ids if cid not in {r["channelId"] for r in rows}]
+    if missing:
+        st.warning("チャンネル情報を取得できなかったID: " + ", ".join(missing))
+
+    with span("render.table", rows=len(rows)):
+        st.dataframe(
+            [{col: r.get(col) for col in cohort_output_columns(rows)} for r in rows],
+            use_container_width=True,
+        )
+    render_run_usage(usage)
 
-    # publishedAt -> datetime
-    published_at_raw = basic.get("publishedAt")
-    published_dt: Optional[datetime] = None
-    if published_at_raw:
-        try:
-            published_dt = datetime.fromisoformat(published_at_raw.replace("Z", "+00:00"))
-        except Exception:
-            published_dt = None
+    # CLI と同じく一時ファイルへ流し込んで書き出す（明細を含むファイル全体をメモリに組み立てない）
+    with span("export.files"):
+        csv_path = export_path("vt_cohort_stats.csv")
+        with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+            write_cohort_csv(rows, f)
 
-    if published_dt:
-        days_active = (datetime.utcnow().replace(tzinfo=timezone.utc) - published_dt).days
-        months_active = round(days_active / 30, 2)
-    else:
-        months_active = None
-
-    subs = basic.get("subscriberCount", 0)
-    vids_total = basic.get("videoCount", 0)
-    views_total = basic.get("viewCount", 0)
-
-    # 直近10日・30日の動画ID & stats
-    ids_10 = search_video_ids_published_after(channel_id, 10, API_KEY)
-    stats_10 = get_videos_stats(tuple(ids_10), API_KEY) if ids_10 else {}
-    total_views_last10 = sum(v.get("viewCount", 0) for v in stats_10.values())
-    num_videos_last10 = len(stats_10)
-
-    ids_30 = search_video_ids_published_after(channel_id, 30, API_KEY)
-    stats_30 = get_videos_stats(tuple(ids_30), API_KEY) if ids_30 else {}
-    total_views_last30 = sum(v.get("viewCount", 0) for v in stats_30.values())
-    num_videos_last30 = len(stats_30)
-
-    # 直近10日のトップ動画
-    if num_videos_last10 > 0:
-        top_vid_10 = max(stats_10.items(), key=lambda kv: kv[1]["viewCount"])
-        top_video_id = top_vid_10[0]
-        top_info = top_vid_10[1]
-        top_views_last10 = top_info["viewCount"]
-        top_share_last10 = round(
-            (top_views_last10 / total_views_last10) if total_views_last10 > 0 else 0.0,
-            4,
-        )
-        top_title_last10 = (top_info.get("title") or "").replace("\n", " ").strip()
-    else:
-        top_video_id = None
-        top_views_last10 = 0
-        top_share_last10 = 0.0
-        top_title_last10 = ""
-
-    # 直近30日のトップ動画
-    if num_videos_last30 > 0:
-        top_vid_30 = max(stats_30.items(), key=lambda kv: kv[1]["viewCount"])
-        top_video_id_30 = top_vid_30[0]
-        top_info_30 = top_vid_30[1]
-        top_views_last30 = top_info_30["viewCount"]
-        top_share_last30 = round(
-            (top_views_last30 / total_views_last30) if total_views_last30 > 0 else 0.0,
-            4,
-        )
-        top_title_last30 = (top_info_30.get("title") or "").replace("\n", " ").strip()
-    else:
-        top_video_id_30 = None
-        top_views_last30 = 0
-        top_share_last30 = 0.0
-        top_title_last30 = ""
-
-    # 各種指標計算
-    views_per_sub = round((views_total / subs), 2) if subs > 0 else 0.0
-    subs_per_total_view = round((subs / views_total), 5) if views_total > 0 else 0.0
-    views_per_video = round((views_total / vids_total), 2) if vids_total > 0 else 0.0
-
-    views_per_sub_last10 = round((total_views_last10 / subs), 5) if subs > 0 else 0.0
-    views_per_sub_last30 = round((total_views_last30 / subs), 5) if subs > 0 else 0.0
-
-    avg_views_per_video_last10 = (
-        round((total_views_last10 / num_videos_last10), 2) if num_videos_last10 > 0 else 0.0
-    )
-    avg_views_per_video_last30 = (
-        round((total_views_last30 / num_videos_last30), 2) if num_videos_last30 > 0 else 0.0
-    )
-
-    playlists_meta = get_playlists_meta(channel_id, API_KEY)
-    playlist_count = len(playlists_meta)
-    playlists_sorted = sorted(playlists_meta, key=lambda x: x["itemCount"], reverse=True)
-    top5_playlists = playlists_sorted[:5]
-    while len(top5_playlists) < 5:
-        top5_playlists.append({"title": "-", "itemCount": "-"})
-
-    playlists_per_video = round((playlist_count / vids_total), 5) if vids_total > 0 else 0.0
-    videos_per_month = (
-        round((vids_total / months_active), 2)
-        if months_active is not None and months_active > 0
-        else 0.0
-    )
-    videos_per_subscriber = round((vids_total / subs), 5) if subs > 0 else 0.0
-    subs_per_month = (
-        round((subs / months_active), 2)
-        if months_active is not None and months_active > 0
-        else 0.0
-    )
-    subs_per_video = round((subs / vids_total), 2) if vids_total > 0 else 0.0
-    subs_per_month_per_video = round((subs_per_month / vids_total), 5) if vids_total > 0 else 0.0
-    views_per_month = (
-        round((views_total / months_active), 2)
-        if months_active is not None and months_active > 0
-        else 0.0
-    )
-
-    # コピー用テキストバッファ（UI表示内容＋注釈付き）
-    summary_lines: list = []
-    summary_lines.append("=== 集計結果 ===")
-    summary_lines.append("")
-    summary_lines.append("■ 基本情報")
-    summary_lines.append(f"データ取得日: {data_date}（このツールで集計を行った日）")
-    summary_lines.append(f"チャンネルID: {channel_id}（UCから始まる固有ID）")
-    summary_lines.append(f"チャンネル名: {basic.get('title')}")
-    summary_lines.append(f"登録者数: {subs}（現在の登録者総数）")
-    summary_lines.append(f"動画本数: {vids_total}（公開済み動画の本数）")
-    summary_lines.append(f"総再生回数: {views_total}（公開済み動画の累計再生数）")
-    summary_lines.append(
-        f"活動開始日: {published_dt.strftime('%Y-%m-%d') if published_dt else '不明'}"
-        "（チャンネル作成日）"
-    )
-    summary_lines.append(
-        f"活動月数: {months_active if months_active is not None else '-'}"
-        "（チャンネル開設からの日数 ÷ 30 を概算）"
-    )
-    summary_lines.append("")
-
-    # ===== 表示 =====
-    st.header("集計結果")
-    col1, col2 = st.columns([2, 2])
+        # 集計表・動画明細・プレイリストの3シート
+        xlsx_path = export_path("vt_cohort_stats.xlsx")
+        write_xlsx([(SUMMARY_TABLE, cohort_output_columns(rows), rows)] + details.tables(), xlsx_path)
+        details.close()
 
-    # --- 左カラム：基本情報＋集計 ---
-    with col1:
-        st.subheader("基本情報")
-        st.write(f"データ取得日: {data_date}")
-        st.write(f"チャンネルID: {channel_id}")
-        st.write(f"チャンネル名: {basic.get('title')}")
-        st.write(f"登録者数: {subs}")
-        st.write(f"動画本数: {vids_total}")
-        st.write(f"総再生回数: {views_total}")
-        st.write(
-            f"活動開始日: {published_dt.strftime('%Y-%m-%d') if published_dt else '不明'}"
-        )
-        st.write(
-            f"活動月数: {months_active if months_active is not None else '-'}"
-        )
+    with col_buttons:
+        with open(csv_path, "rb") as f:
+            download_placeholder.download_button("CSVダウンロード", data=f, file_name="vt_cohort_stats.csv")
+        with open(xlsx_path, "rb") as f:
+            copy_placeholder.download_button(
+                "XLSXダウンロード（明細付き）",
+                data=f,
+                file_name="vt_cohort_stats.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
 
-        st.subheader("集計")
-        metric_line("累計登録者数/活動月", subs_per_month, "現在の登録者数 ÷ 活動月数", summary_lines)
-        metric_line("累計登録者数/動画", subs_per_video, "現在の登録者数 ÷ 動画本数", summary_lines)
-        metric_line("累計動画あたり総再生回数", views_per_video, "総再生回数 ÷ 動画本数", summary_lines)
-        metric_line("累計総再生回数/登録者数", views_per_sub, "総再生回数 ÷ 登録者数", summary_lines)
-        metric_line("1再生あたり登録者増", subs_per_total_view, "登録者数 ÷ 総再生回数", summary_lines)
-        metric_line("動画あたりプレイリスト数", playlists_per_video, "プレイリスト総数 ÷ 動画本数", summary_lines)
-        metric_line("活動月あたり動画本数", videos_per_month, "動画本数 ÷ 活動月数", summary_lines)
-        metric_line("登録者あたり動画本数", videos_per_subscriber, "動画本数 ÷ 登録者数", summary_lines)
+    render_trace(trace)
+    st.success("集計が完了しました。上部のボタンからCSV / XLSXダウンロードができます。")
 
-        st.subheader("上位プレイリスト（件数順）")
-        summary_lines.append("")
-        summary_lines.append("■ 上位プレイリスト（件数順）")
-        for i, pl in enumerate(top5_playlists, start=1):
-            line = f"{i}位: {pl['title']} → {pl['itemCount']}本"
-            st.write(line)
-            summary_lines.append(line)
+if run_btn and mode == "単体":
+    if not API_KEY:
+        st.error("APIキー未設定です。サイドバーまたは secrets に設定してください。")
+        st.stop()
 
-    # --- 右カラム：直近指標 ---
-    with col2:
-        st.subheader("直近指標")
-        summary_lines.append("")
-        summary_lines.append("■ 直近指標")
-        metric_line(
-            "直近10日 合計再生数",
-            total_views_last10,
-            "直近10日間に公開された動画の再生数合計",
-            summary_lines,
-        )
-        metric_line(
-            "直近10日 投稿数",
-            num_videos_last10,
-            "直近10日間に公開された公開動画本数",
-            summary_lines,
-        )
+    include_playlists = check_quota([url_or_id], True, playlist_index)
+    usage = RunUsage()
+    current_run.set(usage)
+    trace = Trace(mode)
+    current_trace.set(trace)
 
-        st.write("直近10日 トップ動画:")
-        summary_lines.append("直近10日 トップ動画:")
-        if top_video_id:
-            url_10 = f"https://www.youtube.com/watch?v={top_video_id}"
-            # UI: ハイパーリンク付き
-            st.markdown(
-                f"- [{top_title_last10}]({url_10}) — "
-                f"views: {top_views_last10} | "
-                f"share: {top_share_last10*100:.2f}%",
-                unsafe_allow_html=False,
-            )
-            # コピー用: URL なしで注釈付き
-            summary_lines.append(
-                f"- {top_title_last10} — "
-                f"views: {top_views_last10}（この動画単体の再生数） | "
-                f"share: {top_share_last10*100:.2f}%（直近10日の合計再生数に占める割合）"
-            )
-        else:
-            st.write("- 該当する直近10日間の公開動画がありません。")
-            summary_lines.append("- 該当する直近10日間の公開動画がありません。")
-
-        metric_line(
-            "直近10日 平均再生",
-            avg_views_per_video_last10,
-            "直近10日間の合計再生数 ÷ 投稿数",
-            summary_lines,
-        )
-        metric_line(
-            "直近10日 視聴/登録比",
-            views_per_sub_last10,
-            "直近10日の合計再生数 ÷ 現在の登録者数",
-            summary_lines,
-        )
+    # ここから先の全API呼び出しは同じ API_KEY を明示的に渡す
+    report = None
+    try:
+        channel_id = resolve_channel_id_simple(url_or_id, API_KEY)
+        if channel_id:
+            # 閲覧回数を記録し（worker の更新優先度に使う）、新しい事前計算済みレポートがあれば API を呼ばない
+            report_store = get_report_store()
+            report_store.record_view(channel_id)
+            report = report_store.get(channel_id, settings.report_max_age)
+    except QuotaError as e:
+        st.error(str(e))
+        render_run_usage(usage)
+        render_trace(trace)
+        st.stop()
 
-        st.markdown("---")
+    if not channel_id:
+        st.error("チャンネルIDを解決できませんでした。URL / ID / 表示名を確認してください。")
+        st.stop()
 
-        metric_line(
-            "直近30日 合計再生数",
-            total_views_last30,
-            "直近30日間に公開された動画の再生数合計",
-            summary_lines,
-        )
-        metric_line(
-            "直近30日 投稿数",
-            num_videos_last30,
-            "直近30日間に公開された公開動画本数",
-            summary_lines,
-        )
+    # ===== 表示（セクションごとの placeholder を先に並べ、取得が終わった順に埋める） =====
+    st.header("集計結果")
+    progress = st.empty()
+    col1, col2 = st.columns([2, 2])
+    with col1:
+        basic_ph = st.empty()
+        ratios_ph = st.empty()
+        playlists_ph = st.empty()
+    with col2:
+        recent_ph = st.empty()
+        growth_ph = st.empty()
+
+    if report is not None:
+        basic = report["basic"]
+        m = report["metrics"]
+        top5_playlists = report["top_playlists"]
+        growth = report["growth"]
+        computed_at = datetime.utcfromtimestamp(report["computed_at"])
+        data_date = computed_at.strftime("%Y/%m/%d")
+        progress.info(f"事前計算済みのレポートを表示しています（{computed_at:%Y/%m/%d %H:%M} UTC 時点）。")
+        ranks = rank_labels(m)
+        basic_lines = render_basic_section(basic_ph, channel_id, basic, m, data_date)
+        ratio_lines = render_ratio_section(ratios_ph, m, ranks)
+        playlist_lines = render_playlist_section(playlists_ph, top5_playlists)
+        recent_lines = render_recent_section(recent_ph, m, ranks)
+    else:
+        # データ取得日
+        data_date = datetime.utcnow().strftime("%Y/%m/%d")
+        basic_ph.caption("チャンネル情報を取得中…")
+        playlists_ph.caption("プレイリストを取得中…")
+        recent_ph.caption("直近の動画を取得中…")
+        growth_ph.caption("成長指標は全ての取得が終わってから計算します。")
+
+        total_stages = (3 if include_playlists else 2) + 1  # 最後の1段は履歴の保存
+        basic = None
+        # プレイリストは件数と上位5件だけを持つ（全件は持たない）
+        playlists = None if include_playlists else PlaylistDigest()
+        recent = None
+        top5_playlists = top_playlists([], 5)
+        if not include_playlists:
+            playlist_lines = render_playlist_section(playlists_ph, top5_playlists)
+        progress.progress(0.0, text="取得中… (0/%d)" % total_stages)
 
-        st.write("直近30日 トップ動画:")
-        summary_lines.append("直近30日 トップ動画:")
-        if top_video_id_30:
-            url_30 = f"https://www.youtube.com/watch?v={top_video_id_30}"
-            st.markdown(
-                f"- [{top_title_last30}]({url_30}) — "
-                f"views: {top_views_last30} | "
-                f"share: {top_share_last30*100:.2f}%",
-                unsafe_allow_html=False,
-            )
-            summary_lines.append(
-                f"- {top_title_last30} — "
-                f"views: {top_views_last30}（この動画単体の再生数） | "
-                f"share: {top_share_last30*100:.2f}%（直近30日の合計再生数に占める割合）"
-            )
-        else:
-            st.write("- 該当する直近30日間の公開動画がありません。")
-            summary_lines.append("- 該当する直近30日間の公開動画がありません。")
-
-        metric_line(
-            "直近30日 平均再生",
-            avg_views_per_video_last30,
-            "直近30日間の合計再生数 ÷ 投稿数",
-            summary_lines,
-        )
-        metric_line(
-            "直近30日 視聴/登録比",
-            views_per_sub_last30,
-            "直近30日の合計再生数 ÷ 現在の登録者数",
-            summary_lines,
-        )
+        try:
+            for done, (stage, value) in enumerate(
+                iter_channel_data(
+                    channel_id, API_KEY, include_playlists, playlist_index=include_playlists and playlist_index
+                ),
+                start=1,
+            ):
+                if stage == STAGE_BASIC:
+                    if not value:
+                        st.error("チャンネル情報の取得に失敗しました。")
+                        st.stop()
+                    basic = value
+                elif stage == STAGE_PLAYLISTS:
+                    playlists = value
+                    top5_playlists = top_playlists(playlists.top(), 5)
+                    playlist_lines = render_playlist_section(playlists_ph, top5_playlists)
+                else:
+                    recent = value
+
+                if basic is not None:
+                    # 累計の比率は基本情報（とプレイリスト数）だけで決まるので、直近の動画を待たずに出す
+                    timeline = recent["timeline"] if recent is not None else EMPTY_TIMELINE
+                    with span("compute.metrics"):
+                        m = compute_channel_metrics(
+                            basic,
+                            timeline,
+                            playlists.count if playlists is not None else 0,
+                            playlisted=playlists.playlisted if playlists is not None else None,
+                        )
+                        ranks = rank_labels(m)
+                    if stage == STAGE_BASIC:
+                        basic_lines = render_basic_section(basic_ph, channel_id, basic, m, data_date)
+                    if stage in (STAGE_BASIC, STAGE_PLAYLISTS):
+                        ratio_lines = render_ratio_section(ratios_ph, m, ranks, playlists_pending=playlists is None)
+                    # 収録率は直近の動画と収録動画の索引の両方が揃ってから出る
+                    redraw_recent = stage in (STAGE_BASIC, STAGE_RECENT) or (
+                        stage == STAGE_PLAYLISTS and playlists.playlisted is not None
+                    )
+                    if recent is not None and redraw_recent:
+                        recent_lines = render_recent_section(recent_ph, m, ranks)
+                progress.progress(done / total_stages, text=f"{STAGE_LABELS[stage]}を取得しました ({done}/{total_stages})")
+        except QuotaError as e:
+            st.error(str(e))
+            render_run_usage(usage)
+            render_trace(trace)
+            st.stop()
+
+        # 今回の結果を履歴に保存し、過去のスナップショットとの差分を出す
+        with span("store.snapshots"):
+            store = get_snapshot_store()
+            store.record(basic, recent["video_stats"], recent["uploads"])
+            growth = store.growth(channel_id)
+        with span("store.ranking"):
+            get_ranking_index().update([m])
+        progress.progress(1.0, text=f"集計が完了しました ({total_stages}/{total_stages})")
+
+    growth_lines = render_growth_section(growth_ph, growth)
+    months_active = m["months_active"]
+
+    # コピー用テキスト（UI表示内容＋注釈付き。描画の順番に関係なくこの順で並べる）
+    summary_lines: list = ["=== 集計結果 ===", ""]
+    summary_lines += basic_lines + [""] + ratio_lines + [""] + playlist_lines
+    summary_lines += [""] + recent_lines + [""] + growth_lines
 
     summary_text = "\n".join(summary_lines)
 
@@ -533,44 +698,42 @@ if run_btn:
     txt_output.write(f"{data_date}\n")
     txt_output.write(f"{channel_id}\n")
     txt_output.write(f"{basic.get('title') or ''}\n")
-    txt_output.write(f"{subs}\n")
-    txt_output.write(f"{vids_total}\n")
-    txt_output.write(f"{views_total}\n")
-    txt_output.write(f"{published_dt.strftime('%Y-%m-%d') if published_dt else ''}\n")
+    txt_output.write(f"{m['subscriberCount']}\n")
+    txt_output.write(f"{m['videoCount']}\n")
+    txt_output.write(f"{m['viewCount']}\n")
+    txt_output.write(f"{m['publishedDate'] or ''}\n")
     txt_output.write(f"{months_active if months_active is not None else ''}\n")
 
     # 集計
-    txt_output.write(f"{subs_per_month}\n")
-    txt_output.write(f"{subs_per_video}\n")
-    txt_output.write(f"{views_per_video}\n")
-    txt_output.write(f"{views_per_sub}\n")
-    txt_output.write(f"{subs_per_total_view}\n")
-    txt_output.write(f"{playlists_per_video}\n")
-    txt_output.write(f"{videos_per_month}\n")
-    txt_output.write(f"{videos_per_subscriber}\n")
+    for key in (
+        "subs_per_month",
+        "subs_per_video",
+        "views_per_video",
+        "views_per_sub",
+        "subs_per_total_view",
+        "playlists_per_video",
+        "videos_per_month",
+        "videos_per_subscriber",
+    ):
+        txt_output.write(f"{m[key]}\n")
 
     # 上位プレイリスト
     for pl in top5_playlists:
         title = (pl.get("title", "") or "").replace("\n", " ").strip()
         txt_output.write(f"{title}→{pl.get('itemCount', '')}\n")
 
-    # 直近10日
-    txt_output.write(f"{total_views_last10}\n")
-    txt_output.write(f"{num_videos_last10}\n")
-    txt_output.write(f"{top_title_last10}\n")
-    txt_output.write(f"{top_views_last10}\n")
-    txt_output.write(f"{top_share_last10}\n")
-    txt_output.write(f"{avg_views_per_video_last10}\n")
-    txt_output.write(f"{views_per_sub_last10}\n")
-
-    # 直近30日
-    txt_output.write(f"{total_views_last30}\n")
-    txt_output.write(f"{num_videos_last30}\n")
-    txt_output.write(f"{top_title_last30}\n")
-    txt_output.write(f"{top_views_last30}\n")
-    txt_output.write(f"{top_share_last30}\n")
-    txt_output.write(f"{avg_views_per_video_last30}\n")
-    txt_output.write(f"{views_per_sub_last30}\n")
+    # 直近10日・30日
+    for days in RECENT_WINDOWS:
+        for key in (
+            "total_views",
+            "num_videos",
+            "top_title",
+            "top_views",
+            "top_share",
+            "avg_views_per_video",
+            "views_per_sub",
+        ):
+            txt_output.write(f"{m[f'{key}_last{days}']}\n")
 
     txt_value = txt_output.getvalue()
     st.session_state["last_txt"] = txt_value
@@ -614,4 +777,6 @@ if run_btn:
             height=80,
         )
 
+    render_run_usage(usage)
+    render_trace(trace)
     st.success("集計が完了しました。上部のボタンからTXTダウンロード / コピーができます。")
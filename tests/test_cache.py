@@ -0,0 +1,53 @@
+from vtuber_analyzer.cache import ResponseCache, VideoStatsCache, video_stats_ttl
+
+NOW = 1_700_000_000.0
+OLD = "2020-01-01T00:00:00Z"
+
+
+def _stats(n, published_at=OLD, pad=0):
+    return {f"v{i:010d}": {"publishedAt": published_at, "viewCount": i, "title": "x" * pad} for i in range(n)}
+
+
+def test_video_stats_ttl_tiers():
+    assert video_stats_ttl(None, NOW) == 600
+    assert video_stats_ttl("2023-11-14T22:00:00Z", NOW) == 600
+    assert video_stats_ttl(OLD, NOW) == 24 * 3600
+
+
+def test_evict_deletes_expired_rows(tmp_path):
+    cache = VideoStatsCache(str(tmp_path / "c.sqlite3"), max_bytes=10**9)
+    cache.put_many(_stats(3), now=NOW)
+    cache.evict(now=NOW + 24 * 3600 + 1)
+    count = cache._conn().execute("SELECT COUNT(*) FROM video_stats").fetchone()[0]
+    assert count == 0
+
+
+def test_put_many_evicts_every_n_writes(tmp_path):
+    cache = VideoStatsCache(str(tmp_path / "c.sqlite3"), max_bytes=10**9)
+    cache.put_many(_stats(5), now=NOW - 2 * 86400)
+    for _ in range(VideoStatsCache._EVICT_EVERY - 1):
+        cache.put_many({"fresh000001": {"publishedAt": OLD}}, now=NOW)
+    ids = {r[0] for r in cache._conn().execute("SELECT video_id FROM video_stats")}
+    assert ids == {"fresh000001"}
+
+
+def test_video_stats_count_toward_shared_budget(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    responses = ResponseCache(path, max_bytes=20_000)
+    stats = VideoStatsCache(path, max_bytes=20_000)
+    stats.put_many(_stats(40, pad=1000), now=NOW)
+    stats.evict(now=NOW)
+    stats_bytes = stats._conn().execute("SELECT SUM(LENGTH(body)) FROM video_stats").fetchone()[0]
+    assert stats_bytes <= 18_000
+
+    # レスポンス側の追い出しも動画 stats の分を数える
+    responses.put(ResponseCache.make_key("channels.list", {"id": "UC1"}), "channels.list", {"pad": "y" * 5000})
+    responses.evict()
+    assert responses.get(ResponseCache.make_key("channels.list", {"id": "UC1"})) is None
+
+
+def test_zero_ttl_endpoint_is_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite3"), max_bytes=10**9)
+    key = ResponseCache.make_key("videos.list", {"id": "v1"})
+    cache.put(key, "videos.list", {"items": []})
+    assert cache.get(key) is None
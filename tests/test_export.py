@@ -0,0 +1,56 @@
+import csv
+import io
+
+import pytest
+
+from vtuber_analyzer.export import PLAYLIST_COLUMNS, VIDEO_COLUMNS, CohortDetails, write_csv, write_parquet
+
+UPLOADS = [
+    {"videoId": "aaaaaaaaaaa", "publishedAt": "2024-01-02T00:00:00Z"},
+    {"videoId": "bbbbbbbbbbb", "publishedAt": "2024-01-01T00:00:00Z"},
+]
+STATS = {"aaaaaaaaaaa": {"title": "A", "format": "vod", "durationSeconds": 600, "viewCount": 10, "likeCount": 1}}
+PLAYLISTS = [{"playlistId": "PL1", "title": "歌", "itemCount": 3}]
+
+
+def test_cohort_details_spools_rows():
+    details = CohortDetails()
+    details.add("UC1", {"channelId": "UC1"}, UPLOADS, STATS, PLAYLISTS, PLAYLISTS)
+    details.add("UC2", {"channelId": "UC2"}, [], {}, [], [])
+    videos = list(details.iter_video_rows())
+    assert [(r["channelId"], r["videoId"]) for r in videos] == [("UC1", "aaaaaaaaaaa")]
+    assert list(details.iter_playlist_rows()) == [{"channelId": "UC1", "playlistId": "PL1", "title": "歌", "itemCount": 3}]
+    # 読み返したあとに追加しても、次の読み返しに含まれる
+    details.add("UC3", {"channelId": "UC3"}, [], {}, PLAYLISTS, [])
+    assert [r["channelId"] for r in details.iter_playlist_rows()] == ["UC1", "UC3"]
+    assert set(details.basics) == {"UC1", "UC2", "UC3"}
+    details.close()
+
+
+def test_cohort_details_without_rows_keeps_basics_only():
+    details = CohortDetails(keep_rows=False)
+    details.add("UC1", {"channelId": "UC1"}, UPLOADS, STATS, PLAYLISTS, PLAYLISTS[:1])
+    assert list(details.iter_video_rows()) == []
+    assert details.top_playlists == {"UC1": PLAYLISTS[:1]}
+
+
+def test_write_csv_streams_detail_tables():
+    details = CohortDetails()
+    details.add("UC1", {"channelId": "UC1"}, UPLOADS, STATS, PLAYLISTS, [])
+    out = io.StringIO()
+    assert write_csv(details.iter_video_rows(), out, VIDEO_COLUMNS) == 1
+    assert next(csv.DictReader(io.StringIO(out.getvalue())))["viewCount"] == "10"
+    out = io.StringIO()
+    assert write_csv(details.iter_playlist_rows(), out, PLAYLIST_COLUMNS) == 1
+
+
+def test_write_parquet_uses_column_definitions(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [{"channelId": "a", "top_title_last10": None, "top_share_last10": 0, "subs_delta_30d": None}] * 2 + [
+        {"channelId": "b", "top_title_last10": "t", "top_share_last10": 0.25, "subs_delta_30d": 5}
+    ]
+    path = str(tmp_path / "out.parquet")
+    assert write_parquet(rows, path, list(rows[0]), batch_size=2) == 3
+    schema = pq.read_schema(path)
+    assert [str(f.type) for f in schema] == ["string", "string", "double", "int64"]
+    assert pq.read_table(path).column("subs_delta_30d").to_pylist() == [None, None, 5]
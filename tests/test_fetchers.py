@@ -0,0 +1,72 @@
+import pytest
+
+from vtuber_analyzer.fetchers import (
+    PREMIERE_MIN_COUNTDOWN_SECONDS,
+    _is_short,
+    _is_stream,
+    classify_video,
+)
+from vtuber_analyzer.timeline import FORMAT_LIVE, FORMAT_SHORT, FORMAT_VOD
+
+START = "2024-01-01T00:00:00Z"
+
+
+def _item(title="", description="", live="none", start=None, end=None, details=True):
+    it = {"snippet": {"title": title, "description": description, "liveBroadcastContent": live}}
+    if details:
+        it["liveStreamingDetails"] = {k: v for k, v in (("actualStartTime", start), ("actualEndTime", end)) if v}
+    return it
+
+
+def _end(seconds):
+    return f"2024-01-01T{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}Z"
+
+
+@pytest.mark.parametrize(
+    "duration, title, expected",
+    [
+        (60, "", True),
+        (61, "", False),
+        (61, "clip #shorts", True),
+        (180, "", False),
+        (180, "clip #Shorts", True),
+        (181, "clip #shorts", False),
+        (None, "#shorts", False),
+    ],
+)
+def test_is_short_boundaries(duration, title, expected):
+    assert _is_short(_item(title=title, details=False), duration) is expected
+
+
+def test_is_short_reads_description():
+    assert _is_short(_item(description="#shorts"), 120)
+
+
+def test_stream_archive_vs_premiere_countdown():
+    duration = 3600
+    # 配信枠の時間と動画の長さの差がカウントダウン未満ならアーカイブ
+    archive = _item(start=START, end=_end(duration + PREMIERE_MIN_COUNTDOWN_SECONDS - 1))
+    premiere = _item(start=START, end=_end(duration + PREMIERE_MIN_COUNTDOWN_SECONDS))
+    assert _is_stream(archive, duration)
+    assert not _is_stream(premiere, duration)
+    assert classify_video(archive, duration) == FORMAT_LIVE
+    assert classify_video(premiere, duration) == FORMAT_VOD
+
+
+def test_premiere_without_actual_times_is_vod():
+    assert not _is_stream(_item(), 3600)
+
+
+def test_upcoming_premiere_is_vod_and_upcoming_stream_is_live():
+    assert classify_video(_item(live="upcoming"), 3600) == FORMAT_VOD
+    assert classify_video(_item(live="upcoming"), None) == FORMAT_LIVE
+    assert classify_video(_item(live="live"), None) == FORMAT_LIVE
+
+
+def test_stream_without_duration_is_live():
+    assert _is_stream(_item(start=START), None)
+
+
+def test_short_premiere_is_short_and_plain_video_is_vod():
+    assert classify_video(_item(start=START, end=_end(45 + 120)), 45) == FORMAT_SHORT
+    assert classify_video(_item(details=False), 600) == FORMAT_VOD
@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+
+import pytest
+
+from vtuber_analyzer import client
+from vtuber_analyzer.cache import ResponseCache
+from vtuber_analyzer.quota import QuotaBudgetExceeded, QuotaLedger, RunUsage, current_run
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return QuotaLedger(str(tmp_path / "quota.sqlite3"), daily_budget=10)
+
+
+def test_charge_rejects_over_budget(ledger):
+    for _ in range(10):
+        ledger.charge("videos.list")
+    with pytest.raises(QuotaBudgetExceeded):
+        ledger.charge("videos.list")
+    assert ledger.used_today() == 10
+    assert ledger.remaining_today() == 0
+
+
+def test_charge_counts_search_cost(ledger):
+    with pytest.raises(QuotaBudgetExceeded):
+        ledger.charge("search.list")
+    assert ledger.used_today() == 0
+
+
+def test_charge_many_reserves_what_fits(ledger):
+    ledger.charge("videos.list")
+    assert ledger.charge_many("playlistItems.list", 20) == 9
+    assert ledger.used_today() == 10
+    assert ledger.charge_many("playlistItems.list", 5) == 0
+    assert ledger.used_today() == 10
+
+
+def test_refund_returns_units_and_calls(ledger):
+    usage = RunUsage()
+    token = current_run.set(usage)
+    try:
+        assert ledger.charge_many("videos.list", 6) == 6
+        ledger.refund("videos.list", 4)
+    finally:
+        current_run.reset(token)
+    assert ledger.used_today() == 2
+    assert ledger.daily_rows()[0]["calls"] == 2
+    assert usage.totals()["units"] == 2
+
+
+def test_per_key_budget(ledger):
+    ledger.register_keys(["k1", "k2"])
+    assert ledger.total_budget == 20
+    assert ledger.charge_many("videos.list", 15, "k1") == 10
+    with pytest.raises(QuotaBudgetExceeded):
+        ledger.charge("videos.list", "k1")
+    ledger.charge("videos.list", "k2")
+    assert ledger.used_by_key("k1") == 10
+    assert ledger.used_by_key("k2") == 1
+    assert ledger.remaining_today() == 9
+    ledger.mark_key_exhausted("k2")
+    assert ledger.remaining_today() == 0
+
+
+# ===== _send_batch の計上と取り消し =====
+class _FakePool:
+    ids = {"key": "k1"}
+
+    def __len__(self):
+        return 1
+
+    def acquire(self):
+        return "key"
+
+    def mark_exhausted(self, key):
+        pass
+
+    def mark_failed(self, key):
+        pass
+
+
+class _FakeRequest:
+    def __init__(self, params):
+        self.params = params
+        self.headers = {}
+
+
+class _FakeYouTube:
+    def videos(self):
+        return self
+
+    def list(self, **params):
+        return _FakeRequest(params)
+
+
+class _FakeBatch:
+    """answer 件目までだけ応答を返すバッチ（残りは送られなかった扱い）"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.requests = []
+
+    def add(self, request, callback, request_id):
+        self.requests.append((request_id, callback))
+
+    def execute(self):
+        for request_id, callback in self.requests[: self.answer]:
+            callback(request_id, {"items": [], "id": request_id}, None)
+
+
+class _DirectScheduler:
+    def __init__(self, attempts=1):
+        self.attempts = attempts
+
+    def call(self, fn):
+        for _ in range(self.attempts):
+            fn()
+
+
+def _patch_batch(monkeypatch, tmp_path, ledger, answer, attempts=1):
+    @contextmanager
+    def youtube_client(key):
+        yield _FakeYouTube()
+
+    batches = []
+
+    def new_batch(youtube):
+        batches.append(_FakeBatch(answer))
+        return batches[-1]
+
+    monkeypatch.setattr(client, "get_quota_ledger", lambda: ledger)
+    monkeypatch.setattr(client, "get_key_pool", lambda api_key: _FakePool())
+    monkeypatch.setattr(client, "get_response_cache", lambda: ResponseCache(str(tmp_path / "c.sqlite3"), 10**9))
+    monkeypatch.setattr(client, "youtube_client", youtube_client)
+    monkeypatch.setattr(client, "_new_batch", new_batch)
+    monkeypatch.setattr(client, "get_request_scheduler", lambda: _DirectScheduler(attempts))
+    return batches
+
+
+def test_send_batch_refunds_unanswered_requests(ledger, tmp_path, monkeypatch):
+    _patch_batch(monkeypatch, tmp_path, ledger, answer=3)
+    items = [(i, {"id": f"v{i}"}) for i in range(5)]
+    results = [None] * 5
+    failed = client._send_batch("key", "videos", items, results)
+    assert failed == [3, 4]
+    assert ledger.used_today() == 3
+    assert ledger.used_by_key("k1") == 3
+
+
+def test_send_batch_charges_once_across_retries(ledger, tmp_path, monkeypatch):
+    _patch_batch(monkeypatch, tmp_path, ledger, answer=5, attempts=2)
+    items = [(i, {"id": f"v{i}"}) for i in range(5)]
+    client._send_batch("key", "videos", items, [None] * 5)
+    assert ledger.used_today() == 5
+
+
+def test_send_batch_sends_only_what_fits_the_budget(ledger, tmp_path, monkeypatch):
+    batches = _patch_batch(monkeypatch, tmp_path, ledger, answer=100)
+    ledger.charge_many("videos.list", 7, "k1")
+    items = [(i, {"id": f"v{i}"}) for i in range(5)]
+    failed = client._send_batch("key", "videos", items, [None] * 5)
+    assert len(batches[0].requests) == 3
+    assert failed == [3, 4]
+    assert ledger.used_by_key("k1") == 10
@@ -0,0 +1,60 @@
+import threading
+
+from vtuber_analyzer import ranking
+from vtuber_analyzer.ranking import MetricStore, RankingIndex, format_rank
+
+
+def _row(cid, subs, views_per_sub):
+    return {"channelId": cid, "title": cid, "subscriberCount": subs, "views_per_sub": views_per_sub}
+
+
+def test_percentile_top_and_count_per_band(tmp_path):
+    index = RankingIndex(MetricStore(str(tmp_path / "r.sqlite3")))
+    index.update([_row("a", 5_000, 1.0), _row("b", 50_000, 2.0), _row("c", 60_000, 3.0)])
+    assert index.percentile("views_per_sub", 2.0) == 100.0 * 2 / 3
+    assert [r["channelId"] for r in index.top("views_per_sub", 2)] == ["c", "b"]
+    assert index.count("views_per_sub") == 3
+    assert index.count("views_per_sub", "10k-100k") == 2
+    assert format_rank(index.percentile("views_per_sub", 3.0), index.count("views_per_sub")) == "上位 33% / 3 ch"
+
+
+def test_update_replaces_previous_values(tmp_path):
+    index = RankingIndex(MetricStore(str(tmp_path / "r.sqlite3")))
+    index.update([_row("a", 5_000, 1.0), _row("b", 5_000, 2.0)])
+    index.update([_row("a", 500_000, 5.0)])
+    assert index.count("views_per_sub") == 2
+    assert index.count("views_per_sub", "<10k") == 1
+    assert index.top("views_per_sub", 1)[0]["channelId"] == "a"
+
+
+def test_many_updates_are_rebuilt_once(tmp_path, monkeypatch):
+    index = RankingIndex(MetricStore(str(tmp_path / "r.sqlite3")))
+    rebuilds = []
+    rebuild = index._rebuild
+    monkeypatch.setattr(index, "_rebuild", lambda: (rebuilds.append(1), rebuild()))
+    n = ranking._INSORT_MAX_ENTRIES + 10
+    for i in range(n):
+        index.update([_row(f"c{i}", 1_000, float(i))])
+    assert rebuilds == []
+    assert index.count("views_per_sub") == n
+    assert len(rebuilds) == 1
+
+
+def test_reload_picks_up_other_writers_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "r.sqlite3")
+    writer = RankingIndex(MetricStore(path))
+    reader = RankingIndex(MetricStore(path))
+    writer.update([_row(f"c{i}", 1_000, float(i)) for i in range(5)])
+
+    applied = []
+    apply = reader._apply
+    monkeypatch.setattr(reader, "_apply", lambda entries: (applied.append(len(entries)), apply(entries)))
+    monkeypatch.setattr(ranking.settings, "ranking_reload_interval", 0.0)
+    threads = [threading.Thread(target=reader.reload) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    reader.reload(force=True)
+    assert sum(applied) == 5
+    assert reader.count("views_per_sub") == 5
@@ -0,0 +1,46 @@
+import pytest
+
+from vtuber_analyzer.resolver import _lookup_steps, alias_key, local_channel_id, parse_channel_ref
+
+CHANNEL_ID = "UC" + "a" * 22
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (CHANNEL_ID, ("id", CHANNEL_ID)),
+        (f"https://www.youtube.com/channel/{CHANNEL_ID}", ("id", CHANNEL_ID)),
+        ("@foo", ("handle", "@foo")),
+        ("@foo/videos", ("handle", "@foo")),
+        ("@foo?si=abc", ("handle", "@foo")),
+        ("https://www.youtube.com/@foo/streams", ("handle", "@foo")),
+        ("youtube.com/@foo", ("handle", "@foo")),
+        ("https://www.youtube.com/user/foo", ("user", "foo")),
+        ("https://www.youtube.com/c/Foo", ("custom", "Foo")),
+        ("https://www.youtube.com/Foo", ("custom", "Foo")),
+        ("https://youtu.be/abcdefghijk", ("video", "abcdefghijk")),
+        ("https://www.youtube.com/watch?v=abcdefghijk&t=3", ("video", "abcdefghijk")),
+        ("https://www.youtube.com/shorts/abcdefghijk", ("video", "abcdefghijk")),
+        ("foo", ("query", "foo")),
+        ("Foo Bar", ("query", "Foo Bar")),
+        ("@foo bar", ("query", "@foo bar")),
+        ("  ", ("query", "")),
+    ],
+)
+def test_parse_channel_ref(text, expected):
+    assert parse_channel_ref(text) == expected
+
+
+def test_local_channel_id():
+    assert local_channel_id(f"youtube.com/channel/{CHANNEL_ID}") == CHANNEL_ID
+    assert local_channel_id("@foo") is None
+
+
+def test_alias_key_ignores_case_and_at_sign():
+    assert alias_key("handle", "@Foo") == alias_key("handle", "foo") == "handle:foo"
+    assert alias_key("video", "AbCdEfGhIjK") == "video:AbCdEfGhIjK"
+
+
+def test_bare_query_uses_search_only():
+    assert [method for method, *_ in _lookup_steps("query", "foo")] == ["search"]
+    assert [method for method, *_ in _lookup_steps("handle", "@foo")] == ["forHandle", "search"]
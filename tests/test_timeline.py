@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from vtuber_analyzer.timeline import FORMAT_LIVE, FORMAT_SHORT, FORMAT_VOD, UploadTimeline
+
+NOW = datetime(2026, 1, 31, tzinfo=timezone.utc)
+
+
+def _iso(days_ago):
+    return (NOW - timedelta(days=days_ago)).isoformat().replace("+00:00", "Z")
+
+
+def _timeline():
+    uploads = [
+        {"videoId": "old", "publishedAt": _iso(40)},
+        {"videoId": "mid", "publishedAt": _iso(20)},
+        {"videoId": "new", "publishedAt": _iso(3)},
+        {"videoId": "edge", "publishedAt": _iso(7)},
+        {"videoId": "gone", "publishedAt": _iso(1)},
+        {"videoId": "new", "publishedAt": _iso(3)},
+    ]
+    stats = {
+        "old": {"title": "Old\nstream", "viewCount": 1000, "format": FORMAT_LIVE},
+        "mid": {"title": "Mid", "viewCount": 300, "format": FORMAT_VOD},
+        "new": {"title": "New", "viewCount": 50, "format": FORMAT_SHORT},
+        "edge": {"title": "Edge", "viewCount": 200, "format": FORMAT_SHORT},
+    }
+    return UploadTimeline(uploads, stats)
+
+
+def test_skips_missing_stats_and_duplicates():
+    timeline = _timeline()
+    assert timeline.video_ids == ["old", "mid", "edge", "new"]
+    assert timeline.titles[0] == "Old stream"
+
+
+def test_windows_share_one_reference_time():
+    result = _timeline().windows([7, 30, 365], now=NOW.timestamp())
+    assert result[7]["num_videos"] == 2
+    assert result[7]["total_views"] == 250
+    assert (result[7]["top_video_id"], result[7]["top_views"]) == ("edge", 200)
+    assert result[7]["top_share"] == 0.8
+    assert result[30]["total_views"] == 550
+    assert result[365]["total_views"] == 1550
+    assert result[365]["top_title"] == "Old stream"
+
+
+def test_empty_window():
+    window = _timeline().window(1, now=NOW.timestamp())
+    assert window["num_videos"] == 0
+    assert window["top_video_id"] is None
+    assert window["top_share"] == 0.0
+    assert window["avg_views_per_video"] == 0.0
+
+
+def test_top_k_and_covered():
+    timeline = _timeline()
+    assert [vid for vid, _, _ in timeline.top(30, 2, NOW.timestamp())] == ["mid", "edge"]
+    assert timeline.covered(30, {"mid", "new", "old"}, NOW.timestamp()) == (2, 350)
+
+
+def test_windows_by_format():
+    result = _timeline().windows_by_format([30], now=NOW.timestamp())
+    assert result[FORMAT_SHORT][30]["total_views"] == 250
+    assert result[FORMAT_VOD][30]["num_videos"] == 1
+    assert result[FORMAT_LIVE][30]["num_videos"] == 0
@@ -0,0 +1,54 @@
+from vtuber_analyzer import worker
+from vtuber_analyzer.quota import QuotaBudgetExceeded
+from vtuber_analyzer.reports import ReportStore
+
+
+def _store(tmp_path, channel_ids):
+    store = ReportStore(str(tmp_path / "reports.sqlite3"))
+    store.watch(channel_ids)
+    return store
+
+
+def test_run_once_skips_failing_batch_and_continues(tmp_path, monkeypatch):
+    store = _store(tmp_path, ["UC1", "UC2", "UC3", "UC4"])
+    monkeypatch.setattr(worker, "plan_quota", lambda batch, include, playlist_index=False: True)
+
+    def build(batch, api_key, include_playlists, playlist_index):
+        if "UC1" in batch:
+            raise RuntimeError("database is locked")
+        return {cid: {"basic": {"channelId": cid}} for cid in batch}
+
+    monkeypatch.setattr(worker, "build_reports", build)
+    updated = worker.run_once("k", store, batch_size=1)
+    assert sorted(updated) == ["UC2", "UC3", "UC4"]
+    assert set(store.computed_at()) == {"UC2", "UC3", "UC4"}
+
+
+def test_run_once_stops_on_quota_error(tmp_path, monkeypatch):
+    store = _store(tmp_path, ["UC1", "UC2"])
+    monkeypatch.setattr(worker, "plan_quota", lambda batch, include, playlist_index=False: True)
+
+    def build(batch, api_key, include_playlists, playlist_index):
+        raise QuotaBudgetExceeded("budget")
+
+    monkeypatch.setattr(worker, "build_reports", build)
+    assert worker.run_once("k", store, batch_size=1) == []
+
+
+def test_run_forever_keeps_running_after_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "get_report_store", lambda: _store(tmp_path, []))
+    calls = []
+
+    def run_once(api_key, store, batch_size, playlist_index=False):
+        calls.append(batch_size)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return []
+
+    sleeps = []
+    monkeypatch.setattr(worker, "run_once", run_once)
+    monkeypatch.setattr(worker.time, "sleep", sleeps.append)
+    worker.run_forever("k", poll_interval=10.0, batch_size=5, iterations=3)
+    assert len(calls) == 3
+    # 失敗の直後は待ち時間を倍にし、成功したら元に戻す
+    assert sleeps == [20.0, 10.0]
@@ -0,0 +1,205 @@
+"""
+VTuber（YouTube チャンネル）統計の取得・集計ライブラリ。
+
+Streamlit に依存しないので、CLI（python -m vtuber_analyzer）やバッチから直接使える。
+"""
+from .analysis import (
+    STAGE_BASIC,
+    STAGE_PLAYLISTS,
+    STAGE_RECENT,
+    analyze_cohort,
+    cohort_output_columns,
+    estimate_run_cost,
+    fetch_channel_data,
+    iter_channel_data,
+    parse_channel_list,
+    plan_quota,
+    refresh_channels,
+    resolve_channels,
+    write_cohort_csv,
+)
+from .catalog import CATALOG_COLUMNS, VideoCatalog, catalog_distribution, crawl_catalog, estimate_crawl_cost
+from .config import configure, settings
+from .export import (
+    EXPORT_FORMATS,
+    PLAYLIST_COLUMNS,
+    SUMMARY_TABLE,
+    VIDEO_COLUMNS,
+    CohortDetails,
+    export_tables,
+    write_csv,
+    write_parquet,
+    write_xlsx,
+)
+from .fetchers import (
+    get_channel_basic,
+    get_channels_basic,
+    get_playlists_meta,
+    get_playlists_meta_many,
+    get_recent_uploads,
+    get_recent_uploads_many,
+    get_uploads_since,
+    get_uploads_since_many,
+    get_videos_stats,
+    iter_playlist_pages_many,
+    iter_upload_pages,
+    uploads_playlist_id_for,
+    video_ids_within,
+)
+from .history import GROWTH_COLUMNS, GROWTH_PERIODS, SnapshotStore, get_snapshot_store
+from .keypool import KeyPool, get_key_pool, parse_api_keys
+from .metrics import (
+    COHORT_COLUMNS,
+    RECENT_WINDOWS,
+    cohort_columns,
+    compute_channel_metrics,
+    compute_channels_metrics,
+    compute_metrics,
+    playlist_coverage_columns,
+    table_rows,
+    top_playlists,
+    window_key,
+)
+from .playlists import (
+    PlaylistDigest,
+    PlaylistIndexStore,
+    digest_playlists,
+    digest_playlists_many,
+    get_playlist_index_store,
+    index_playlists,
+)
+from .quota import (
+    QuotaBudgetExceeded,
+    QuotaError,
+    QuotaExhausted,
+    RunUsage,
+    current_run,
+    get_quota_ledger,
+    quota_day,
+)
+from .ranking import (
+    RANKED_METRICS,
+    SUBSCRIBER_BANDS,
+    MetricStore,
+    RankingIndex,
+    format_rank,
+    get_metric_store,
+    get_ranking_index,
+    ranked_metrics,
+)
+from .reports import ReportStore, get_report_store
+from .resolver import (
+    AliasIndex,
+    estimate_resolve_cost,
+    get_alias_index,
+    parse_channel_ref,
+    resolve_channel_id_simple,
+    resolve_locally,
+    resolve_many,
+)
+from .timeline import VIDEO_FORMATS, UploadTimeline
+from .tracing import SlowRunLog, Trace, current_trace, finish_trace, get_slow_run_log, span, traced
+from .worker import build_reports, run_once
+
+__all__ = [
+    "AliasIndex",
+    "CATALOG_COLUMNS",
+    "COHORT_COLUMNS",
+    "CohortDetails",
+    "EXPORT_FORMATS",
+    "GROWTH_COLUMNS",
+    "GROWTH_PERIODS",
+    "KeyPool",
+    "MetricStore",
+    "PLAYLIST_COLUMNS",
+    "PlaylistDigest",
+    "PlaylistIndexStore",
+    "QuotaBudgetExceeded",
+    "QuotaError",
+    "QuotaExhausted",
+    "RANKED_METRICS",
+    "RECENT_WINDOWS",
+    "RankingIndex",
+    "ReportStore",
+    "RunUsage",
+    "STAGE_BASIC",
+    "STAGE_PLAYLISTS",
+    "STAGE_RECENT",
+    "SUBSCRIBER_BANDS",
+    "SUMMARY_TABLE",
+    "SlowRunLog",
+    "SnapshotStore",
+    "Trace",
+    "UploadTimeline",
+    "VIDEO_COLUMNS",
+    "VIDEO_FORMATS",
+    "VideoCatalog",
+    "analyze_cohort",
+    "build_reports",
+    "catalog_distribution",
+    "cohort_columns",
+    "cohort_output_columns",
+    "compute_channel_metrics",
+    "compute_channels_metrics",
+    "compute_metrics",
+    "configure",
+    "crawl_catalog",
+    "current_run",
+    "current_trace",
+    "digest_playlists",
+    "digest_playlists_many",
+    "estimate_crawl_cost",
+    "estimate_resolve_cost",
+    "estimate_run_cost",
+    "export_tables",
+    "fetch_channel_data",
+    "finish_trace",
+    "format_rank",
+    "get_alias_index",
+    "get_channel_basic",
+    "get_key_pool",
+    "get_metric_store",
+    "get_channels_basic",
+    "get_playlist_index_store",
+    "get_playlists_meta",
+    "get_playlists_meta_many",
+    "get_quota_ledger",
+    "get_ranking_index",
+    "get_recent_uploads",
+    "get_recent_uploads_many",
+    "get_report_store",
+    "get_slow_run_log",
+    "get_snapshot_store",
+    "get_uploads_since",
+    "get_uploads_since_many",
+    "get_videos_stats",
+    "index_playlists",
+    "iter_channel_data",
+    "iter_playlist_pages_many",
+    "iter_upload_pages",
+    "parse_api_keys",
+    "parse_channel_list",
+    "parse_channel_ref",
+    "plan_quota",
+    "playlist_coverage_columns",
+    "quota_day",
+    "ranked_metrics",
+    "refresh_channels",
+    "resolve_channel_id_simple",
+    "resolve_channels",
+    "resolve_locally",
+    "resolve_many",
+    "run_once",
+    "settings",
+    "span",
+    "table_rows",
+    "top_playlists",
+    "traced",
+    "uploads_playlist_id_for",
+    "video_ids_within",
+    "window_key",
+    "write_cohort_csv",
+    "write_csv",
+    "write_parquet",
+    "write_xlsx",
+]
@@ -0,0 +1,413 @@
+"""
+集計パイプライン（取得 → 指標計算）
+
+Streamlit アプリと CLI の両方から使う。
+"""
+import math
+from concurrent.futures import as_completed
+from datetime import timedelta
+from typing import Dict, IO, Iterator, List, Optional, Sequence, Tuple
+
+from .concurrency import submit_fetch
+from .fetchers import (
+    get_channel_basic,
+    get_channels_basic,
+    get_recent_uploads,
+    get_recent_uploads_many,
+    get_uploads_since_many,
+    get_videos_stats,
+    uploads_playlist_id_for,
+)
+from .export import CohortDetails, write_csv
+from .history import GROWTH_COLUMNS, TRACKING_DAYS, SnapshotStore, snapshot_date
+from .metrics import (
+    RECENT_WINDOWS,
+    cohort_columns,
+    compute_channels_metrics,
+    playlist_coverage_columns,
+    window_key,
+)
+from .playlists import PlaylistDigest, digest_playlists_many, get_playlist_index_store, index_playlists
+from .quota import get_quota_ledger, quota_cost
+from .ranking import RankingIndex, get_metric_store
+from .resolver import estimate_resolve_cost, resolve_locally, resolve_many
+from .timeline import UploadTimeline
+from .tracing import annotate, span, traced
+from .utils import parse_iso_datetime, utcnow
+
+
+# ===== 単体チャンネルのデータ取得 =====
+# iter_channel_data が返す段階
+STAGE_BASIC = "basic"
+STAGE_PLAYLISTS = "playlists"
+STAGE_RECENT = "recent"
+
+
+@traced("fetch.recent")
+def _fetch_recent(channel_id: str, api_key: str, windows: Sequence[int]) -> Dict:
+    # uploads プレイリストを最大ウィンドウ分だけ1回たどり、各ウィンドウはタイムライン上の範囲として扱う
+    recent_uploads = get_recent_uploads(uploads_playlist_id_for(channel_id), max(windows), api_key)
+    video_ids = [u["videoId"] for u in recent_uploads]
+    video_stats = get_videos_stats(tuple(video_ids), api_key) if video_ids else {}
+    return {
+        "timeline": UploadTimeline(recent_uploads, video_stats),
+        "uploads": recent_uploads,
+        "video_stats": video_stats,
+    }
+
+
+def _fetch_playlists(
+    channel_ids: Tuple[str, ...], api_key: str, keep_all: bool, playlist_index: bool
+) -> Dict[str, PlaylistDigest]:
+    digests = digest_playlists_many(channel_ids, api_key, keep_all=keep_all)
+    if playlist_index:
+        index_playlists(digests, api_key)
+    return digests
+
+
+def iter_channel_data(
+    channel_id: str,
+    api_key: str,
+    include_playlists: bool = True,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    keep_playlists: bool = False,
+    playlist_index: bool = False,
+) -> Iterator[Tuple[str, object]]:
+    """
+    1チャンネル分の取得を並列に投げ、終わった順に (段階, 結果) を返す（画面を段階的に描くため）。
+    - STAGE_BASIC: get_channel_basic の結果（取得失敗時 None）
+    - STAGE_PLAYLISTS: PlaylistDigest（include_playlists のときだけ。全件は keep_playlists のときだけ持つ。
+      playlist_index なら収録動画の索引も作り、playlisted に入れる）
+    - STAGE_RECENT: {"timeline", "uploads", "video_stats"}（直近アップロード → 動画 stats の連鎖）
+    """
+    futures = {
+        submit_fetch(get_channel_basic, channel_id, api_key): STAGE_BASIC,
+        submit_fetch(_fetch_recent, channel_id, api_key, windows): STAGE_RECENT,
+    }
+    if include_playlists:
+        futures[
+            submit_fetch(_fetch_playlists, (channel_id,), api_key, keep_playlists, playlist_index)
+        ] = STAGE_PLAYLISTS
+    for future in as_completed(futures):
+        stage, value = futures[future], future.result()
+        yield stage, (value[channel_id] if stage == STAGE_PLAYLISTS else value)
+
+
+def fetch_channel_data(
+    channel_id: str,
+    api_key: str,
+    include_playlists: bool = True,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlist_index: bool = False,
+) -> Dict:
+    """
+    1チャンネル分の集計に必要なデータをまとめて取得する（iter_channel_data を全段階待つ）。
+    戻り値: {"basic", "timeline", "playlists", "playlisted", "uploads", "video_stats"}
+    （basic は取得失敗時 None。playlisted は playlist_index のときだけ、収録動画IDの集合）
+    """
+    data: Dict = {"basic": None, "playlists": [], "playlisted": None}
+    for stage, value in iter_channel_data(channel_id, api_key, include_playlists, windows, True, playlist_index):
+        if stage == STAGE_RECENT:
+            data.update(value)
+        elif stage == STAGE_PLAYLISTS:
+            data.update(playlists=value.playlists, playlisted=value.playlisted)
+        else:
+            data[stage] = value
+    return data
+
+
+# ===== コホート（複数チャンネル一括）集計 =====
+def parse_channel_list(text: str) -> List[str]:
+    """
+    改行区切りのチャンネル一覧（URL / ID / 表示名）を重複なしで返す。
+    CSV の場合は各行の先頭列を使い、空行と # で始まる行は無視する。
+    """
+    entries: List[str] = []
+    for line in (text or "").splitlines():
+        value = line.split(",")[0].strip().strip('"')
+        if value and not value.startswith("#") and value not in entries:
+            entries.append(value)
+    return entries
+
+
+def resolve_channels(entries: List[str], api_key: str) -> Tuple[List[str], List[str]]:
+    """
+    入力一覧をまとめてチャンネルIDへ解決する（resolve_many）。
+    戻り値: (重複なしのチャンネルID, 解決できなかった入力)
+    """
+    channel_ids: List[str] = []
+    unresolved: List[str] = []
+    resolved = resolve_many(entries, api_key)
+    for entry in entries:
+        cid = resolved.get(entry)
+        if not cid:
+            unresolved.append(entry)
+        elif cid not in channel_ids:
+            channel_ids.append(cid)
+    return channel_ids, unresolved
+
+
+@traced("cohort")
+def analyze_cohort(
+    channel_ids: List[str],
+    api_key: str,
+    include_playlists: bool = True,
+    store: Optional[SnapshotStore] = None,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    details: Optional[CohortDetails] = None,
+    ranking: Optional[RankingIndex] = None,
+    playlist_index: bool = False,
+) -> List[Dict]:
+    """
+    複数チャンネルをまとめて集計し、1チャンネル1行の指標リストを返す。
+    - channels().list は 50 チャンネルずつ
+    - 全チャンネルの直近動画IDを1つにまとめて videos().list を 50 件ずつ
+    - 基本情報・直近アップロード・プレイリストはチャンネルIDだけで並列に取得する
+    - 直近アップロード・プレイリストは全チャンネルの同じページ目を HTTP バッチにまとめてたどる
+    - store を渡すと各チャンネルのスナップショットを保存し、成長指標（GROWTH_COLUMNS）も行に加える
+    - windows は直近ウィンドウの日数（最大ウィンドウ分を1回だけ取得し、全ウィンドウに使い回す）
+    - details を渡すと、チャンネル基本情報と動画単位・プレイリスト単位の明細（export 用）も受け取る
+    - ranking を渡すと、集計した指標を順位索引に反映する
+    - プレイリストは件数と上位だけを持ち（全件は details のときだけ）、playlist_index なら収録動画の索引を
+      増分更新して収録率の指標（playlist_coverage_columns）も加える
+    """
+    annotate(channels=len(channel_ids))
+    basics_future = submit_fetch(get_channels_basic, tuple(channel_ids), api_key)
+    playlists_future = (
+        submit_fetch(
+            _fetch_playlists, tuple(channel_ids), api_key, details is not None and details.keep_rows, playlist_index
+        )
+        if include_playlists
+        else None
+    )
+    uploads_list = get_recent_uploads_many(
+        [uploads_playlist_id_for(cid) for cid in channel_ids], max(windows), api_key
+    )
+    uploads_by_channel: Dict[str, List[Dict]] = dict(zip(channel_ids, uploads_list))
+
+    all_ids = sorted({u["videoId"] for ups in uploads_by_channel.values() for u in ups})
+    all_stats = get_videos_stats(tuple(all_ids), api_key) if all_ids else {}
+    basics = basics_future.result()
+
+    found = [cid for cid in channel_ids if basics.get(cid)]
+    stats_by_channel = {
+        cid: {u["videoId"]: all_stats[u["videoId"]] for u in uploads_by_channel[cid] if u["videoId"] in all_stats}
+        for cid in found
+    }
+    digests: Dict[str, PlaylistDigest] = playlists_future.result() if playlists_future else {}
+    with span("compute.metrics", channels=len(found)):
+        timelines = [UploadTimeline(uploads_by_channel[cid], stats_by_channel[cid]) for cid in found]
+        playlist_counts = [digests[cid].count if cid in digests else 0 for cid in found]
+        playlisted = [digests[cid].playlisted if cid in digests else None for cid in found]
+        # 全チャンネルの指標を1回のベクトル演算で計算する
+        rows = compute_channels_metrics(
+            [basics[cid] for cid in found],
+            timelines,
+            playlist_counts,
+            windows,
+            playlisted if include_playlists and playlist_index else None,
+        )
+
+    if details is not None:
+        for cid in found:
+            digest = digests.get(cid)
+            details.add(
+                cid,
+                basics[cid],
+                uploads_by_channel[cid],
+                stats_by_channel[cid],
+                (digest.playlists or []) if digest else [],
+                digest.top() if digest else [],
+            )
+
+    if store is not None:
+        with span("store.snapshots"):
+            for cid, row in zip(found, rows):
+                store.record(basics[cid], stats_by_channel[cid], uploads_by_channel[cid])
+                row.update(store.growth(cid))
+
+    if ranking is not None:
+        with span("store.ranking"):
+            ranking.update(rows)
+
+    return rows
+
+
+# ===== 増分更新（スナップショット） =====
+def refresh_channels(
+    channel_ids: List[str],
+    api_key: str,
+    store: SnapshotStore,
+    force: bool = False,
+) -> List[Dict]:
+    """
+    保存済みスナップショットを起点に、変化した分だけを取得して新しいスナップショットを保存する。
+    - 本日分を保存済みのチャンネルは API を呼ばずにスキップ（force で取り直し）
+    - uploads プレイリストは「前回までに見た最新の動画」か TRACKING_DAYS 日前の古い方まで遡る
+      （新着動画の検出と、まだ再生数が伸びている動画の stats 更新だけを行う）
+    戻り値: チャンネルごとの成長指標行（channelId / title / snapshot_date + GROWTH_COLUMNS）
+    """
+    today = snapshot_date()
+    targets = [
+        cid for cid in channel_ids
+        if force or (store.latest(cid) or {}).get("snapshot_date") != today
+    ]
+
+    if targets:
+        basics_future = submit_fetch(get_channels_basic, tuple(targets), api_key)
+        tracking_cutoff = utcnow() - timedelta(days=TRACKING_DAYS)
+        args = []
+        for cid in targets:
+            newest = parse_iso_datetime(store.newest_upload_published_at(cid))
+            since = min(newest, tracking_cutoff) if newest else tracking_cutoff
+            args.append((uploads_playlist_id_for(cid), since))
+        uploads_by_channel = dict(zip(targets, get_uploads_since_many(args, api_key)))
+
+        all_ids = sorted({u["videoId"] for ups in uploads_by_channel.values() for u in ups})
+        all_stats = get_videos_stats(tuple(all_ids), api_key) if all_ids else {}
+        basics = basics_future.result()
+
+        for cid in targets:
+            basic = basics.get(cid)
+            if not basic:
+                continue
+            uploads = uploads_by_channel[cid]
+            stats = {u["videoId"]: all_stats[u["videoId"]] for u in uploads if u["videoId"] in all_stats}
+            store.record(basic, stats, uploads)
+
+    rows: List[Dict] = []
+    for cid in channel_ids:
+        latest = store.latest(cid)
+        if not latest:
+            continue
+        rows.append(
+            {
+                "channelId": cid,
+                "title": latest["title"],
+                "snapshot_date": latest["snapshot_date"],
+                **store.growth(cid),
+            }
+        )
+    return rows
+
+
+def cohort_output_columns(rows: List[Dict], windows: Sequence[int] = RECENT_WINDOWS) -> List[str]:
+    """
+    cohort_columns(windows) の列順（成長指標を含む行なら GROWTH_COLUMNS、
+    プレイリスト収録率を含む行なら playlist_coverage_columns も続ける）
+    """
+    columns = cohort_columns(windows)
+    if any(col in row for row in rows for col in GROWTH_COLUMNS):
+        columns += GROWTH_COLUMNS
+    if any("playlist_coverage" in row for row in rows):
+        columns += playlist_coverage_columns(windows)
+    return columns
+
+
+def write_cohort_csv(
+    rows: List[Dict],
+    fp: IO[str],
+    columns: Optional[List[str]] = None,
+    windows: Sequence[int] = RECENT_WINDOWS,
+) -> None:
+    """
+    1チャンネル1行の指標を CSV に書き出す（columns 省略時は cohort_output_columns の列順）
+    """
+    write_csv(rows, fp, columns or cohort_output_columns(rows, windows))
+
+
+# ===== クォータ見積もり =====
+# 前回の指標がないチャンネルの見込み（1日2本の投稿、プレイリスト20件）
+_DEFAULT_UPLOADS_PER_DAY = 2.0
+_DEFAULT_PLAYLISTS = 20
+
+
+def _pages(n: float, per_page: int = 50) -> int:
+    """n 件を取るのに要るページ数（0 件でも1ページは呼ぶ）"""
+    return max(1, math.ceil(n / per_page))
+
+
+def _recent_uploads(metrics: Optional[Dict[str, float]], days: int) -> float:
+    """
+    直近 days 日の投稿数の見込み。前回の num_videos_last{d} のうち days 以上で最小のウィンドウを使い、
+    なければ最大のウィンドウを日数比で伸ばす。前回の指標がなければ既定値
+    """
+    stored = sorted(
+        (d, metrics[f"num_videos_{window_key(d)}"])
+        for d in RECENT_WINDOWS
+        if metrics and f"num_videos_{window_key(d)}" in metrics
+    )
+    if not stored:
+        return days * _DEFAULT_UPLOADS_PER_DAY
+    for d, num in stored:
+        if d >= days:
+            return num
+    d, num = stored[-1]
+    return num * days / d
+
+
+def estimate_run_cost(
+    entries: List[str],
+    include_playlists: bool = True,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlist_index: bool = False,
+) -> int:
+    """
+    集計1回に必要なユニット数の見積もり（キャッシュヒットは考慮しない）。
+    チャンネルごとの件数は前回の指標（MetricStore）とプレイリスト索引から見込み、
+    前回の指標がないチャンネルは既定値（1日2本の投稿、プレイリスト20件）で数える。
+    - 入力の解決: estimate_resolve_cost
+    - channels().list: 50 件ごとに 1
+    - 直近アップロード: チャンネルごとに max(windows) 日分の投稿数の 50 件ごとに 1（最低 1）
+    - 動画 stats: 直近アップロードの動画数の合計の 50 件ごとに 1
+    - プレイリスト一覧: チャンネルごとにプレイリスト数の 50 件ごとに 1（最低 1）
+    - playlist_index: 全プレイリストを取り直した場合の playlistItems のページ数
+      （索引済みなら保存した itemCount、未索引ならプレイリスト1件につき1ページ。
+      実際は itemCount が変わったものだけ取り直すので、これより少なくなる）
+    見込みより投稿が増えていれば超えることがある。
+    """
+    n = len(entries)
+    days = max(windows) if windows else max(RECENT_WINDOWS)
+    local = resolve_locally(entries)
+    known = get_metric_store().get_many(list(local.values())) if local else {}
+    per_channel = [known.get(local.get(entry, "")) for entry in entries]
+
+    uploads = [_recent_uploads(m, days) for m in per_channel]
+    cost = estimate_resolve_cost(entries) + math.ceil(n / 50) * quota_cost("channels.list")
+    cost += sum(_pages(u) for u in uploads) * quota_cost("playlistItems.list")
+    cost += math.ceil(sum(uploads) / 50) * quota_cost("videos.list")
+    if not include_playlists:
+        return cost
+
+    playlists = [
+        round(m.get("playlists_per_video", 0) * m.get("videoCount", 0)) if m else _DEFAULT_PLAYLISTS
+        for m in per_channel
+    ]
+    cost += sum(_pages(p) for p in playlists) * quota_cost("playlists.list")
+    if playlist_index:
+        indexed = get_playlist_index_store().item_counts_by_channel(local.values()) if local else {}
+        pages = 0
+        for entry, p in zip(entries, playlists):
+            counts = indexed.get(local.get(entry, ""))
+            pages += sum(_pages(c) for c in counts) if counts else p
+        cost += pages * quota_cost("playlistItems.list")
+    return cost
+
+
+def plan_quota(
+    entries: List[str],
+    include_playlists: bool,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlist_index: bool = False,
+) -> Optional[bool]:
+    """
+    本日のクォータ残りで集計できるかを見積もる。
+    足りなければプレイリスト集計（と索引）を省いた計画にし、それでも足りなければ None を返す。
+    戻り値: プレイリストを集計するかどうか（集計不可なら None）
+    """
+    remaining = get_quota_ledger().remaining_today()
+    if estimate_run_cost(entries, include_playlists, windows, playlist_index) <= remaining:
+        return include_playlists
+    if include_playlists and estimate_run_cost(entries, False, windows) <= remaining:
+        return False
+    return None
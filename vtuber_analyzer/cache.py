@@ -0,0 +1,283 @@
+"""
+永続レスポンスキャッシュ（SQLite）
+
+再デプロイ・再起動をまたいで、同じホスト上の全プロセスで共有する。
+"""
+import functools
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+from .storage import SQLiteStore
+from .utils import parse_iso_datetime
+
+# エンドポイントごとの鮮度（秒）。期限切れのエントリは ETag で再検証する
+ENDPOINT_TTLS: Dict[str, int] = {
+    "search.list": 86400,
+    "channels.list": 3600,
+    "playlists.list": 1800,
+    "playlistItems.list": 900,
+    # 動画ごとの鮮度は VideoStatsCache が管理するため、レスポンスキャッシュには保存しない
+    # （ID の組み合わせごとの本文はほぼ再利用されず、追い出しを増やすだけ）
+    "videos.list": 0,
+}
+DEFAULT_TTL = 900
+
+
+def is_cacheable(endpoint: str) -> bool:
+    """
+    レスポンスキャッシュに保存・参照するエンドポイントか（鮮度 0 のものは保存しない）
+    """
+    return ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL) > 0
+
+
+# 動画の経過日数ごとの stats の鮮度（秒）。(この日数未満なら, TTL) の昇順、最後は上限なし
+VIDEO_TTL_TIERS: List[Tuple[Optional[float], int]] = [
+    (1, 600),
+    (7, 3600),
+    (30, 6 * 3600),
+    (None, 24 * 3600),
+]
+
+
+def _cache_bytes(conn) -> int:
+    """
+    キャッシュファイル全体（レスポンス + 動画 stats）の本文の合計サイズ。max_bytes はこの合計に対する上限
+    """
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    total = 0
+    if "responses" in tables:
+        total += conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if "video_stats" in tables:
+        total += conn.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM video_stats").fetchone()[0]
+    return total
+
+
+class ResponseCache(SQLiteStore):
+    """
+    エンドポイント + パラメータをキーに API レスポンス(JSON)を保存する SQLite キャッシュ。
+    同じファイルの動画 stats と合わせたサイズが max_bytes を超えたら最終アクセスの古いものから削除する。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            etag TEXT,
+            body TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+    """
+    _EVICT_EVERY = 50
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict) -> str:
+        clean = {k: v for k, v in params.items() if v is not None}
+        return endpoint + "?" + json.dumps(clean, sort_keys=True, ensure_ascii=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        {"body", "etag", "fetched_at"} を返す（なければ None）
+        """
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT body, etag, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return {"body": json.loads(row[0]), "etag": row[1], "fetched_at": row[2]}
+        except Exception:
+            return None
+
+    def put(self, key: str, endpoint: str, body: Dict) -> None:
+        if not is_cacheable(endpoint):
+            return
+        try:
+            text = json.dumps(body, ensure_ascii=False)
+            now = time.time()
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body.get("etag"), text, len(text), now, now),
+            )
+            conn.commit()
+        except Exception:
+            return
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self._EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def touch(self, key: str) -> None:
+        """
+        304 Not Modified で再検証できたエントリの鮮度を更新する
+        """
+        try:
+            now = time.time()
+            conn = self._conn()
+            conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, key)
+            )
+            conn.commit()
+        except Exception:
+            pass
+
+    def evict(self) -> None:
+        """
+        合計サイズ（_cache_bytes）が上限を超えていたら、最終アクセスの古い順に上限の 90% まで削除する
+        """
+        try:
+            conn = self._conn()
+            total = _cache_bytes(conn)
+            if total <= self.max_bytes:
+                return
+            target = total - int(self.max_bytes * 0.9)
+            freed = 0
+            doomed: List[str] = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                doomed.append(key)
+                freed += size
+                if freed >= target:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in doomed])
+            conn.commit()
+        except Exception:
+            pass
+
+
+def video_stats_ttl(published_at: Optional[str], now: Optional[float] = None) -> int:
+    """
+    公開日時（ISO 8601）から stats の鮮度（秒）を決める。公開日時が不明なら最短の TTL。
+    """
+    dt = parse_iso_datetime(published_at) if published_at else None
+    if dt is None:
+        return VIDEO_TTL_TIERS[0][1]
+    age_days = ((now if now is not None else time.time()) - dt.timestamp()) / 86400
+    for max_age_days, ttl in VIDEO_TTL_TIERS:
+        if max_age_days is None or age_days < max_age_days:
+            return ttl
+    return VIDEO_TTL_TIERS[-1][1]
+
+
+class VideoStatsCache(SQLiteStore):
+    """
+    動画ID単位の stats キャッシュ（レスポンスキャッシュと同じ SQLite ファイルに置く）。
+    新しい動画ほど短い TTL にして、古い動画は取り直しの頻度を下げる。
+    put_many の _EVICT_EVERY 回ごとに期限切れの行を消し、レスポンスと合わせたサイズが max_bytes を
+    超えていれば期限の近い順にも消す（期限切れの行は使わないので残しておく意味がない）。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS video_stats (
+            video_id TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            published_at TEXT,
+            fetched_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_video_stats_expires ON video_stats(expires_at);
+    """
+    _CHUNK = 500
+    _EVICT_EVERY = 20
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def get_fresh(self, video_ids: Iterable[str], now: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        期限内の stats だけを {videoId: stats} で返す
+        """
+        now = now if now is not None else time.time()
+        ids = list(dict.fromkeys(video_ids))
+        out: Dict[str, Dict] = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(ids), self._CHUNK):
+                chunk = ids[i : i + self._CHUNK]
+                marks = ",".join("?" * len(chunk))
+                cur = conn.execute(
+                    f"SELECT video_id, body FROM video_stats WHERE video_id IN ({marks}) AND expires_at > ?",
+                    (*chunk, now),
+                )
+                for vid, body in cur:
+                    out[vid] = json.loads(body)
+        except Exception:
+            return out
+        return out
+
+    def put_many(self, stats: Dict[str, Dict], now: Optional[float] = None) -> None:
+        """
+        stats（publishedAt を含む）を保存する。TTL は公開からの経過日数で決まる。
+        """
+        if not stats:
+            return
+        now = now if now is not None else time.time()
+        rows = []
+        for vid, st in stats.items():
+            published_at = st.get("publishedAt")
+            ttl = video_stats_ttl(published_at, now)
+            rows.append((vid, json.dumps(st, ensure_ascii=False), published_at, now, now + ttl))
+        try:
+            conn = self._conn()
+            conn.executemany("INSERT OR REPLACE INTO video_stats VALUES (?, ?, ?, ?, ?)", rows)
+            conn.commit()
+        except Exception:
+            return
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % self._EVICT_EVERY == 0
+        if evict:
+            self.evict(now)
+
+    def evict(self, now: Optional[float] = None) -> None:
+        """
+        期限切れの行を消し、合計サイズ（_cache_bytes）がまだ上限を超えていれば期限の近い順に上限の 90% まで消す
+        """
+        now = now if now is not None else time.time()
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM video_stats WHERE expires_at <= ?", (now,))
+            conn.commit()
+            total = _cache_bytes(conn)
+            if total <= self.max_bytes:
+                return
+            target = total - int(self.max_bytes * 0.9)
+            freed = 0
+            doomed: List[str] = []
+            for vid, size in conn.execute("SELECT video_id, LENGTH(body) FROM video_stats ORDER BY expires_at"):
+                doomed.append(vid)
+                freed += size
+                if freed >= target:
+                    break
+            conn.executemany("DELETE FROM video_stats WHERE video_id = ?", [(v,) for v in doomed])
+            conn.commit()
+        except Exception:
+            pass
+
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(settings.cache_db_path, settings.cache_max_bytes)
+
+
+@functools.lru_cache(maxsize=None)
+def get_video_stats_cache() -> VideoStatsCache:
+    return VideoStatsCache(settings.cache_db_path, settings.cache_max_bytes)
@@ -0,0 +1,458 @@
+"""
+コマンドライン入口（Streamlit を import しない）
+
+    vtuber-analyzer run --channels channels.txt --out results.csv
+    vtuber-analyzer refresh --channels channels.txt --out growth.csv
+    vtuber-analyzer catalog --channel UCxxxx --out catalog.csv
+    vtuber-analyzer worker --channels watchlist.txt --once
+    vtuber-analyzer rank --metric views_per_sub_last30 --band 10k-100k --top 20
+    vtuber-analyzer run --channels channels.txt --out results.csv --trace trace.json
+    vtuber-analyzer slow-runs --id 12 --out trace.json
+    python -m vtuber_analyzer run --channel UCxxxx --channel @handle --out -
+
+cron 等のバッチ向け。永続キャッシュとクォータ台帳は Streamlit アプリと同じ SQLite ファイルを共有するので、
+--shard で一覧を分割して複数プロセスで並行に実行できる。
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from .analysis import (
+    analyze_cohort,
+    cohort_output_columns,
+    estimate_run_cost,
+    parse_channel_list,
+    plan_quota,
+    refresh_channels,
+    resolve_channels,
+    write_cohort_csv,
+)
+from .catalog import CATALOG_COLUMNS, catalog_distribution, crawl_catalog, estimate_crawl_cost
+from .config import configure, settings
+from .export import EXPORT_FORMATS, SUMMARY_TABLE, CohortDetails, export_format_for, export_tables
+from .fetchers import get_channels_basic
+from .history import GROWTH_COLUMNS, get_snapshot_store
+from .keypool import get_key_pool
+from .metrics import RECENT_WINDOWS
+from .quota import QuotaError, RunUsage, current_run, get_quota_ledger
+from .ranking import RANKED_METRICS, SUBSCRIBER_BANDS, get_ranking_index
+from .reports import get_report_store
+from .tracing import Trace, current_trace, finish_trace, get_slow_run_log
+from .worker import due_channels, run_forever, run_once
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("--shard は I/N 形式で指定してください（例: 0/4）")
+    if count <= 0 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("--shard は 0 <= I < N を満たす必要があります")
+    return index, count
+
+
+def _parse_windows(value: str) -> Tuple[int, ...]:
+    try:
+        windows = tuple(sorted({int(x) for x in value.split(",") if x.strip()}))
+    except ValueError:
+        raise argparse.ArgumentTypeError("--windows は日数をカンマ区切りで指定してください（例: 7,30,90）")
+    if not windows or windows[0] <= 0:
+        raise argparse.ArgumentTypeError("--windows には 1 以上の日数を指定してください")
+    return windows
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # 全サブコマンド共通のオプション
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--api-key",
+        help="YouTube Data API キー。カンマ区切りで複数指定するとキープールとして順に使う（既定: 環境変数 YOUTUBE_API_KEYS / YOUTUBE_API_KEY）",
+    )
+    common.add_argument("--cache-db", help="レスポンスキャッシュの SQLite パス")
+    common.add_argument("--quota-db", help="クォータ台帳の SQLite パス")
+    common.add_argument("--budget", type=int, help="1日のクォータ予算（units）")
+    common.add_argument("--history-db", help="履歴スナップショットの SQLite パス")
+    common.add_argument("--alias-db", help="チャンネル解決結果（エイリアス索引）の SQLite パス")
+    common.add_argument("--ranking-db", help="順位索引（集計済みチャンネルの指標）の SQLite パス")
+    common.add_argument("--slow-log-db", help="遅い実行ログの SQLite パス")
+    common.add_argument("--playlist-index-db", help="プレイリスト → 収録動画の索引の SQLite パス")
+    common.add_argument("--trace", metavar="FILE", help="段階ごとの所要時間・API 呼び出し数（トレース）を JSON で書き出す")
+
+    # チャンネル一覧の指定（run / refresh / catalog / worker 共通）
+    channel_list = argparse.ArgumentParser(add_help=False)
+    channel_list.add_argument("--channels", metavar="FILE", help="URL / ID / 表示名 を1行に1つ書いたファイル（TXT / CSV）")
+    channel_list.add_argument(
+        "--channel", action="append", default=[], metavar="URL_OR_ID", help="集計するチャンネル（複数指定可）"
+    )
+
+    # 1回集計して書き出すコマンドの出力と分割（run / refresh / catalog 共通）
+    channels = argparse.ArgumentParser(add_help=False, parents=[channel_list])
+    channels.add_argument("--out", default="-", metavar="FILE", help="出力 CSV（既定: 標準出力）")
+    channels.add_argument("--shard", type=_parse_shard, metavar="I/N", help="一覧を N 分割したうち I 番目だけを処理する")
+
+    parser = argparse.ArgumentParser(prog="vtuber-analyzer", description="YouTube チャンネルの統計集計")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", parents=[common, channels], help="チャンネル一覧を集計して CSV に書き出す")
+    run.add_argument("--no-playlists", action="store_true", help="プレイリスト数を集計しない")
+    run.add_argument(
+        "--playlist-index",
+        action="store_true",
+        help="プレイリストの収録動画を索引して収録率を集計する（変わったプレイリストだけ取り直す。50 本ごとに 1 unit）",
+    )
+    run.add_argument("--no-snapshot", action="store_true", help="履歴スナップショット・順位索引を保存しない")
+    run.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        help="出力形式（既定: --out の拡張子から判断。.xlsx / .parquet 以外は CSV）",
+    )
+    run.add_argument(
+        "--details",
+        action="store_true",
+        help="動画単位・プレイリスト単位の明細も書き出す（XLSX は別シート、CSV / Parquet は <out>_videos 等の別ファイル）",
+    )
+    run.add_argument(
+        "--windows",
+        type=_parse_windows,
+        default=RECENT_WINDOWS,
+        metavar="D,D,...",
+        help=f"直近ウィンドウの日数（既定: {','.join(map(str, RECENT_WINDOWS))}）",
+    )
+
+    refresh = sub.add_parser(
+        "refresh",
+        parents=[common, channels],
+        help="前回のスナップショットから変化した分だけ取得し、成長指標を CSV に書き出す",
+    )
+    refresh.add_argument("--force", action="store_true", help="本日分を保存済みでも取り直す")
+
+    catalog = sub.add_parser(
+        "catalog",
+        parents=[common, channels],
+        help="全動画をクロールし、再生回数の分布統計を CSV に書き出す",
+    )
+    catalog.add_argument("--max-videos", type=int, metavar="N", help="チャンネルごとに新しい順で N 本までに制限する")
+
+    worker = sub.add_parser(
+        "worker",
+        parents=[common, channel_list],
+        help="ウォッチリストのチャンネルを定期的に集計し、Web アプリ用のレポートを保存する",
+    )
+    worker.add_argument("--report-db", help="事前計算済みレポートの SQLite パス")
+    worker.add_argument("--once", action="store_true", help="更新が必要なチャンネルを1回だけ処理して終了する")
+    worker.add_argument("--poll", type=float, default=60.0, metavar="SEC", help="常駐時の確認間隔（秒、既定: 60）")
+    worker.add_argument("--batch-size", type=int, default=50, metavar="N", help="1回にまとめて集計するチャンネル数")
+    worker.add_argument(
+        "--playlist-index",
+        action="store_true",
+        help="プレイリストの収録動画を索引して収録率もレポートに含める（run --playlist-index と同じ）",
+    )
+    worker.add_argument("--unwatch", action="store_true", help="--channels / --channel のチャンネルをウォッチリストから外す")
+
+    rank = sub.add_parser(
+        "rank",
+        parents=[common],
+        help="集計済みの全チャンネルから、指標の上位チャンネルを CSV に書き出す（API は呼ばない）",
+    )
+    rank.add_argument("--metric", required=True, choices=RANKED_METRICS, help="順位をつける指標")
+    rank.add_argument("--top", type=int, default=20, metavar="N", help="上位 N チャンネル（既定: 20）")
+    rank.add_argument("--band", choices=[label for label, _, _ in SUBSCRIBER_BANDS], help="登録者数帯で絞り込む")
+    rank.add_argument("--out", default="-", metavar="FILE", help="出力 CSV（既定: 標準出力）")
+
+    slow_runs = sub.add_parser(
+        "slow-runs",
+        parents=[common],
+        help=f"遅い実行ログ（{settings.slow_run_seconds:g} 秒以上かかった実行）の一覧・トレースを書き出す",
+    )
+    slow_runs.add_argument("--id", type=int, help="この ID の実行のトレースを JSON で書き出す")
+    slow_runs.add_argument("--limit", type=int, default=20, metavar="N", help="一覧に出す件数（既定: 20）")
+    slow_runs.add_argument("--out", default="-", metavar="FILE", help="出力先（既定: 標準出力）")
+    return parser
+
+
+def _load_entries(args) -> List[str]:
+    entries: List[str] = []
+    if args.channels:
+        with open(args.channels, encoding="utf-8-sig") as f:
+            entries.extend(parse_channel_list(f.read()))
+    for entry in parse_channel_list("\n".join(args.channel)):
+        if entry not in entries:
+            entries.append(entry)
+    if getattr(args, "shard", None):
+        index, count = args.shard
+        entries = entries[index::count]
+    return entries
+
+
+def cmd_run(args) -> int:
+    entries = _load_entries(args)
+    if not entries:
+        print("error: チャンネルが指定されていません（--channels / --channel）", file=sys.stderr)
+        return 1
+    if not settings.api_key:
+        print("error: APIキー未設定です（--api-key または YOUTUBE_API_KEY）", file=sys.stderr)
+        return 1
+
+    include_playlists = plan_quota(entries, not args.no_playlists, args.windows, args.playlist_index)
+    if include_playlists is None:
+        print(
+            f"error: 本日のクォータ残り（{get_quota_ledger().remaining_today()} units）では集計できません"
+            f"（見積もり {estimate_run_cost(entries, False, args.windows)} units）",
+            file=sys.stderr,
+        )
+        return 1
+    if include_playlists != (not args.no_playlists):
+        print("warning: 本日のクォータ残りが少ないため、プレイリストの集計を省略します", file=sys.stderr)
+
+    fmt = args.format or export_format_for(args.out)
+    if args.out == "-" and (fmt != "csv" or args.details):
+        print("error: 標準出力には CSV の集計表しか書き出せません（--out でファイルを指定してください）", file=sys.stderr)
+        return 1
+
+    usage = RunUsage()
+    current_run.set(usage)
+    details = CohortDetails() if args.details else None
+    try:
+        channel_ids, unresolved = resolve_channels(entries, settings.api_key)
+        rows = analyze_cohort(
+            channel_ids,
+            settings.api_key,
+            include_playlists=include_playlists,
+            store=None if args.no_snapshot else get_snapshot_store(),
+            windows=args.windows,
+            details=details,
+            ranking=None if args.no_snapshot else get_ranking_index(),
+            playlist_index=args.playlist_index,
+        )
+    except QuotaError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    if args.out == "-":
+        _write_csv(rows, args.out, windows=args.windows)
+    else:
+        tables = [(SUMMARY_TABLE, cohort_output_columns(rows, args.windows), rows)]
+        if details is not None:
+            tables += details.tables()
+        for name, path in export_tables(tables, args.out, fmt).items():
+            print(f"{name}: {path}", file=sys.stderr)
+    if details is not None:
+        details.close()
+    _report(usage, rows, channel_ids, unresolved)
+    return 0
+
+
+def cmd_refresh(args) -> int:
+    entries = _load_entries(args)
+    if not entries:
+        print("error: チャンネルが指定されていません（--channels / --channel）", file=sys.stderr)
+        return 1
+    if not settings.api_key:
+        print("error: APIキー未設定です（--api-key または YOUTUBE_API_KEY）", file=sys.stderr)
+        return 1
+
+    usage = RunUsage()
+    current_run.set(usage)
+    try:
+        channel_ids, unresolved = resolve_channels(entries, settings.api_key)
+        rows = refresh_channels(channel_ids, settings.api_key, get_snapshot_store(), force=args.force)
+    except QuotaError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    _write_csv(rows, args.out, ["channelId", "title", "snapshot_date"] + GROWTH_COLUMNS)
+    _report(usage, rows, channel_ids, unresolved)
+    return 0
+
+
+def cmd_catalog(args) -> int:
+    entries = _load_entries(args)
+    if not entries:
+        print("error: チャンネルが指定されていません（--channels / --channel）", file=sys.stderr)
+        return 1
+    if not settings.api_key:
+        print("error: APIキー未設定です（--api-key または YOUTUBE_API_KEY）", file=sys.stderr)
+        return 1
+
+    usage = RunUsage()
+    current_run.set(usage)
+    rows: List[Dict] = []
+    try:
+        channel_ids, unresolved = resolve_channels(entries, settings.api_key)
+        basics = get_channels_basic(tuple(channel_ids), settings.api_key)
+        counts = [basics[cid]["videoCount"] for cid in channel_ids if cid in basics]
+        if args.max_videos is not None:
+            counts = [min(c, args.max_videos) for c in counts]
+        cost = sum(estimate_crawl_cost(c) for c in counts)
+        remaining = get_quota_ledger().remaining_today()
+        if cost > remaining:
+            print(
+                f"error: 本日のクォータ残り（{remaining} units）ではクロールできません（見積もり {cost} units）",
+                file=sys.stderr,
+            )
+            return 1
+        for cid in channel_ids:
+            if cid not in basics:
+                continue
+            row = catalog_distribution(crawl_catalog(cid, settings.api_key, args.max_videos))
+            row["title"] = basics[cid]["title"]
+            rows.append(row)
+    except QuotaError as e:
+        print(f"error: {e}", file=sys.stderr)
+        if not rows:
+            return 1
+
+    _write_csv(rows, args.out, ["channelId", "title"] + CATALOG_COLUMNS[1:])
+    _report(usage, rows, channel_ids, unresolved)
+    return 0
+
+
+def cmd_worker(args) -> int:
+    """
+    --channels / --channel のチャンネルをウォッチリストに追加（--unwatch で削除）してから更新を回す
+    """
+    store = get_report_store()
+    entries = _load_entries(args)
+    if not settings.api_key:
+        print("error: APIキー未設定です（--api-key または YOUTUBE_API_KEY）", file=sys.stderr)
+        return 1
+    if entries:
+        try:
+            channel_ids, unresolved = resolve_channels(entries, settings.api_key)
+        except QuotaError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        for entry in unresolved:
+            print(f"warning: チャンネルIDを解決できませんでした: {entry}", file=sys.stderr)
+        if args.unwatch:
+            store.unwatch(channel_ids)
+            return 0
+        store.watch(channel_ids)
+
+    if not args.once:
+        print(f"watching {len(store.watchlist())} channels (Ctrl+C で終了)", file=sys.stderr)
+        try:
+            run_forever(settings.api_key, args.poll, args.batch_size, args.playlist_index)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    usage = RunUsage()
+    current_run.set(usage)
+    due = len(due_channels(store))
+    updated = run_once(settings.api_key, store, args.batch_size, playlist_index=args.playlist_index)
+    totals = usage.totals()
+    print(
+        f"{len(updated)} / {due} reports updated / {totals['units']} units / {totals['calls']} calls / "
+        f"{totals['cache_hits']} cache hits / {totals['errors']} errors",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def cmd_rank(args) -> int:
+    index = get_ranking_index()
+    rows = index.top(args.metric, args.top, args.band)
+    for i, row in enumerate(rows, start=1):
+        row["rank"] = i
+        row["percentile"] = round(index.percentile(args.metric, row[args.metric]), 1)
+    _write_csv(rows, args.out, ["rank", "channelId", "title", "subscriberBand", args.metric, "percentile"])
+    print(f"{len(rows)} / {index.count(args.metric, args.band)} channels", file=sys.stderr)
+    return 0
+
+
+def cmd_slow_runs(args) -> int:
+    log = get_slow_run_log()
+    if args.id is None:
+        _write_csv(log.recent(args.limit), args.out, ["id", "started_at", "label", "duration_ms"])
+        return 0
+    trace = log.get(args.id)
+    if trace is None:
+        print(f"error: 遅い実行ログに ID {args.id} はありません", file=sys.stderr)
+        return 1
+    _write_text(json.dumps(trace, ensure_ascii=False, indent=2), args.out)
+    return 0
+
+
+def _write_text(text: str, out: str) -> None:
+    if out == "-":
+        sys.stdout.write(text + "\n")
+    else:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def _write_csv(
+    rows: List[Dict],
+    out: str,
+    columns: Optional[List[str]] = None,
+    windows: Tuple[int, ...] = RECENT_WINDOWS,
+) -> None:
+    if out == "-":
+        write_cohort_csv(rows, sys.stdout, columns, windows)
+    else:
+        with open(out, "w", encoding="utf-8-sig", newline="") as f:
+            write_cohort_csv(rows, f, columns, windows)
+
+
+def _report(usage: RunUsage, rows: List[Dict], channel_ids: List[str], unresolved: List[str]) -> None:
+    for entry in unresolved:
+        print(f"warning: チャンネルIDを解決できませんでした: {entry}", file=sys.stderr)
+    missing = set(channel_ids) - {r["channelId"] for r in rows}
+    for cid in sorted(missing):
+        print(f"warning: チャンネル情報を取得できませんでした: {cid}", file=sys.stderr)
+    totals = usage.totals()
+    print(
+        f"{len(rows)} channels / {totals['units']} units / {totals['calls']} calls / "
+        f"{totals['cache_hits']} cache hits / {totals['errors']} errors",
+        file=sys.stderr,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    configure(
+        api_key=args.api_key,
+        cache_db_path=args.cache_db,
+        quota_db_path=args.quota_db,
+        daily_quota_budget=args.budget,
+        history_db_path=args.history_db,
+        alias_db_path=args.alias_db,
+        report_db_path=getattr(args, "report_db", None),
+        ranking_db_path=args.ranking_db,
+        slow_log_db_path=args.slow_log_db,
+        playlist_index_db_path=args.playlist_index_db,
+    )
+    if settings.api_key:
+        # キーを台帳に登録して、残りクォータをキーの数だけ数える
+        get_key_pool(settings.api_key)
+    if args.command == "worker" and not args.once:
+        # 常駐ワーカーは終わらないので、1つのトレースには記録しない
+        return cmd_worker(args)
+
+    trace = Trace(args.command)
+    current_trace.set(trace)
+    try:
+        return _dispatch(args)
+    finally:
+        if finish_trace(trace):
+            print(f"slow run: {trace.duration:.1f}s（遅い実行ログに保存しました）", file=sys.stderr)
+        if args.trace:
+            _write_text(trace.to_json(), args.trace)
+
+
+def _dispatch(args) -> int:
+    if args.command == "run":
+        return cmd_run(args)
+    if args.command == "refresh":
+        return cmd_refresh(args)
+    if args.command == "catalog":
+        return cmd_catalog(args)
+    if args.command == "worker":
+        return cmd_worker(args)
+    if args.command == "rank":
+        return cmd_rank(args)
+    if args.command == "slow-runs":
+        return cmd_slow_runs(args)
+    return 2
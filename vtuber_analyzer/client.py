@@ -0,0 +1,315 @@
+"""
+YouTube Data API クライアントと、全 API 呼び出しの共通入口 api_list / api_list_batch
+
+googleapiclient（import だけで数百ミリ秒かかる）は最初の API 呼び出しまで import しない。
+ページを開くだけ・キャッシュだけで済む実行では読み込まれない。
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+from urllib.parse import urljoin
+
+from .cache import DEFAULT_TTL, ENDPOINT_TTLS, ResponseCache, get_response_cache, is_cacheable
+from .concurrency import fetch_all
+from .config import settings
+from .discovery import load_discovery_document
+from .keypool import get_key_pool
+from .quota import QuotaBudgetExceeded, QuotaError, QuotaExhausted, get_quota_ledger
+from .scheduler import get_request_scheduler
+from .tracing import note_api_call, note_batch, span
+
+if TYPE_CHECKING:
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import BatchHttpRequest
+
+# 1回の HTTP バッチにまとめるリクエスト数（API の上限は 1000 だが、大きいバッチは応答が遅く部分失敗も増える）
+BATCH_MAX_REQUESTS = 50
+
+
+def _build_client(api_key: str):
+    """
+    同梱の discovery ドキュメント（解析済み）からクライアントを作る（ネットワークから取得しない）
+    """
+    from googleapiclient.discovery import build_from_document
+
+    client_options = {"api_endpoint": settings.api_endpoint} if settings.api_endpoint else None
+    return build_from_document(load_discovery_document(), developerKey=api_key, client_options=client_options)
+
+
+class ClientPool:
+    """
+    APIキーごとの準備済みクライアントを、プロセス内の全セッション・スレッドで使い回す。
+    httplib2 はスレッドセーフではないため、1つのクライアントは貸し出し中の1スレッドだけが使い、
+    空きがなければ新しく作る（同時に使うスレッド数までしか増えない）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List] = {}
+
+    @contextmanager
+    def client(self, api_key: str) -> Iterator:
+        if not api_key:
+            raise RuntimeError("YouTube API key is not configured.")
+        with self._lock:
+            idle = self._idle.setdefault(api_key, [])
+            youtube = idle.pop() if idle else None
+        if youtube is None:
+            with span("client.build"):
+                youtube = _build_client(api_key)
+        try:
+            yield youtube
+        finally:
+            with self._lock:
+                self._idle[api_key].append(youtube)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+
+@functools.lru_cache(maxsize=None)
+def get_client_pool() -> ClientPool:
+    return ClientPool()
+
+
+def youtube_client(api_key: str):
+    """
+    with youtube_client(key) as youtube: で、APIキーのクライアントを借りる
+    """
+    return get_client_pool().client(api_key)
+
+
+def _error_content(e: "HttpError") -> str:
+    content = getattr(e, "content", b"") or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+    return content
+
+
+def _is_quota_exceeded(e: "HttpError") -> bool:
+    if getattr(e.resp, "status", None) != 403:
+        return False
+    content = _error_content(e)
+    return "quotaExceeded" in content or "dailyLimitExceeded" in content
+
+
+# キー自体に問題がある（別のキーなら通る）エラー
+_KEY_ERROR_REASONS = ("keyInvalid", "keyExpired", "accessNotConfigured", "ipRefererBlocked", "forbidden")
+
+
+def _is_key_error(e: "HttpError") -> bool:
+    if getattr(e.resp, "status", None) not in (400, 403):
+        return False
+    content = _error_content(e)
+    return any(reason in content for reason in _KEY_ERROR_REASONS) or "API key not valid" in content
+
+
+def api_list(api_key: str, resource: str, **params) -> Dict:
+    """
+    YouTube Data API の <resource>.list を呼ぶ共通入口。
+    - TTL 内のキャッシュがあれば API を呼ばずに返す（TTL 0 のエンドポイントはキャッシュを読み書きしない）
+    - 期限切れなら If-None-Match で再検証し、304 ならキャッシュ本文を使い回す
+    - api_key はカンマ区切りで複数指定でき、キープールから順に使う。
+      クォータ切れ・キーのエラーは次のキーへ切り替え、全キーが使えなければ例外
+    - キャッシュのキーに API キーは含めない（どのキーで取得した結果も共有する）
+    - 呼び出しごとに消費ユニットをクォータ台帳へ（キー別にも）計上し、予算超過なら QuotaBudgetExceeded
+    - 送信はスケジューラ経由（レート制限・一時的エラーの再試行・同一リクエストの相乗り）
+    - 失敗時は例外をそのまま送出する（握りつぶすかどうかは呼び出し側が決める）
+    """
+    endpoint = f"{resource}.list"
+    cache = get_response_cache()
+    ledger = get_quota_ledger()
+    key = ResponseCache.make_key(endpoint, params)
+    entry = cache.get(key) if is_cacheable(endpoint) else None
+    if entry and time.time() - entry["fetched_at"] < ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL):
+        ledger.record_cache_hit(endpoint)
+        note_api_call("hit")
+        return entry["body"]
+
+    pool = get_key_pool(api_key)
+
+    def execute():
+        """1回分の送信。キーを順に試し、(レスポンス, 304 だったか) を返す"""
+        from googleapiclient.errors import HttpError
+
+        last_error: Exception = QuotaExhausted("利用できる API キーがありません。")
+        for _ in range(len(pool)):
+            current_key = pool.acquire()
+            kid = pool.ids[current_key]
+            # 失敗したリクエストもクォータを消費するため、再試行も1回ずつ計上する
+            try:
+                ledger.charge(endpoint, kid)
+            except QuotaBudgetExceeded as e:
+                # 予算は設定で変わりうるので、キーを使用不可にはせず次のキーへ
+                last_error = e
+                continue
+
+            with youtube_client(current_key) as youtube:
+                request = getattr(youtube, resource)().list(**params)
+                if entry and entry.get("etag"):
+                    request.headers["If-None-Match"] = entry["etag"]
+                try:
+                    return request.execute(), False
+                except HttpError as e:
+                    if entry and getattr(e.resp, "status", None) == 304:
+                        return entry["body"], True
+                    ledger.record_error(endpoint, kid)
+                    if _is_quota_exceeded(e):
+                        pool.mark_exhausted(current_key)
+                        last_error = QuotaExhausted("YouTube Data API のクォータが上限に達しました。")
+                        last_error.__cause__ = e
+                        continue
+                    if _is_key_error(e) and len(pool) > 1:
+                        pool.mark_failed(current_key)
+                        last_error = e
+                        continue
+                    raise
+        raise last_error
+
+    (resp, not_modified), shared = get_request_scheduler().run(key, execute)
+    if shared:
+        # 他のセッションの実行中リクエストに相乗りした（API は呼んでいない）
+        ledger.record_cache_hit(endpoint)
+        note_api_call("hit")
+        return resp
+    if not_modified:
+        cache.touch(key)
+        note_api_call("revalidated")
+    else:
+        cache.put(key, endpoint, resp)
+        note_api_call("miss", resp)
+    return resp
+
+
+# ===== バッチ（複数の list を1回の HTTP 往復で） =====
+def _new_batch(youtube) -> "BatchHttpRequest":
+    """
+    接続先を差し替えている場合（ローカル偽 API など）は、バッチの送信先もそのホストの /batch にする
+    """
+    from googleapiclient.http import BatchHttpRequest
+
+    if settings.api_endpoint:
+        return BatchHttpRequest(batch_uri=urljoin(settings.api_endpoint, "/batch"))
+    return youtube.new_batch_http_request()
+
+
+def _list_or_none(api_key: str, resource: str, params: Dict) -> Optional[Dict]:
+    try:
+        return api_list(api_key, resource, **params)
+    except QuotaError:
+        raise
+    except Exception:
+        return None
+
+
+def _send_batch(api_key: str, resource: str, items: List[tuple], results: List[Optional[Dict]]) -> List[int]:
+    """
+    items（[(位置, params)]）を1つのキーで1回のバッチとして送り、レスポンスを callback で results の位置へ戻す。
+    失敗したもの（バッチに入れられなかったものを含む）の位置を返す。
+    - 消費ユニットは送信前に1回だけ、予算に収まる件数分を計上する（スケジューラがバッチを再試行しても計上し直さない）
+    - 応答が返らなかった（送信されなかった）リクエストの分は最後に取り消す
+    """
+    endpoint = f"{resource}.list"
+    cache = get_response_cache()
+    ledger = get_quota_ledger()
+    pool = get_key_pool(api_key)
+    current_key = pool.acquire()
+    kid = pool.ids[current_key]
+    # 予算を超える分はバッチに入れない（api_list での取り直しで QuotaBudgetExceeded になる）
+    charged = ledger.charge_many(endpoint, len(items), kid)
+    if charged == 0:
+        return [pos for pos, _ in items]
+    sendable = items[:charged]
+    done = set()
+    answered = set()
+
+    def on_response(pos: int, key: str, entry: Optional[Dict]):
+        def callback(request_id, response, exception):
+            answered.add(pos)
+            if exception is None:
+                cache.put(key, endpoint, response)
+                note_api_call("miss", response)
+                results[pos] = response
+                done.add(pos)
+            elif entry and getattr(exception.resp, "status", None) == 304:
+                cache.touch(key)
+                note_api_call("revalidated")
+                results[pos] = entry["body"]
+                done.add(pos)
+            else:
+                ledger.record_error(endpoint, kid)
+                if _is_quota_exceeded(exception):
+                    pool.mark_exhausted(current_key)
+                elif _is_key_error(exception) and len(pool) > 1:
+                    pool.mark_failed(current_key)
+
+        return callback
+
+    def execute():
+        with youtube_client(current_key) as youtube:
+            batch = _new_batch(youtube)
+            for pos, params in sendable:
+                key = ResponseCache.make_key(endpoint, params)
+                entry = cache.get(key) if is_cacheable(endpoint) else None
+                request = getattr(youtube, resource)().list(**params)
+                if entry and entry.get("etag"):
+                    request.headers["If-None-Match"] = entry["etag"]
+                batch.add(request, callback=on_response(pos, key, entry), request_id=str(pos))
+            note_batch()
+            batch.execute()
+
+    try:
+        get_request_scheduler().call(execute)
+    except Exception as e:
+        from googleapiclient.errors import HttpError
+
+        ledger.record_error(endpoint, kid)
+        if isinstance(e, HttpError) and _is_quota_exceeded(e):
+            pool.mark_exhausted(current_key)
+    ledger.refund(endpoint, charged - len(answered), kid)
+    return [pos for pos, _ in items if pos not in done]
+
+
+def api_list_batch(api_key: str, resource: str, params_list: List[Dict]) -> List[Optional[Dict]]:
+    """
+    複数の <resource>.list をまとめて呼ぶ（api_list のバッチ版）。
+    - TTL 内のキャッシュはそのまま使い、残りを BATCH_MAX_REQUESTS 件ずつ1回の HTTP バッチ
+      （new_batch_http_request）で送る。レスポンスは callback で入力の位置へ戻す
+    - クォータはバッチ内の1リクエストごとに計上する
+    - バッチ内で失敗したリクエスト・バッチ自体の失敗は api_list で1件ずつ取り直す
+      （キーの切り替え・再試行・ETag 再検証は api_list と同じ）
+    - バッチに入れたリクエストは、スケジューラの同一リクエストの相乗り（single-flight）の対象外。
+      同じリクエストが別のセッションで同時に実行中でも、それぞれ送信する（1件だけのときは api_list を通るので相乗りする）
+    戻り値: 入力と同じ順のレスポンス。取り直しても失敗したものは None（QuotaError は送出する）
+    """
+    endpoint = f"{resource}.list"
+    cache = get_response_cache()
+    ledger = get_quota_ledger()
+    ttl = ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)
+    results: List[Optional[Dict]] = [None] * len(params_list)
+    pending: List[int] = []
+    for pos, params in enumerate(params_list):
+        entry = cache.get(ResponseCache.make_key(endpoint, params)) if ttl > 0 else None
+        if entry and time.time() - entry["fetched_at"] < ttl:
+            ledger.record_cache_hit(endpoint)
+            note_api_call("hit")
+            results[pos] = entry["body"]
+        else:
+            pending.append(pos)
+
+    if len(pending) == 1:
+        # 1件だけならバッチにしない（相乗りも効く）
+        results[pending[0]] = _list_or_none(api_key, resource, params_list[pending[0]])
+        return results
+
+    chunks = [
+        (api_key, resource, [(pos, params_list[pos]) for pos in pending[i : i + BATCH_MAX_REQUESTS]], results)
+        for i in range(0, len(pending), BATCH_MAX_REQUESTS)
+    ]
+    for failed in fetch_all(_send_batch, chunks):
+        for pos in failed:
+            results[pos] = _list_or_none(api_key, resource, params_list[pos])
+    return results
@@ -0,0 +1,72 @@
+"""
+API 呼び出しの並列実行
+
+独立した取得をスレッドプールで同時に投げる。呼び出し元の contextvars（実行中の RunUsage など）は
+ワーカーへ引き継がれる。UI 側のスレッド文脈（Streamlit の ScriptRunContext など）は
+add_context_propagator で登録した関数で引き継ぐ。
+"""
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, List, Optional, Tuple
+
+from .config import settings
+
+_worker_local = threading.local()
+
+# 呼び出し元スレッドで実行され、ワーカースレッドで呼ぶ関数（または None）を返す
+_context_propagators: List[Callable[[], Optional[Callable[[], None]]]] = []
+
+
+def add_context_propagator(capture: Callable[[], Optional[Callable[[], None]]]) -> None:
+    """
+    ワーカーへ引き継ぐスレッド文脈を登録する。
+    capture は投入時に呼び出し元スレッドで呼ばれ、ワーカー側で実行する関数を返す。
+    """
+    if capture not in _context_propagators:
+        _context_propagators.append(capture)
+
+
+@functools.lru_cache(maxsize=None)
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """
+    API 呼び出し用のスレッドプール（プロセス内で共有）
+    """
+    return ThreadPoolExecutor(max_workers=settings.max_fetch_workers, thread_name_prefix="yt-fetch")
+
+
+def submit_fetch(fn: Callable, *args) -> Future:
+    """
+    fn(*args) をスレッドプールで実行する。
+    - 呼び出し元の contextvars と登録済みのスレッド文脈を引き継ぐ
+    - ワーカー内からの入れ子呼び出しはデッドロックを避けるためその場で同期実行する
+    """
+    if getattr(_worker_local, "in_pool", False):
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    appliers = [capture() for capture in _context_propagators]
+    # current_run などの contextvars もワーカーへ引き継ぐ（投入ごとにコピー）
+    cv_ctx = copy_context()
+
+    def task():
+        _worker_local.in_pool = True
+        for apply in appliers:
+            if apply is not None:
+                apply()
+        return cv_ctx.run(fn, *args)
+
+    return get_fetch_executor().submit(task)
+
+
+def fetch_all(fn: Callable, arg_list: List[Tuple]) -> List[Any]:
+    """
+    fn を引数リストの各要素で並列実行し、入力順に結果を返す
+    """
+    futures = [submit_fetch(fn, *args) for args in arg_list]
+    return [f.result() for f in futures]
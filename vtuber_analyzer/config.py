@@ -0,0 +1,91 @@
+"""
+実行時設定。
+
+環境変数から読み込み、Streamlit アプリなどは configure() で上書きする。
+キャッシュ・台帳などのインスタンスは初回利用時に生成されるため、configure() はその前に呼ぶこと。
+"""
+import os
+from typing import Optional
+
+
+class Settings:
+    def __init__(self):
+        # カンマ区切りで複数指定するとキープールとして順に使う
+        self.api_key: Optional[str] = (
+            os.environ.get("YOUTUBE_API_KEYS") or os.environ.get("YOUTUBE_API_KEY") or None
+        )
+        # 再デプロイ・再起動をまたいで、同じホスト上の全プロセスで共有する
+        self.cache_db_path: str = os.environ.get(
+            "VTA_CACHE_DB_PATH", os.path.join(".cache", "youtube_responses.sqlite3")
+        )
+        # キャッシュファイル（レスポンス + 動画ごとの stats）の本文の合計の上限
+        self.cache_max_bytes: int = int(os.environ.get("VTA_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        self.quota_db_path: str = os.environ.get(
+            "VTA_QUOTA_DB_PATH", os.path.join(".cache", "quota_ledger.sqlite3")
+        )
+        # 集計結果の履歴（キャッシュではないので .cache とは分けて置く）
+        self.history_db_path: str = os.environ.get(
+            "VTA_HISTORY_DB_PATH", os.path.join(".data", "history.sqlite3")
+        )
+        # API の接続先（ベンチマーク用のローカル偽 API など。未設定なら本物の YouTube Data API）
+        self.api_endpoint: Optional[str] = os.environ.get("VTA_API_ENDPOINT") or None
+        # URL・ハンドル・表示名 → チャンネルID の解決結果
+        self.alias_db_path: str = os.environ.get(
+            "VTA_ALIAS_DB_PATH", os.path.join(".data", "channel_aliases.sqlite3")
+        )
+        # 表示名 → チャンネルID の解決結果を使う期間（秒）。表示名は一意でなく変わりうるので引き直す
+        self.alias_query_max_age: float = float(os.environ.get("VTA_ALIAS_QUERY_MAX_AGE", 30 * 86400))
+        # 集計済みチャンネル全体での順位索引
+        self.ranking_db_path: str = os.environ.get(
+            "VTA_RANKING_DB_PATH", os.path.join(".data", "rankings.sqlite3")
+        )
+        # 順位索引が他のプロセスの保存した指標を確かめに行く間隔（秒）
+        self.ranking_reload_interval: float = float(os.environ.get("VTA_RANKING_RELOAD_INTERVAL", 10))
+        # 事前計算済みレポート・ウォッチリスト（worker が書き、Web アプリが読む）
+        self.report_db_path: str = os.environ.get(
+            "VTA_REPORT_DB_PATH", os.path.join(".data", "reports.sqlite3")
+        )
+        # Web アプリが事前計算済みレポートをそのまま表示する経過秒数の上限
+        self.report_max_age: float = float(os.environ.get("VTA_REPORT_MAX_AGE", 3600))
+        # worker がウォッチリストのチャンネルを取り直す間隔（秒）
+        self.report_refresh_interval: float = float(os.environ.get("VTA_REPORT_REFRESH_INTERVAL", 1800))
+        # プレイリスト → 収録動画の索引（itemCount が変わったプレイリストだけ取り直す）
+        self.playlist_index_db_path: str = os.environ.get(
+            "VTA_PLAYLIST_INDEX_DB_PATH", os.path.join(".data", "playlist_index.sqlite3")
+        )
+        # itemCount が同じでも、この秒数を過ぎた索引は取り直す（入れ替え・非公開化の反映）
+        self.playlist_index_max_age: float = float(os.environ.get("VTA_PLAYLIST_INDEX_MAX_AGE", 7 * 86400))
+        # この秒数以上かかった実行のトレースを遅い実行ログに残す（0 以下で記録しない）
+        self.slow_run_seconds: float = float(os.environ.get("VTA_SLOW_RUN_SECONDS", 10))
+        self.slow_log_db_path: str = os.environ.get(
+            "VTA_SLOW_LOG_DB_PATH", os.path.join(".data", "slow_runs.sqlite3")
+        )
+        # 遅い実行ログに残す件数（古いものから消す）
+        self.slow_log_max_entries: int = int(os.environ.get("VTA_SLOW_LOG_MAX_ENTRIES", 200))
+        # 1日に使ってよいユニット数（YouTube Data API の既定割り当ては 10,000）
+        self.daily_quota_budget: int = int(os.environ.get("VTA_DAILY_QUOTA_BUDGET", 10000))
+        self.max_fetch_workers: int = int(os.environ.get("VTA_MAX_FETCH_WORKERS", 8))
+        # プロセス全体での送信レート（リクエスト/秒）と瞬間的に許すバースト数
+        self.requests_per_second: float = float(os.environ.get("VTA_REQUESTS_PER_SECOND", 10))
+        self.request_burst: float = float(os.environ.get("VTA_REQUEST_BURST", 20))
+        # 一時的なエラー（5xx・レート制限）の再試行回数とバックオフ（秒）
+        self.max_retries: int = int(os.environ.get("VTA_MAX_RETRIES", 4))
+        self.backoff_base: float = float(os.environ.get("VTA_BACKOFF_BASE", 0.5))
+        self.backoff_max: float = float(os.environ.get("VTA_BACKOFF_MAX", 16))
+        # キー不正などのエラーが出たキーをローテーションから外す秒数
+        self.key_error_cooldown: float = float(os.environ.get("VTA_KEY_ERROR_COOLDOWN", 600))
+
+
+settings = Settings()
+
+
+def configure(**overrides) -> Settings:
+    """
+    設定を上書きする（値が None の項目は無視する）
+    """
+    for name, value in overrides.items():
+        if not hasattr(settings, name):
+            raise AttributeError(f"unknown setting: {name}")
+        if value is not None:
+            setattr(settings, name, value)
+    return settings
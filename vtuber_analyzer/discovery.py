@@ -0,0 +1,77 @@
+"""
+同梱の YouTube Data API discovery ドキュメント
+
+googleapiclient の build() は、新しいスレッド・キーのたびに discovery ドキュメント（約 400KB）を読み直して解析する。
+使うリソースの list メソッドとそれが参照するスキーマだけに絞った版を data/ に固定して同梱し、
+プロセス内で1回だけ読み込んで build_from_document に渡す（ネットワークからは取得しない）。
+
+googleapiclient を更新したときなどに作り直す:
+    python -m vtuber_analyzer.discovery
+"""
+import functools
+import json
+import os
+from typing import Dict, Iterator, Sequence
+
+DISCOVERY_PATH = os.path.join(os.path.dirname(__file__), "data", "youtube.v3.json")
+
+# client.api_list / api_list_batch で呼ぶリソース（いずれも list だけを使う）
+USED_RESOURCES = ("channels", "playlistItems", "playlists", "search", "videos")
+
+
+@functools.lru_cache(maxsize=None)
+def load_discovery_document() -> Dict:
+    with open(DISCOVERY_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _refs(obj) -> Iterator[str]:
+    if isinstance(obj, dict):
+        if isinstance(obj.get("$ref"), str):
+            yield obj["$ref"]
+        for value in obj.values():
+            yield from _refs(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _refs(value)
+
+
+def trim_discovery_document(doc: Dict, resources: Sequence[str] = USED_RESOURCES) -> Dict:
+    """
+    resources の list メソッドと、そこから（再帰的に）参照されるスキーマだけを残した discovery ドキュメント
+    """
+    kept_resources = {
+        name: {"methods": {"list": doc["resources"][name]["methods"]["list"]}} for name in resources
+    }
+    schemas: Dict[str, Dict] = {}
+    pending = list(_refs(kept_resources))
+    while pending:
+        name = pending.pop()
+        if name in schemas or name not in doc["schemas"]:
+            continue
+        schemas[name] = doc["schemas"][name]
+        pending.extend(_refs(schemas[name]))
+    return {
+        **{k: v for k, v in doc.items() if k not in ("resources", "schemas")},
+        "resources": kept_resources,
+        "schemas": dict(sorted(schemas.items())),
+    }
+
+
+def main() -> int:
+    # googleapiclient に同梱されている版から作る（ネットワークは使わない）
+    import googleapiclient
+
+    source = os.path.join(os.path.dirname(googleapiclient.__file__), "discovery_cache", "documents", "youtube.v3.json")
+    with open(source, encoding="utf-8") as f:
+        doc = trim_discovery_document(json.load(f))
+    os.makedirs(os.path.dirname(DISCOVERY_PATH), exist_ok=True)
+    with open(DISCOVERY_PATH, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write("\n")
+    print(f"{DISCOVERY_PATH}: revision {doc.get('revision')}, {len(doc['schemas'])} schemas, {os.path.getsize(DISCOVERY_PATH)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,302 @@
+"""
+複数チャンネルの集計結果の書き出し（CSV / Parquet / XLSX）
+
+行は Iterable で受け取り、CSV は1行ずつ、Parquet は batch_size 行ずつ、XLSX は openpyxl の
+write_only モードで書くため、数千チャンネル・動画単位の明細でもファイル全体をメモリに組み立てない。
+Parquet には pyarrow、XLSX には openpyxl が必要（どちらも使うときだけ import する）。
+"""
+import csv
+import json
+import os
+import tempfile
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .history import GROWTH_COLUMNS
+from .metrics import column_type
+
+# 動画単位・プレイリスト単位の明細の列
+VIDEO_COLUMNS: List[str] = [
+    "channelId",
+    "videoId",
+    "title",
+    "publishedAt",
+    "format",
+    "durationSeconds",
+    "viewCount",
+    "likeCount",
+]
+PLAYLIST_COLUMNS: List[str] = ["channelId", "playlistId", "title", "itemCount"]
+# 明細だけにある列の型（集計表の列は metrics.column_type で決める）
+_DETAIL_COLUMN_TYPES: Dict[str, str] = {
+    "videoId": "string",
+    "publishedAt": "string",
+    "format": "string",
+    "durationSeconds": "int",
+    "likeCount": "int",
+    "playlistId": "string",
+    "itemCount": "int",
+}
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+
+# XLSX のシート名 / CSV・Parquet の明細ファイルの接尾辞
+SUMMARY_TABLE = "summary"
+VIDEOS_TABLE = "videos"
+PLAYLISTS_TABLE = "playlists"
+
+# (テーブル名, 列, 行)
+Table = Tuple[str, Sequence[str], Iterable[Dict]]
+
+
+class CohortDetails:
+    """
+    analyze_cohort に渡して、動画単位・プレイリスト単位の明細を書き出し用に受け取る。
+    明細の行は add のたびに一時ファイル（JSON Lines）へ書き出し、iter_*_rows はそこから1行ずつ読み返すので、
+    数千チャンネル分の明細でもメモリに溜めない。
+    チャンネル基本情報（basics）と件数上位のプレイリスト（top_playlists）はチャンネルごとに持つ（worker のレポート用）。
+    keep_rows=False なら明細は受け取らない（analyze_cohort もプレイリストの全件を持たない）。
+    """
+
+    def __init__(self, keep_rows: bool = True):
+        self.keep_rows = keep_rows
+        self.basics: Dict[str, Dict] = {}
+        self.top_playlists: Dict[str, List[Dict]] = {}
+        self._videos: Optional[IO[str]] = tempfile.TemporaryFile("w+", encoding="utf-8") if keep_rows else None
+        self._playlists: Optional[IO[str]] = tempfile.TemporaryFile("w+", encoding="utf-8") if keep_rows else None
+
+    def add(
+        self,
+        channel_id: str,
+        basic: Dict,
+        uploads: List[Dict],
+        video_stats: Dict[str, Dict],
+        playlists: List[Dict],
+        top_playlists: List[Dict],
+    ) -> None:
+        self.basics[channel_id] = basic
+        self.top_playlists[channel_id] = top_playlists
+        if not self.keep_rows:
+            return
+        _append_rows(self._videos, _video_rows(channel_id, uploads, video_stats))
+        _append_rows(self._playlists, _playlist_rows(channel_id, playlists))
+
+    def iter_video_rows(self) -> Iterator[Dict]:
+        return _read_rows(self._videos)
+
+    def iter_playlist_rows(self) -> Iterator[Dict]:
+        return _read_rows(self._playlists)
+
+    def close(self) -> None:
+        for f in (self._videos, self._playlists):
+            if f is not None:
+                f.close()
+
+    def tables(self) -> List[Table]:
+        return [
+            (VIDEOS_TABLE, VIDEO_COLUMNS, self.iter_video_rows()),
+            (PLAYLISTS_TABLE, PLAYLIST_COLUMNS, self.iter_playlist_rows()),
+        ]
+
+
+def _video_rows(channel_id: str, uploads: List[Dict], stats: Dict[str, Dict]) -> Iterator[Dict]:
+    for u in uploads:
+        st = stats.get(u["videoId"])
+        if st is None:
+            continue
+        yield {
+            "channelId": channel_id,
+            "videoId": u["videoId"],
+            "title": st.get("title", ""),
+            "publishedAt": u.get("publishedAt"),
+            "format": st.get("format"),
+            "durationSeconds": st.get("durationSeconds"),
+            "viewCount": st.get("viewCount", 0),
+            "likeCount": st.get("likeCount", 0),
+        }
+
+
+def _playlist_rows(channel_id: str, playlists: List[Dict]) -> Iterator[Dict]:
+    for pl in playlists:
+        yield {
+            "channelId": channel_id,
+            "playlistId": pl.get("playlistId"),
+            "title": pl.get("title", ""),
+            "itemCount": pl.get("itemCount", 0),
+        }
+
+
+def _append_rows(f: Optional[IO[str]], rows: Iterable[Dict]) -> None:
+    if f is None:
+        return
+    f.seek(0, os.SEEK_END)
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False))
+        f.write("\n")
+
+
+def _read_rows(f: Optional[IO[str]]) -> Iterator[Dict]:
+    if f is None:
+        return
+    f.flush()
+    f.seek(0)
+    for line in f:
+        yield json.loads(line)
+
+
+def export_format_for(path: str, default: str = "csv") -> str:
+    """
+    拡張子から書き出し形式を決める
+    """
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("xlsx", "parquet"):
+        return ext
+    if ext == "pq":
+        return "parquet"
+    return default
+
+
+# ===== CSV =====
+def write_csv(rows: Iterable[Dict], fp: IO[str], columns: Sequence[str]) -> int:
+    """
+    1行ずつ書き出し、書いた行数を返す
+    """
+    writer = csv.DictWriter(fp, fieldnames=list(columns), extrasaction="ignore")
+    writer.writeheader()
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+    return n
+
+
+# ===== Parquet =====
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet の書き出しには pyarrow が必要です（pip install pyarrow）")
+    return pa, pq
+
+
+def _infer_arrow_type(pa, values: List):
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return pa.int64()
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return pa.float64()
+    if present and all(isinstance(v, bool) for v in present):
+        return pa.bool_()
+    return pa.string()
+
+
+def _known_arrow_type(pa, name: str):
+    """
+    列の定義から決まる型（明細・成長指標・metrics の列）。知らない列は None
+    """
+    kind = _DETAIL_COLUMN_TYPES.get(name) or ("int" if name in GROWTH_COLUMNS else column_type(name))
+    return {"string": pa.string(), "int": pa.int64(), "float": pa.float64()}.get(kind)
+
+
+def _arrow_values(values: List, arrow_type, pa) -> List:
+    if arrow_type == pa.string():
+        return [None if v is None else str(v) for v in values]
+    if arrow_type == pa.float64():
+        return [None if v is None else float(v) for v in values]
+    if arrow_type == pa.int64():
+        # NaN（欠損）は null、整数値の小数（NumPy 経由の 3.0 など）は整数にする
+        return [None if v is None or v != v else int(v) for v in values]
+    return values
+
+
+def write_parquet(rows: Iterable[Dict], path: str, columns: Sequence[str], batch_size: int = 10000) -> int:
+    """
+    batch_size 行ごとに行グループとして書き出し、書いた行数を返す。
+    列の型は列の定義（_known_arrow_type）で決めるので、最初のバッチが全て None・整数だけの列でも
+    ファイル全体で同じ型になる。定義にない列だけ最初のバッチの値から決める（全て None の列は文字列）。
+    """
+    pa, pq = _require_pyarrow()
+    columns = list(columns)
+    known = {c: _known_arrow_type(pa, c) for c in columns}
+    writer = None
+    schema = None
+    n = 0
+
+    def flush(batch: List[Dict]):
+        nonlocal writer, schema
+        data = {c: [row.get(c) for row in batch] for c in columns}
+        if schema is None:
+            schema = pa.schema([(c, known[c] or _infer_arrow_type(pa, data[c])) for c in columns])
+            writer = pq.ParquetWriter(path, schema)
+        arrays = [pa.array(_arrow_values(data[f.name], f.type, pa), type=f.type) for f in schema]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    batch: List[Dict] = []
+    try:
+        for row in rows:
+            batch.append(row)
+            n += 1
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch or writer is None:
+            flush(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+# ===== XLSX =====
+def write_xlsx(tables: Iterable[Table], path_or_fp) -> Dict[str, int]:
+    """
+    テーブルごとに1シートの XLSX を write_only モードで書き出し、シートごとの行数を返す
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("XLSX の書き出しには openpyxl が必要です（pip install openpyxl）")
+
+    wb = Workbook(write_only=True)
+    counts: Dict[str, int] = {}
+    for name, columns, rows in tables:
+        ws = wb.create_sheet(title=name[:31])
+        ws.append(list(columns))
+        n = 0
+        for row in rows:
+            ws.append([row.get(c) for c in columns])
+            n += 1
+        counts[name] = n
+    wb.save(path_or_fp)
+    return counts
+
+
+# ===== まとめて書き出し =====
+def _sibling_path(path: str, table: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{table}{ext}"
+
+
+def export_tables(tables: List[Table], path: str, fmt: Optional[str] = None) -> Dict[str, str]:
+    """
+    複数のテーブルを書き出し、{テーブル名: 書き出し先} を返す。
+    - xlsx: 1ファイルにテーブルごとのシート
+    - csv / parquet: 先頭のテーブルを path に、残りは「<path の stem>_<テーブル名>.<拡張子>」に
+    """
+    fmt = fmt or export_format_for(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    if fmt == "xlsx":
+        write_xlsx(tables, path)
+        return {name: path for name, _, _ in tables}
+
+    written: Dict[str, str] = {}
+    for i, (name, columns, rows) in enumerate(tables):
+        target = path if i == 0 else _sibling_path(path, name)
+        if fmt == "parquet":
+            write_parquet(rows, target, columns)
+        else:
+            with open(target, "w", encoding="utf-8-sig", newline="") as f:
+                write_csv(rows, f, columns)
+        written[name] = target
+    return written
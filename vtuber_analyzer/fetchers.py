@@ -0,0 +1,346 @@
+"""
+YouTube Data API からのデータ取得（フェッチャー）
+
+全ての呼び出しは client.api_list / api_list_batch を通り、永続キャッシュとクォータ台帳が適用される。
+互いに独立な呼び出し（チャンク・複数チャンネルの同じページ目）は api_list_batch で1回の HTTP バッチにまとめる。
+取得失敗は空データとして扱うが、クォータ不足（QuotaError）は呼び出し元へ送出する。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import get_video_stats_cache
+from .client import api_list, api_list_batch
+from .quota import QuotaError
+from .timeline import FORMAT_LIVE, FORMAT_SHORT, FORMAT_VOD
+from .tracing import annotate, traced
+from .utils import parse_iso_datetime, parse_iso_duration, utcnow
+
+# API には Shorts かどうかの項目がないため、長さとハッシュタグから推定する（ヒューリスティック）。
+# SHORTS_UNTAGGED_MAX_SECONDS 以下はショートとみなし、それを超え SHORTS_MAX_SECONDS（Shorts の上限 3 分）以下は
+# タイトルか説明に #shorts がある動画だけをショートとみなす（3 分以下の通常の MV・予告編などを除くため）
+SHORTS_MAX_SECONDS = 180
+SHORTS_UNTAGGED_MAX_SECONDS = 60
+# プレミア公開は配信枠の時間がカウントダウン（最短 1 分）のぶん動画の長さより長くなる。
+# 配信枠の時間と動画の長さの差がこれ未満ならライブ配信のアーカイブとみなす
+PREMIERE_MIN_COUNTDOWN_SECONDS = 60
+
+
+# ===== チャンネル基本情報 =====
+def _parse_channel_item(it: Dict) -> Dict:
+    snippet = it.get("snippet", {}) or {}
+    stats = it.get("statistics", {}) or {}
+    uploads = it.get("contentDetails", {}).get("relatedPlaylists", {}) or {}
+
+    return {
+        "channelId": it.get("id"),
+        "title": snippet.get("title"),
+        "publishedAt": snippet.get("publishedAt"),
+        "subscriberCount": int(stats.get("subscriberCount", 0) or 0),
+        "videoCount": int(stats.get("videoCount", 0) or 0),
+        "viewCount": int(stats.get("viewCount", 0) or 0),
+        "uploadsPlaylistId": uploads.get("uploads"),
+    }
+
+
+@traced("fetch.channels_basic")
+def get_channels_basic(channel_ids: Tuple[str, ...], api_key: str) -> Dict[str, Dict]:
+    """
+    複数チャンネルの基本情報を 50 件ずつ channels().list にまとめ、チャンクは HTTP バッチで取得する。
+    戻り値: {channelId: basic}（取得できなかったIDは含まれない）
+    """
+    params = [
+        dict(part="snippet,statistics,contentDetails", id=",".join(channel_ids[i : i + 50]), maxResults=50)
+        for i in range(0, len(channel_ids), 50)
+    ]
+    annotate(channels=len(channel_ids))
+    out: Dict[str, Dict] = {}
+    for resp in api_list_batch(api_key, "channels", params):
+        for it in (resp or {}).get("items", []):
+            if it.get("id"):
+                out[it["id"]] = _parse_channel_item(it)
+    return out
+
+
+def get_channel_basic(channel_id: str, api_key: str) -> Optional[Dict]:
+    return get_channels_basic((channel_id,), api_key).get(channel_id)
+
+
+# ===== プレイリスト情報 =====
+def _parse_playlist_item(pl: Dict) -> Dict:
+    return {
+        "playlistId": pl.get("id"),
+        "title": pl.get("snippet", {}).get("title"),
+        "itemCount": int(pl.get("contentDetails", {}).get("itemCount", 0) or 0),
+    }
+
+
+def iter_playlist_pages_many(channel_ids: Tuple[str, ...], api_key: str) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    複数チャンネルのプレイリスト一覧を、取得したページから順に (channelId, [{"playlistId", "title", "itemCount"}])
+    で返すジェネレータ。各チャンネルの次のページを1ラウンドずつ HTTP バッチにまとめてたどる。
+    途中で取得に失敗したチャンネルはそこで終わる（QuotaError は送出する）。
+    """
+    tokens: Dict[str, Optional[str]] = {cid: None for cid in dict.fromkeys(channel_ids)}
+    while tokens:
+        active = list(tokens)
+        resps = api_list_batch(
+            api_key,
+            "playlists",
+            [
+                dict(part="snippet,contentDetails", channelId=cid, maxResults=50, pageToken=tokens[cid])
+                for cid in active
+            ],
+        )
+        tokens = {}
+        for cid, resp in zip(active, resps):
+            if resp is None:
+                continue
+            if resp.get("nextPageToken"):
+                tokens[cid] = resp["nextPageToken"]
+            yield cid, [_parse_playlist_item(pl) for pl in resp.get("items", [])]
+
+
+@traced("fetch.playlists_meta")
+def get_playlists_meta_many(channel_ids: Tuple[str, ...], api_key: str) -> Dict[str, List[Dict]]:
+    """
+    複数チャンネルのプレイリスト一覧 {channelId: [{"playlistId", "title", "itemCount"}]}（全件を持つ）。
+    途中で取得に失敗したチャンネルはそこまでの分を返す。
+    件数と上位だけが必要なら playlists.digest_playlists_many を使う。
+    """
+    annotate(channels=len(channel_ids))
+    out: Dict[str, List[Dict]] = {cid: [] for cid in channel_ids}
+    for cid, page in iter_playlist_pages_many(channel_ids, api_key):
+        out[cid].extend(page)
+    return out
+
+
+def get_playlists_meta(channel_id: str, api_key: str) -> List[Dict]:
+    return get_playlists_meta_many((channel_id,), api_key)[channel_id]
+
+
+# ===== 直近アップロード取得（uploads プレイリスト） =====
+def uploads_playlist_id_for(channel_id: str) -> str:
+    """
+    チャンネルID(UC〜) から uploads プレイリストID(UU〜) を導出する。
+    channels().list の結果を待たずに直近アップロードの取得を始めるために使う。
+    """
+    if channel_id.startswith("UC"):
+        return "UU" + channel_id[2:]
+    return ""
+
+
+def iter_upload_pages(uploads_playlist_id: str, api_key: str) -> Iterator[List[Dict]]:
+    """
+    uploads プレイリストを新しい順に1ページ（最大 50 件）ずつ返すジェネレータ。
+    - playlistItems().list は1ページ 1 unit
+    - 途中で取得に失敗したらそこで終わる（QuotaError は送出する）
+    各ページ: [{"videoId": ..., "publishedAt": ...}, ...]
+    """
+    if not uploads_playlist_id:
+        return
+
+    next_page: Optional[str] = None
+    while True:
+        try:
+            resp = api_list(api_key, "playlistItems", **_upload_page_params(uploads_playlist_id, next_page))
+        except QuotaError:
+            raise
+        except Exception:
+            return
+        yield _parse_upload_page(resp)
+        next_page = resp.get("nextPageToken")
+        if not next_page:
+            return
+
+
+def _upload_page_params(uploads_playlist_id: str, page_token: Optional[str]) -> Dict:
+    return dict(part="contentDetails", playlistId=uploads_playlist_id, maxResults=50, pageToken=page_token)
+
+
+def _parse_upload_page(resp: Dict) -> List[Dict]:
+    page: List[Dict] = []
+    for item in resp.get("items", []):
+        details = item.get("contentDetails", {}) or {}
+        vid = details.get("videoId")
+        published_raw = details.get("videoPublishedAt")
+        # 非公開・削除済み動画は videoPublishedAt を持たない
+        if not vid or parse_iso_datetime(published_raw) is None:
+            continue
+        page.append({"videoId": vid, "publishedAt": published_raw})
+    return page
+
+
+@traced("fetch.uploads_since")
+def get_uploads_since_many(targets: List[Tuple[str, datetime]], api_key: str) -> List[List[Dict]]:
+    """
+    複数の (uploads プレイリストID, since) を get_uploads_since と同じ条件でたどり、入力順に返す。
+    各プレイリストの次のページを1ラウンドずつ HTTP バッチにまとめるので、HTTP 往復は
+    「最もページ数の多いプレイリストのページ数」回で済む。
+    """
+    out: List[List[Dict]] = [[] for _ in targets]
+    tokens: Dict[int, Optional[str]] = {i: None for i, (pid, _) in enumerate(targets) if pid}
+    annotate(playlists=len(tokens))
+    while tokens:
+        active = list(tokens)
+        resps = api_list_batch(
+            api_key, "playlistItems", [_upload_page_params(targets[i][0], tokens[i]) for i in active]
+        )
+        tokens = {}
+        for i, resp in zip(active, resps):
+            if resp is None:
+                continue
+            since = targets[i][1]
+            reached_cutoff = False
+            for u in _parse_upload_page(resp):
+                if parse_iso_datetime(u["publishedAt"]) < since:
+                    reached_cutoff = True
+                    continue
+                out[i].append(u)
+            if not reached_cutoff and resp.get("nextPageToken"):
+                tokens[i] = resp["nextPageToken"]
+    return out
+
+
+def get_uploads_since(
+    uploads_playlist_id: str,
+    since: datetime,
+    api_key: str,
+) -> List[Dict]:
+    """
+    uploads プレイリストを新しい順にたどり、since 以降に公開された動画を返す。
+    - playlistItems().list は1ページ 1 unit（search().list は 100 units）
+    - since より古い動画が現れたページで打ち切る
+    戻り値: [{"videoId": ..., "publishedAt": ...}, ...]（新しい順）
+    """
+    return get_uploads_since_many([(uploads_playlist_id, since)], api_key)[0]
+
+
+def get_recent_uploads(
+    uploads_playlist_id: str,
+    days: int,
+    api_key: str,
+) -> List[Dict]:
+    """
+    直近 days 日以内に公開された動画を返す（get_uploads_since の日数指定版）
+    """
+    return get_uploads_since(uploads_playlist_id, utcnow() - timedelta(days=days), api_key)
+
+
+def get_recent_uploads_many(uploads_playlist_ids: List[str], days: int, api_key: str) -> List[List[Dict]]:
+    """
+    get_recent_uploads の複数プレイリスト版（ページ目ごとに HTTP バッチ）
+    """
+    since = utcnow() - timedelta(days=days)
+    return get_uploads_since_many([(pid, since) for pid in uploads_playlist_ids], api_key)
+
+
+def video_ids_within(uploads: List[Dict], days: int) -> List[str]:
+    """
+    get_recent_uploads の結果から、直近 days 日以内に公開された動画IDだけを返す
+    """
+    cutoff = utcnow() - timedelta(days=days)
+    ids: List[str] = []
+    for u in uploads:
+        published = parse_iso_datetime(u.get("publishedAt"))
+        if published is not None and published >= cutoff:
+            ids.append(u["videoId"])
+    return ids
+
+
+# ===== 複数動画の統計 =====
+def _is_stream(it: Dict, duration: Optional[int]) -> bool:
+    """
+    ライブ配信（配信中・配信予定・アーカイブ）かどうか。プレミア公開は liveStreamingDetails を持つが配信ではない
+    """
+    details = it.get("liveStreamingDetails") or {}
+    live = (it.get("snippet", {}) or {}).get("liveBroadcastContent")
+    if live in ("live", "upcoming"):
+        # 配信中・配信予定の配信は長さが決まっていない（プレミア公開は公開前から動画の長さを持つ）
+        return not duration
+    if not details:
+        return False
+    if not duration:
+        return True
+    started = parse_iso_datetime(details.get("actualStartTime"))
+    ended = parse_iso_datetime(details.get("actualEndTime"))
+    if started is None or ended is None:
+        # 長さのある動画で配信枠の時間が分からないものは、配信の合図がないのでプレミア公開とみなす
+        return False
+    return (ended - started).total_seconds() - duration < PREMIERE_MIN_COUNTDOWN_SECONDS
+
+
+def _is_short(it: Dict, duration: Optional[int]) -> bool:
+    if not duration or duration > SHORTS_MAX_SECONDS:
+        return False
+    if duration <= SHORTS_UNTAGGED_MAX_SECONDS:
+        return True
+    snippet = it.get("snippet", {}) or {}
+    text = f"{snippet.get('title') or ''} {snippet.get('description') or ''}".lower()
+    return "#shorts" in text
+
+
+def classify_video(it: Dict, duration: Optional[int]) -> str:
+    """
+    videos().list の1件を ショート / ライブ配信（アーカイブ・配信予定を含む）/ 通常動画 に分類する。
+    プレミア公開（公開予定を含む）は通常動画。ショートの判定は長さとハッシュタグによる推定
+    """
+    if _is_stream(it, duration):
+        return FORMAT_LIVE
+    if _is_short(it, duration):
+        return FORMAT_SHORT
+    return FORMAT_VOD
+
+
+def _parse_video_items(resp: Dict) -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    for it in resp.get("items", []):
+        vid = it.get("id")
+        if not vid:
+            continue
+        snippet = it.get("snippet", {}) or {}
+        stats = it.get("statistics", {}) or {}
+        duration = parse_iso_duration((it.get("contentDetails", {}) or {}).get("duration"))
+        out[vid] = {
+            "title": snippet.get("title", "") or "",
+            "publishedAt": snippet.get("publishedAt"),
+            "viewCount": int(stats.get("viewCount", 0) or 0),
+            "likeCount": int(stats.get("likeCount", 0) or 0),
+            "durationSeconds": duration,
+            "format": classify_video(it, duration),
+        }
+    return out
+
+
+@traced("fetch.videos_stats")
+def get_videos_stats(video_ids: Tuple[str, ...], api_key: str) -> Dict[str, Dict]:
+    """
+    動画IDごとの stats を返す。
+    動画単位のキャッシュで期限内のものは使い回し、期限切れ・未取得の ID だけを
+    50 件ずつ詰めて videos().list で取得する（チャンクは HTTP バッチにまとめる）。
+    contentDetails・liveStreamingDetails も同じ呼び出しで取る（part を増やしても 1 unit のまま）ので、
+    各動画の長さ（durationSeconds）と形式（format: short / live / vod）も返す。
+    """
+    if not video_ids:
+        return {}
+
+    cache = get_video_stats_cache()
+    out = cache.get_fresh(video_ids)
+    stale = [vid for vid in dict.fromkeys(video_ids) if vid not in out]
+    annotate(videos=len(video_ids), video_cache_hits=len(out))
+
+    params = [
+        dict(
+            part="snippet,statistics,contentDetails,liveStreamingDetails",
+            id=",".join(stale[i : i + 50]),
+            maxResults=50,
+        )
+        for i in range(0, len(stale), 50)
+    ]
+    for resp in api_list_batch(api_key, "videos", params):
+        if resp is None:
+            continue
+        part = _parse_video_items(resp)
+        cache.put_many(part)
+        out.update(part)
+
+    return out
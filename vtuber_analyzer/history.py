@@ -0,0 +1,187 @@
+"""
+履歴スナップショット
+
+集計のたびにチャンネル統計と動画ごとの統計を日付つきでローカルに保存し、
+保存済みの過去スナップショットとの差分から期間ごとの成長指標を計算する。
+"""
+import functools
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .storage import SQLiteStore
+from .utils import utcnow
+
+# 成長指標を出す期間（日）
+GROWTH_PERIODS: Tuple[int, ...] = (7, 30, 90)
+
+# 公開からこの日数以内の動画は再生数がまだ伸びているとみなし、更新のたびに stats を取り直す
+TRACKING_DAYS = 30
+
+GROWTH_COLUMNS: List[str] = [
+    f"{name}_delta_{days}d" for days in GROWTH_PERIODS for name in ("subs", "views", "videos")
+]
+
+
+def snapshot_date(dt: Optional[datetime] = None) -> str:
+    return (dt or utcnow()).strftime("%Y-%m-%d")
+
+
+class SnapshotStore(SQLiteStore):
+    """
+    チャンネル・動画の統計を (ID, 日付) ごとに保存する時系列ストア。
+    同じ日に複数回保存した場合は最後の値で上書きする。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS channel_snapshots (
+            channel_id TEXT NOT NULL,
+            snapshot_date TEXT NOT NULL,
+            taken_at REAL NOT NULL,
+            title TEXT,
+            subscriber_count INTEGER NOT NULL,
+            view_count INTEGER NOT NULL,
+            video_count INTEGER NOT NULL,
+            PRIMARY KEY (channel_id, snapshot_date)
+        );
+        CREATE TABLE IF NOT EXISTS video_snapshots (
+            video_id TEXT NOT NULL,
+            snapshot_date TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            published_at TEXT,
+            view_count INTEGER NOT NULL,
+            like_count INTEGER NOT NULL,
+            PRIMARY KEY (video_id, snapshot_date)
+        );
+        CREATE INDEX IF NOT EXISTS idx_video_snapshots_channel
+            ON video_snapshots(channel_id, snapshot_date);
+    """
+
+    def record(
+        self,
+        basic: Dict,
+        video_stats: Dict[str, Dict],
+        uploads: List[Dict],
+        taken_at: Optional[datetime] = None,
+    ) -> str:
+        """
+        チャンネル基本情報と動画 stats をスナップショットとして保存し、保存した日付を返す。
+        uploads: [{"videoId", "publishedAt"}]（公開日時の記録用）
+        """
+        day = snapshot_date(taken_at)
+        channel_id = basic["channelId"]
+        published = {u["videoId"]: u.get("publishedAt") for u in uploads}
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO channel_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                channel_id,
+                day,
+                taken_at.timestamp() if taken_at else time.time(),
+                basic.get("title"),
+                basic.get("subscriberCount", 0),
+                basic.get("viewCount", 0),
+                basic.get("videoCount", 0),
+            ),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO video_snapshots VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    vid,
+                    day,
+                    channel_id,
+                    published.get(vid),
+                    stats.get("viewCount", 0),
+                    stats.get("likeCount", 0),
+                )
+                for vid, stats in video_stats.items()
+            ],
+        )
+        conn.commit()
+        return day
+
+    @staticmethod
+    def _channel_row(row) -> Dict:
+        return {
+            "channelId": row[0],
+            "snapshot_date": row[1],
+            "taken_at": row[2],
+            "title": row[3],
+            "subscriberCount": row[4],
+            "viewCount": row[5],
+            "videoCount": row[6],
+        }
+
+    def latest(self, channel_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT * FROM channel_snapshots WHERE channel_id = ? ORDER BY snapshot_date DESC LIMIT 1",
+            (channel_id,),
+        ).fetchone()
+        return self._channel_row(row) if row else None
+
+    def on_or_before(self, channel_id: str, day: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT * FROM channel_snapshots WHERE channel_id = ? AND snapshot_date <= ?"
+            " ORDER BY snapshot_date DESC LIMIT 1",
+            (channel_id, day),
+        ).fetchone()
+        return self._channel_row(row) if row else None
+
+    def channel_history(self, channel_id: str) -> List[Dict]:
+        cur = self._conn().execute(
+            "SELECT * FROM channel_snapshots WHERE channel_id = ? ORDER BY snapshot_date", (channel_id,)
+        )
+        return [self._channel_row(r) for r in cur.fetchall()]
+
+    def columns(self, day: Optional[str] = None) -> Dict[str, List]:
+        """
+        各チャンネルの最新スナップショット（day 指定時はその日以前で最新）を列指向で返す。
+        metrics.compute_metrics にそのまま渡して、保存済みの全チャンネルの指標を一括で再計算できる。
+        """
+        cur = self._conn().execute(
+            """
+            SELECT s.* FROM channel_snapshots s
+            JOIN (
+                SELECT channel_id, MAX(snapshot_date) AS d FROM channel_snapshots
+                WHERE snapshot_date <= ? GROUP BY channel_id
+            ) latest ON s.channel_id = latest.channel_id AND s.snapshot_date = latest.d
+            ORDER BY s.channel_id
+            """,
+            (day or "9999-12-31",),
+        )
+        rows = [self._channel_row(r) for r in cur.fetchall()]
+        names = ("channelId", "snapshot_date", "title", "subscriberCount", "viewCount", "videoCount")
+        return {name: [r[name] for r in rows] for name in names}
+
+    def newest_upload_published_at(self, channel_id: str) -> Optional[str]:
+        """
+        保存済みの動画のうち最も新しい公開日時（ISO 文字列）
+        """
+        row = self._conn().execute(
+            "SELECT MAX(published_at) FROM video_snapshots WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def growth(self, channel_id: str, periods: Tuple[int, ...] = GROWTH_PERIODS) -> Dict:
+        """
+        最新スナップショットと、各期間だけ前（以前で最も近い日）のスナップショットとの差分。
+        比較できるスナップショットがない期間の値は None。
+        """
+        out: Dict = {}
+        current = self.latest(channel_id)
+        for days in periods:
+            base = None
+            if current:
+                target = datetime.strptime(current["snapshot_date"], "%Y-%m-%d") - timedelta(days=days)
+                base = self.on_or_before(channel_id, target.strftime("%Y-%m-%d"))
+            for name, field in (("subs", "subscriberCount"), ("views", "viewCount"), ("videos", "videoCount")):
+                out[f"{name}_delta_{days}d"] = current[field] - base[field] if base else None
+            out[f"baseline_date_{days}d"] = base["snapshot_date"] if base else None
+        return out
+
+
+@functools.lru_cache(maxsize=None)
+def get_snapshot_store() -> SnapshotStore:
+    return SnapshotStore(settings.history_db_path)
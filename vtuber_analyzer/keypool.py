@@ -0,0 +1,91 @@
+"""
+API キーのプール
+
+複数の API キー（= Google Cloud プロジェクト）に呼び出しを順番に割り振り、1日の処理量をキーの数だけ増やす。
+- キーごとの使用量はクォータ台帳に記録し、予算超過・quotaExceeded のキーはその日のうちは使わない
+- キー不正などのエラーが出たキーは一定時間ローテーションから外す
+- キャッシュのキーには API キーを含めないので、どのキーで取得した結果も共有される
+"""
+import functools
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, List
+
+from .config import settings
+from .quota import QuotaExhausted, get_quota_ledger
+
+
+def parse_api_keys(spec: str) -> List[str]:
+    """
+    カンマ・空白・改行区切りのキー一覧を重複なしのリストにする
+    """
+    keys: List[str] = []
+    for key in re.split(r"[\s,]+", spec or ""):
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def key_id(api_key: str) -> str:
+    """
+    台帳や画面に出すためのキーの識別子（キーそのものは保存しない）
+    """
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class KeyPool:
+    """
+    ラウンドロビンでキーを貸し出す
+    """
+
+    def __init__(self, keys: List[str]):
+        if not keys:
+            raise RuntimeError("YouTube API key is not configured.")
+        self.keys = keys
+        self.ids: Dict[str, str] = {k: key_id(k) for k in keys}
+        self._lock = threading.Lock()
+        self._cursor = 0
+        # キー → この時刻（time.time()）まで使わない
+        self._benched: Dict[str, float] = {}
+        get_quota_ledger().register_keys(list(self.ids.values()))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def acquire(self) -> str:
+        """
+        次に使うキーを返す。使えるキーがなければ QuotaExhausted
+        """
+        exhausted = set(get_quota_ledger().exhausted_keys())
+        now = time.time()
+        with self._lock:
+            for _ in range(len(self.keys)):
+                key = self.keys[self._cursor]
+                self._cursor = (self._cursor + 1) % len(self.keys)
+                if self.ids[key] in exhausted or self._benched.get(key, 0) > now:
+                    continue
+                return key
+        raise QuotaExhausted("利用できる API キーがありません（全てのキーがクォータ上限またはエラー）。")
+
+    def mark_exhausted(self, key: str) -> None:
+        """
+        キーのクォータが尽きた（太平洋時間の0時まで使わない。他のプロセスとも台帳で共有）
+        """
+        get_quota_ledger().mark_key_exhausted(self.ids[key])
+
+    def mark_failed(self, key: str) -> None:
+        """
+        キー不正・API 無効などのエラー。key_error_cooldown 秒ローテーションから外す
+        """
+        with self._lock:
+            self._benched[key] = time.time() + settings.key_error_cooldown
+
+
+@functools.lru_cache(maxsize=None)
+def get_key_pool(spec: str) -> KeyPool:
+    """
+    キー一覧の文字列（1つでもカンマ区切りの複数でもよい）ごとに1つのプール
+    """
+    return KeyPool(parse_api_keys(spec))
@@ -0,0 +1,313 @@
+"""
+指標計算
+"""
+import heapq
+import math
+import re
+from typing import AbstractSet, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .timeline import VIDEO_FORMATS, UploadTimeline
+from .utils import parse_iso_datetime, utcnow
+
+# 集計する直近ウィンドウ（日数）。最大のウィンドウまで1回だけ遡って全ウィンドウに使い回す
+RECENT_WINDOWS: Tuple[int, ...] = (10, 30)
+
+
+def window_key(days: int, video_format: Optional[str] = None) -> str:
+    """
+    ウィンドウ列名の接尾辞。全動画は "last10"、形式別は "short_last10" のように形式を前に付ける
+    """
+    return f"{video_format}_last{days}" if video_format else f"last{days}"
+
+
+# ===== 指標定義 =====
+# (指標名, 分子の列, 分母の列, 丸め桁数)。分母が 0 以下・欠損の行は 0.0 とする。
+# 前の指標を入力に使う指標（subs_per_month_per_video など）は依存先より後ろに置く。
+METRIC_DEFINITIONS: List[Tuple[str, str, str, int]] = [
+    ("subs_per_month", "subscriberCount", "months_active", 2),
+    ("subs_per_video", "subscriberCount", "videoCount", 2),
+    ("views_per_video", "viewCount", "videoCount", 2),
+    ("views_per_sub", "viewCount", "subscriberCount", 2),
+    ("subs_per_total_view", "subscriberCount", "viewCount", 5),
+    ("playlists_per_video", "playlistCount", "videoCount", 5),
+    ("videos_per_month", "videoCount", "months_active", 2),
+    ("videos_per_subscriber", "videoCount", "subscriberCount", 5),
+    ("subs_per_month_per_video", "subs_per_month", "videoCount", 5),
+    ("views_per_month", "viewCount", "months_active", 2),
+    ("playlist_coverage", "playlistedVideoCount", "videoCount", 4),
+]
+
+# 直近ウィンドウ（と形式）ごとの集計列と指標（"{w}" は window_key の接尾辞）
+WINDOW_AGGREGATES: Tuple[str, ...] = ("total_views", "num_videos", "top_video_id", "top_views", "top_title")
+WINDOW_METRIC_DEFINITIONS: List[Tuple[str, str, str, int]] = [
+    ("top_share_{w}", "top_views_{w}", "total_views_{w}", 4),
+    ("avg_views_per_video_{w}", "total_views_{w}", "num_videos_{w}", 2),
+    ("views_per_sub_{w}", "total_views_{w}", "subscriberCount", 5),
+    ("playlisted_share_{w}", "playlisted_videos_{w}", "num_videos_{w}", 4),
+    ("playlisted_view_share_{w}", "playlisted_views_{w}", "total_views_{w}", 4),
+]
+
+# プレイリスト収録の集計列（channel_columns に playlisted を渡したときだけ作る）
+PLAYLIST_WINDOW_AGGREGATES: Tuple[str, ...] = ("playlisted_videos", "playlisted_views")
+
+_WINDOW_COLUMN = re.compile(r"^total_views_((?:[a-z]+_)?last\d+)$")
+
+# 文字列（または None）を持つ列
+_TEXT_COLUMN_PREFIXES = ("channelId", "title", "publishedDate", "top_video_id_", "top_title_")
+# 整数（件数・再生数。欠損は None）の列。文字列でも整数でもない列は小数
+_INT_COLUMNS = ("subscriberCount", "videoCount", "viewCount", "playlistCount", "days_active", "playlistedVideoCount")
+_INT_COLUMN_PREFIXES = ("total_views_", "num_videos_", "top_views_") + tuple(
+    f"{name}_" for name in PLAYLIST_WINDOW_AGGREGATES
+)
+_FLOAT_COLUMNS = ("months_active",) + tuple(name for name, *_ in METRIC_DEFINITIONS)
+_FLOAT_COLUMN_PREFIXES = tuple(name.split("{w}")[0] for name, *_ in WINDOW_METRIC_DEFINITIONS)
+
+
+def column_type(name: str) -> Optional[str]:
+    """
+    channel_columns / compute_metrics が作る列の値の型（"string" / "int" / "float"）。知らない列は None
+    """
+    if name.startswith(_TEXT_COLUMN_PREFIXES):
+        return "string"
+    if name in _INT_COLUMNS or name.startswith(_INT_COLUMN_PREFIXES):
+        return "int"
+    if name in _FLOAT_COLUMNS or name.startswith(_FLOAT_COLUMN_PREFIXES):
+        return "float"
+    return None
+
+
+# ===== 指標エンジン（列指向・N チャンネル一括） =====
+def _safe_div(num: np.ndarray, den: np.ndarray, digits: int) -> np.ndarray:
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    out = np.zeros(np.broadcast(num, den).shape, dtype=np.float64)
+    # NaN（活動月数が不明など）も den > 0 が False になるので 0.0 になる
+    np.divide(num, den, out=out, where=np.nan_to_num(den, nan=0.0) > 0)
+    return np.round(out, digits)
+
+
+def compute_metrics(columns: Mapping[str, Sequence]) -> Dict[str, np.ndarray]:
+    """
+    列指向のチャンネルデータ（列名 → 長さ N の配列）から、入力列が揃っている全指標を
+    N チャンネル分まとめて計算し、入力列に指標列を加えた表（列名 → 配列）を返す。
+    - days_active があり months_active がなければ days_active / 30（小数2桁）を活動月数とする
+    - total_views_last{d}（形式別は total_views_{形式}_last{d}）列があるウィンドウについてはウィンドウ指標も計算する
+    """
+    table: Dict[str, np.ndarray] = {name: np.asarray(values) for name, values in columns.items()}
+
+    if "months_active" not in table and "days_active" in table:
+        table["months_active"] = np.round(np.asarray(table["days_active"], dtype=np.float64) / 30, 2)
+
+    definitions = list(METRIC_DEFINITIONS)
+    window_keys = [m.group(1) for m in map(_WINDOW_COLUMN.match, table) if m]
+    for w in window_keys:
+        definitions += [
+            (name.format(w=w), num.format(w=w), den.format(w=w), digits)
+            for name, num, den, digits in WINDOW_METRIC_DEFINITIONS
+        ]
+
+    for name, num, den, digits in definitions:
+        if num in table and den in table:
+            table[name] = _safe_div(table[num], table[den], digits)
+
+    return table
+
+
+def table_rows(table: Mapping[str, np.ndarray]) -> List[Dict]:
+    """
+    compute_metrics の結果を1チャンネル1行の dict に変換する（NumPy の値は Python の値に、NaN は None に）
+    """
+    names = list(table)
+    columns = [np.asarray(table[name]).tolist() for name in names]
+    rows: List[Dict] = []
+    for values in zip(*columns):
+        rows.append(
+            {
+                name: (None if isinstance(v, float) and math.isnan(v) else v)
+                for name, v in zip(names, values)
+            }
+        )
+    return rows
+
+
+# ===== チャンネルデータ → 列 =====
+def channel_columns(
+    basics: List[Dict],
+    timelines: List[UploadTimeline],
+    playlist_counts: List[int],
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlisted: Optional[List[Optional[AbstractSet[str]]]] = None,
+) -> Dict[str, List]:
+    """
+    チャンネルごとの基本情報・動画タイムライン・プレイリスト数を、compute_metrics の入力列にまとめる。
+    windows の各ウィンドウの集計はタイムラインから二分探索と累積和で求める（全動画と、VIDEO_FORMATS の形式別）。
+    playlisted（チャンネルごとの、いずれかのプレイリストに入っている動画IDの集合）を渡すと収録数の列も作る。
+    集合が None のチャンネル（索引を作れなかった）は NaN にする。
+    """
+    now = utcnow()
+    columns: Dict[str, List] = {
+        name: []
+        for name in (
+            "channelId",
+            "title",
+            "subscriberCount",
+            "videoCount",
+            "viewCount",
+            "publishedDate",
+            "days_active",
+            "playlistCount",
+        )
+    }
+    windows = sorted(set(windows))
+    for days in windows:
+        for video_format in (None,) + VIDEO_FORMATS:
+            for name in WINDOW_AGGREGATES:
+                columns[f"{name}_{window_key(days, video_format)}"] = []
+    if playlisted is not None:
+        columns["playlistedVideoCount"] = []
+        for days in windows:
+            for video_format in (None,) + VIDEO_FORMATS:
+                for name in PLAYLIST_WINDOW_AGGREGATES:
+                    columns[f"{name}_{window_key(days, video_format)}"] = []
+
+    now_ts = now.timestamp()
+    for i, (basic, timeline, playlist_count) in enumerate(zip(basics, timelines, playlist_counts)):
+        published_dt = parse_iso_datetime(basic.get("publishedAt"))
+        columns["channelId"].append(basic.get("channelId"))
+        columns["title"].append(basic.get("title"))
+        columns["subscriberCount"].append(basic.get("subscriberCount", 0))
+        columns["videoCount"].append(basic.get("videoCount", 0))
+        columns["viewCount"].append(basic.get("viewCount", 0))
+        columns["publishedDate"].append(published_dt.strftime("%Y-%m-%d") if published_dt else None)
+        columns["days_active"].append((now - published_dt).days if published_dt else math.nan)
+        columns["playlistCount"].append(playlist_count)
+        by_format = {None: timeline.windows(windows, now=now_ts), **timeline.windows_by_format(windows, now=now_ts)}
+        for video_format, aggs in by_format.items():
+            for days, agg in aggs.items():
+                for name in WINDOW_AGGREGATES:
+                    columns[f"{name}_{window_key(days, video_format)}"].append(agg[name])
+        if playlisted is not None:
+            _append_playlisted(columns, timeline, playlisted[i], windows, now_ts)
+
+    # 文字列・None の混じる列は object 配列にする（NumPy が文字列長で型を決めないように）
+    return {
+        name: np.array(values, dtype=object) if name.startswith(_TEXT_COLUMN_PREFIXES) else values
+        for name, values in columns.items()
+    }
+
+
+def _append_playlisted(
+    columns: Dict[str, List],
+    timeline: UploadTimeline,
+    members: Optional[AbstractSet[str]],
+    windows: Sequence[int],
+    now_ts: float,
+) -> None:
+    columns["playlistedVideoCount"].append(len(members) if members is not None else math.nan)
+    segments = {None: timeline, **{fmt: timeline.segment(fmt) for fmt in VIDEO_FORMATS}}
+    for video_format, segment in segments.items():
+        for days in windows:
+            num, views = segment.covered(days, members, now_ts) if members is not None else (math.nan, math.nan)
+            columns[f"playlisted_videos_{window_key(days, video_format)}"].append(num)
+            columns[f"playlisted_views_{window_key(days, video_format)}"].append(views)
+
+
+def compute_channels_metrics(
+    basics: List[Dict],
+    timelines: List[UploadTimeline],
+    playlist_counts: List[int],
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlisted: Optional[List[Optional[AbstractSet[str]]]] = None,
+) -> List[Dict]:
+    """
+    N チャンネル分の指標を1回のベクトル演算で計算し、1チャンネル1行の dict で返す
+    """
+    if not basics:
+        return []
+    table = compute_metrics(channel_columns(basics, timelines, playlist_counts, windows, playlisted))
+    return table_rows(table)
+
+
+def compute_channel_metrics(
+    basic: Dict,
+    timeline: UploadTimeline,
+    playlist_count: int,
+    windows: Sequence[int] = RECENT_WINDOWS,
+    playlisted: Optional[AbstractSet[str]] = None,
+) -> Dict:
+    """
+    チャンネル基本情報と動画タイムラインから各種指標を計算する（compute_channels_metrics の N=1）。
+    戻り値は指標名 → 値 のフラットな dict（ウィンドウ指標は "_last{日数}"、形式別は "_{形式}_last{日数}" 付き）。
+    playlisted を渡したときだけプレイリスト収録率の指標を含む。
+    """
+    return compute_channels_metrics(
+        [basic], [timeline], [playlist_count], windows, None if playlisted is None else [playlisted]
+    )[0]
+
+
+def top_playlists(playlists_meta: List[Dict], n: int = 5) -> List[Dict]:
+    """
+    件数順の上位 n プレイリスト（足りない分は "-" で埋める）。全件は並べ替えず、大きさ n のヒープで選ぶ
+    """
+    top = heapq.nlargest(n, playlists_meta, key=lambda x: x["itemCount"])
+    while len(top) < n:
+        top.append({"title": "-", "itemCount": "-"})
+    return top
+
+
+# ===== 1チャンネル1行の出力列 =====
+def cohort_columns(windows: Sequence[int] = RECENT_WINDOWS) -> List[str]:
+    """
+    コホート結果の列順（CSV 出力にもこの順で使う）。各ウィンドウの全動画の列のあとに形式別の列を並べる
+    """
+    return [
+        "channelId",
+        "title",
+        "subscriberCount",
+        "videoCount",
+        "viewCount",
+        "publishedDate",
+        "months_active",
+        "subs_per_month",
+        "subs_per_video",
+        "views_per_video",
+        "views_per_sub",
+        "subs_per_total_view",
+        "playlists_per_video",
+        "videos_per_month",
+        "videos_per_subscriber",
+    ] + [
+        f"{name}_{window_key(days, video_format)}"
+        for days in windows
+        for video_format in (None,) + VIDEO_FORMATS
+        for name in (
+            "total_views",
+            "num_videos",
+            "top_title",
+            "top_views",
+            "top_share",
+            "avg_views_per_video",
+            "views_per_sub",
+        )
+    ]
+
+
+COHORT_COLUMNS: List[str] = cohort_columns(RECENT_WINDOWS)
+
+
+def playlist_coverage_columns(windows: Sequence[int] = RECENT_WINDOWS) -> List[str]:
+    """
+    プレイリスト収録率の出力列（索引を作った実行だけ、コホート結果の後ろに付ける。形式別は含めない）
+    """
+    return ["playlistedVideoCount", "playlist_coverage"] + [
+        name.format(w=window_key(days))
+        for days in windows
+        for name in (
+            "playlisted_videos_{w}",
+            "playlisted_share_{w}",
+            "playlisted_views_{w}",
+            "playlisted_view_share_{w}",
+        )
+    ]
@@ -0,0 +1,235 @@
+"""
+プレイリストの集計（件数と上位 k 件のストリーミング集計、プレイリスト → 収録動画の索引）
+
+- PlaylistDigest はプレイリスト一覧をページごとに受け取り、件数と件数順の上位 k 件（大きさ k のヒープ）
+  だけを持つ。数百のプレイリストを持つチャンネルでも全件を保持・並べ替えしない
+- PlaylistIndexStore はプレイリストごとの収録動画ID（そのチャンネル自身の動画だけ）を SQLite に保存する。
+  index_playlists は itemCount が前回と変わったか settings.playlist_index_max_age を過ぎたプレイリストだけ
+  playlistItems().list（1ページ 1 unit）で取り直す
+- 索引から「いずれかのプレイリストに入っている動画」の集合を作り、収録率の指標（metrics）に使う
+"""
+import functools
+import heapq
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .client import api_list_batch
+from .config import settings
+from .fetchers import iter_playlist_pages_many
+from .storage import SQLiteStore
+from .tracing import annotate, traced
+
+# 動画IDの長さ（索引には区切りなしで連結して保存する）
+VIDEO_ID_LENGTH = 11
+
+
+# ===== 件数と上位 k 件 =====
+class PlaylistDigest:
+    """
+    1チャンネルのプレイリスト一覧の要約。add_page でページを流し込む。
+    - count: プレイリスト数
+    - top(): 件数順の上位 k 件（同数なら API の並び順で先のもの）
+    - item_counts: プレイリストID → itemCount（索引の増分更新に使う）
+    - playlists: keep_all=True のときだけ全件（明細の書き出し用）
+    - playlisted: index_playlists のあと、いずれかのプレイリストに入っている自チャンネルの動画IDの集合
+    """
+
+    __slots__ = ("k", "count", "item_counts", "playlists", "playlisted", "_heap")
+
+    def __init__(self, k: int = 5, keep_all: bool = False):
+        self.k = k
+        self.count = 0
+        self.item_counts: Dict[str, int] = {}
+        self.playlists: Optional[List[Dict]] = [] if keep_all else None
+        self.playlisted: Optional[Set[str]] = None
+        # (itemCount, -到着順, プレイリスト) の最小ヒープ。根が上位 k 件の最下位
+        self._heap: List[Tuple[int, int, Dict]] = []
+
+    def add_page(self, page: Iterable[Dict]) -> None:
+        for pl in page:
+            entry = (pl["itemCount"], -self.count, pl)
+            self.count += 1
+            if pl.get("playlistId"):
+                self.item_counts[pl["playlistId"]] = pl["itemCount"]
+            if self.playlists is not None:
+                self.playlists.append(pl)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, entry)
+
+    def top(self) -> List[Dict]:
+        return [pl for *_, pl in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+@traced("fetch.playlists_digest")
+def digest_playlists_many(
+    channel_ids: Tuple[str, ...], api_key: str, k: int = 5, keep_all: bool = False
+) -> Dict[str, PlaylistDigest]:
+    """
+    複数チャンネルのプレイリスト一覧を、ページを受け取るたびに PlaylistDigest へ流し込む
+    （get_playlists_meta_many と同じ API 呼び出し。途中で失敗したチャンネルはそこまでの分）
+    """
+    annotate(channels=len(channel_ids))
+    digests = {cid: PlaylistDigest(k, keep_all) for cid in channel_ids}
+    for cid, page in iter_playlist_pages_many(tuple(digests), api_key):
+        digests[cid].add_page(page)
+    annotate(playlists=sum(d.count for d in digests.values()))
+    return digests
+
+
+def digest_playlists(channel_id: str, api_key: str, k: int = 5, keep_all: bool = False) -> PlaylistDigest:
+    return digest_playlists_many((channel_id,), api_key, k, keep_all)[channel_id]
+
+
+# ===== プレイリスト → 収録動画の索引 =====
+class PlaylistIndexStore(SQLiteStore):
+    """
+    プレイリストごとの収録動画ID。取得時の itemCount と時刻を持ち、変わっていなければ取り直さない
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS playlist_members (
+            playlist_id TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            item_count INTEGER NOT NULL,
+            indexed_at REAL NOT NULL,
+            video_ids TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_playlist_members_channel ON playlist_members(channel_id);
+    """
+    _CHUNK = 500
+
+    def get_many(self, playlist_ids: Iterable[str]) -> Dict[str, Tuple[int, float, List[str]]]:
+        """
+        {プレイリストID: (itemCount, 取得時刻, [動画ID])}（索引にないものは含まない）
+        """
+        ids = list(dict.fromkeys(playlist_ids))
+        out: Dict[str, Tuple[int, float, List[str]]] = {}
+        conn = self._conn()
+        for i in range(0, len(ids), self._CHUNK):
+            chunk = ids[i : i + self._CHUNK]
+            marks = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                "SELECT playlist_id, item_count, indexed_at, video_ids FROM playlist_members"
+                f" WHERE playlist_id IN ({marks})",
+                chunk,
+            )
+            for pid, item_count, indexed_at, packed in cur:
+                out[pid] = (item_count, indexed_at, _unpack(packed))
+        return out
+
+    def item_counts_by_channel(self, channel_ids: Iterable[str]) -> Dict[str, List[int]]:
+        """
+        {チャンネルID: [索引済みプレイリストの itemCount]}（見積もり用）
+        """
+        ids = list(dict.fromkeys(channel_ids))
+        out: Dict[str, List[int]] = {}
+        conn = self._conn()
+        for i in range(0, len(ids), self._CHUNK):
+            chunk = ids[i : i + self._CHUNK]
+            marks = ",".join("?" * len(chunk))
+            cur = conn.execute(
+                f"SELECT channel_id, item_count FROM playlist_members WHERE channel_id IN ({marks})", chunk
+            )
+            for cid, item_count in cur:
+                out.setdefault(cid, []).append(item_count)
+        return out
+
+    def put_many(self, rows: Iterable[Tuple[str, str, int, List[str]]], now: Optional[float] = None) -> None:
+        """
+        rows: [(プレイリストID, チャンネルID, itemCount, [動画ID])]
+        """
+        now = now if now is not None else time.time()
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO playlist_members VALUES (?, ?, ?, ?, ?)",
+            [(pid, cid, item_count, now, _pack(video_ids)) for pid, cid, item_count, video_ids in rows],
+        )
+        conn.commit()
+
+
+def _pack(video_ids: Iterable[str]) -> str:
+    return "".join(vid for vid in video_ids if len(vid) == VIDEO_ID_LENGTH)
+
+
+def _unpack(packed: str) -> List[str]:
+    return [packed[i : i + VIDEO_ID_LENGTH] for i in range(0, len(packed), VIDEO_ID_LENGTH)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_playlist_index_store() -> PlaylistIndexStore:
+    return PlaylistIndexStore(settings.playlist_index_db_path)
+
+
+@traced("fetch.playlist_members")
+def get_playlist_members_many(targets: List[Tuple[str, str]], api_key: str) -> Dict[str, Optional[List[str]]]:
+    """
+    [(プレイリストID, 持ち主のチャンネルID)] の収録動画ID（持ち主自身の動画だけ）を
+    各プレイリストの次のページを1ラウンドずつ HTTP バッチにまとめてたどって取得する。
+    途中で取得に失敗したプレイリストは None（不完全な索引は保存しない）。
+    """
+    annotate(playlists=len(targets))
+    owners = dict(targets)
+    members: Dict[str, Optional[List[str]]] = {pid: [] for pid in owners}
+    tokens: Dict[str, Optional[str]] = {pid: None for pid in owners}
+    while tokens:
+        active = list(tokens)
+        resps = api_list_batch(
+            api_key,
+            "playlistItems",
+            [dict(part="snippet", playlistId=pid, maxResults=50, pageToken=tokens[pid]) for pid in active],
+        )
+        tokens = {}
+        for pid, resp in zip(active, resps):
+            if resp is None:
+                members[pid] = None
+                continue
+            for it in resp.get("items", []):
+                snippet = it.get("snippet", {}) or {}
+                vid = (snippet.get("resourceId", {}) or {}).get("videoId")
+                if vid and snippet.get("videoOwnerChannelId") == owners[pid]:
+                    members[pid].append(vid)
+            if resp.get("nextPageToken"):
+                tokens[pid] = resp["nextPageToken"]
+    return members
+
+
+@traced("playlist_index")
+def index_playlists(
+    digests: Dict[str, PlaylistDigest],
+    api_key: str,
+    store: Optional[PlaylistIndexStore] = None,
+    now: Optional[float] = None,
+) -> None:
+    """
+    各チャンネルの digest.playlisted に、いずれかのプレイリストに入っている自チャンネルの動画IDの集合を入れる。
+    索引にないか、itemCount が変わったか、settings.playlist_index_max_age を過ぎたプレイリストだけ取り直す。
+    取り直しに失敗したプレイリストは前回の索引を使う（前回もなければ含めない）。
+    """
+    store = store or get_playlist_index_store()
+    now = now if now is not None else time.time()
+    known = store.get_many(pid for d in digests.values() for pid in d.item_counts)
+    targets = [
+        (pid, cid)
+        for cid, d in digests.items()
+        for pid, item_count in d.item_counts.items()
+        if pid not in known
+        or known[pid][0] != item_count
+        or now - known[pid][1] > settings.playlist_index_max_age
+    ]
+    annotate(playlists=sum(len(d.item_counts) for d in digests.values()), reindexed=len(targets))
+
+    fetched = get_playlist_members_many(targets, api_key) if targets else {}
+    store.put_many(
+        [(pid, cid, digests[cid].item_counts[pid], fetched[pid]) for pid, cid in targets if fetched[pid] is not None],
+        now,
+    )
+    for d in digests.values():
+        playlisted: Set[str] = set()
+        for pid in d.item_counts:
+            video_ids = fetched.get(pid)
+            if video_ids is None and pid in known:
+                video_ids = known[pid][2]
+            playlisted.update(video_ids or ())
+        d.playlisted = playlisted
@@ -0,0 +1,303 @@
+"""
+クォータ台帳
+
+API 呼び出しの消費ユニットを日別・エンドポイント別・実行別に記録し、1日の予算を超える呼び出しを拒否する。
+"""
+import contextlib
+import functools
+import sqlite3
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+from .config import settings
+from .storage import SQLiteStore
+
+# エンドポイントごとの消費ユニット（記載のないものは DEFAULT_QUOTA_COST）
+QUOTA_COSTS: Dict[str, int] = {
+    "search.list": 100,
+}
+DEFAULT_QUOTA_COST = 1
+
+# クォータは太平洋時間の0時にリセットされる
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaError(RuntimeError):
+    """
+    クォータ不足で API を呼べないことを表す。フェッチャーはこれを握りつぶさない。
+    """
+
+
+class QuotaBudgetExceeded(QuotaError):
+    """設定した1日の予算（settings.daily_quota_budget）を超える呼び出し"""
+
+
+class QuotaExhausted(QuotaError):
+    """API 側のクォータ切れ（403 quotaExceeded）"""
+
+
+def quota_cost(endpoint: str) -> int:
+    return QUOTA_COSTS.get(endpoint, DEFAULT_QUOTA_COST)
+
+
+def quota_day(now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+class RunUsage:
+    """
+    1回の集計で使ったユニット・呼び出し数・キャッシュヒット・エラーをエンドポイント別に数える
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints: Dict[str, Dict[str, int]] = {}
+
+    def add(self, endpoint: str, units: int = 0, calls: int = 0, cache_hits: int = 0, errors: int = 0):
+        with self._lock:
+            row = self.endpoints.setdefault(
+                endpoint, {"units": 0, "calls": 0, "cache_hits": 0, "errors": 0}
+            )
+            row["units"] += units
+            row["calls"] += calls
+            row["cache_hits"] += cache_hits
+            row["errors"] += errors
+
+    def totals(self) -> Dict[str, int]:
+        out = {"units": 0, "calls": 0, "cache_hits": 0, "errors": 0}
+        with self._lock:
+            for row in self.endpoints.values():
+                for k in out:
+                    out[k] += row[k]
+        return out
+
+    def rows(self) -> List[Dict]:
+        with self._lock:
+            return [{"endpoint": ep, **row} for ep, row in sorted(self.endpoints.items())]
+
+
+# 実行中の集計（submit_fetch が contextvars ごとワーカーへ引き継ぐ）
+current_run: ContextVar[Optional[RunUsage]] = ContextVar("current_run", default=None)
+
+
+class QuotaLedger(SQLiteStore):
+    """
+    API 呼び出しの消費ユニットを日別・エンドポイント別に記録し、1日の予算を超える呼び出しを拒否する
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS quota_daily (
+            day TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            units INTEGER NOT NULL DEFAULT 0,
+            calls INTEGER NOT NULL DEFAULT 0,
+            cache_hits INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, endpoint)
+        );
+        CREATE TABLE IF NOT EXISTS quota_keys (
+            day TEXT NOT NULL,
+            key_id TEXT NOT NULL,
+            units INTEGER NOT NULL DEFAULT 0,
+            calls INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            exhausted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, key_id)
+        );
+    """
+
+    def __init__(self, path: str, daily_budget: int):
+        super().__init__(path)
+        # APIキー（= Google Cloud プロジェクト）1つあたりの1日の予算
+        self.daily_budget = daily_budget
+        self._lock = threading.Lock()
+        # キープールで使うキーの識別子（空なら単一キーとして全体で予算を見る）
+        self.key_ids: List[str] = []
+
+    def register_keys(self, key_ids: List[str]) -> None:
+        for key_id in key_ids:
+            if key_id not in self.key_ids:
+                self.key_ids.append(key_id)
+
+    @property
+    def total_budget(self) -> int:
+        return self.daily_budget * max(len(self.key_ids), 1)
+
+    def used_today(self) -> int:
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(units), 0) FROM quota_daily WHERE day = ?", (quota_day(),)
+        ).fetchone()
+        return int(row[0])
+
+    def used_by_key(self, key_id: str) -> int:
+        row = self._conn().execute(
+            "SELECT units FROM quota_keys WHERE day = ? AND key_id = ?", (quota_day(), key_id)
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def remaining_today(self) -> int:
+        if not self.key_ids:
+            return max(self.daily_budget - self.used_today(), 0)
+        exhausted = set(self.exhausted_keys())
+        return sum(
+            max(self.daily_budget - self.used_by_key(key_id), 0)
+            for key_id in self.key_ids
+            if key_id not in exhausted
+        )
+
+    def key_rows(self, day: Optional[str] = None) -> List[Dict]:
+        """
+        キーごとの使用量（register_keys 済みのキーは未使用でも含める）
+        """
+        cur = self._conn().execute(
+            "SELECT key_id, units, calls, errors, exhausted FROM quota_keys WHERE day = ?",
+            (day or quota_day(),),
+        )
+        rows = {
+            r[0]: {"key_id": r[0], "units": r[1], "calls": r[2], "errors": r[3], "exhausted": bool(r[4])}
+            for r in cur.fetchall()
+        }
+        for key_id in self.key_ids:
+            rows.setdefault(key_id, {"key_id": key_id, "units": 0, "calls": 0, "errors": 0, "exhausted": False})
+        return [rows[k] for k in sorted(rows)]
+
+    def exhausted_keys(self) -> List[str]:
+        cur = self._conn().execute(
+            "SELECT key_id FROM quota_keys WHERE day = ? AND exhausted = 1", (quota_day(),)
+        )
+        return [r[0] for r in cur.fetchall()]
+
+    def mark_key_exhausted(self, key_id: str) -> None:
+        """
+        キーのクォータが尽きたことを記録する（太平洋時間の0時に自然に解除される）
+        """
+        conn = self._conn()
+        conn.execute(
+            """
+            INSERT INTO quota_keys (day, key_id, exhausted) VALUES (?, ?, 1)
+            ON CONFLICT(day, key_id) DO UPDATE SET exhausted = 1
+            """,
+            (quota_day(), key_id),
+        )
+        conn.commit()
+
+    def daily_rows(self, day: Optional[str] = None) -> List[Dict]:
+        cur = self._conn().execute(
+            "SELECT endpoint, units, calls, cache_hits, errors FROM quota_daily"
+            " WHERE day = ? ORDER BY endpoint",
+            (day or quota_day(),),
+        )
+        return [
+            {"endpoint": r[0], "units": r[1], "calls": r[2], "cache_hits": r[3], "errors": r[4]}
+            for r in cur.fetchall()
+        ]
+
+    def _add(
+        self,
+        endpoint: str,
+        units: int = 0,
+        calls: int = 0,
+        cache_hits: int = 0,
+        errors: int = 0,
+        key_id: Optional[str] = None,
+        commit: bool = True,
+    ):
+        conn = self._conn()
+        day = quota_day()
+        conn.execute(
+            """
+            INSERT INTO quota_daily (day, endpoint, units, calls, cache_hits, errors)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day, endpoint) DO UPDATE SET
+                units = units + excluded.units,
+                calls = calls + excluded.calls,
+                cache_hits = cache_hits + excluded.cache_hits,
+                errors = errors + excluded.errors
+            """,
+            (day, endpoint, units, calls, cache_hits, errors),
+        )
+        if key_id is not None:
+            conn.execute(
+                """
+                INSERT INTO quota_keys (day, key_id, units, calls, errors) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(day, key_id) DO UPDATE SET
+                    units = units + excluded.units,
+                    calls = calls + excluded.calls,
+                    errors = errors + excluded.errors
+                """,
+                (day, key_id, units, calls, errors),
+            )
+        if commit:
+            conn.commit()
+        run = current_run.get()
+        if run is not None:
+            run.add(endpoint, units, calls, cache_hits, errors)
+
+    @contextlib.contextmanager
+    def _reserve(self) -> Iterator[sqlite3.Connection]:
+        """
+        予算の確認と計上を1つの BEGIN IMMEDIATE トランザクションで行う
+        （--shard などの別プロセスの計上とは書き込みロックで直列になり、確認してから計上するまでに割り込まれない）
+        """
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def charge(self, endpoint: str, key_id: Optional[str] = None) -> None:
+        """
+        API を1回呼ぶ前に消費ユニットを計上する。予算を超える場合は QuotaBudgetExceeded。
+        key_id を渡すとそのキーの予算（daily_budget）で判定し、キー別にも計上する。
+        """
+        units = quota_cost(endpoint)
+        with self._reserve():
+            if key_id is None:
+                if self.used_today() + units > self.daily_budget:
+                    raise QuotaBudgetExceeded(
+                        f"本日のクォータ予算（{self.daily_budget} units）を超えるため {endpoint} を呼び出せません。"
+                    )
+            elif self.used_by_key(key_id) + units > self.daily_budget:
+                raise QuotaBudgetExceeded(
+                    f"API キー {key_id} の本日の予算（{self.daily_budget} units）を超えるため {endpoint} を呼び出せません。"
+                )
+            self._add(endpoint, units=units, calls=1, key_id=key_id, commit=False)
+
+    def charge_many(self, endpoint: str, count: int, key_id: Optional[str] = None) -> int:
+        """
+        count 回分の呼び出しを予算の範囲でまとめて計上し、計上できた回数を返す（HTTP バッチの送信前に1回だけ）。
+        送らなかった分は refund で取り消す。
+        """
+        units = quota_cost(endpoint)
+        with self._reserve():
+            used = self.used_today() if key_id is None else self.used_by_key(key_id)
+            n = min(count, max(self.daily_budget - used, 0) // units) if units > 0 else count
+            if n > 0:
+                self._add(endpoint, units=units * n, calls=n, key_id=key_id, commit=False)
+        return n
+
+    def refund(self, endpoint: str, count: int, key_id: Optional[str] = None) -> None:
+        """
+        charge_many で計上したが送信されなかった count 回分を取り消す
+        """
+        if count > 0:
+            self._add(endpoint, units=-quota_cost(endpoint) * count, calls=-count, key_id=key_id)
+
+    def record_cache_hit(self, endpoint: str) -> None:
+        self._add(endpoint, cache_hits=1)
+
+    def record_error(self, endpoint: str, key_id: Optional[str] = None) -> None:
+        self._add(endpoint, errors=1, key_id=key_id)
+
+
+@functools.lru_cache(maxsize=None)
+def get_quota_ledger() -> QuotaLedger:
+    return QuotaLedger(settings.quota_db_path, settings.daily_quota_budget)
@@ -0,0 +1,324 @@
+"""
+集計済みチャンネル全体での順位（パーセンタイル）索引
+
+集計のたびにチャンネルの数値指標を SQLite に保存し、メモリ上では指標ごとにソート済み配列を持つ。
+- 「この値は全チャンネル中で何パーセンタイルか」は二分探索で O(log N)
+- 「指標 X の上位 N チャンネル（登録者数帯で絞り込み可）」は帯ごとの配列の末尾を読むだけ
+- 同じチャンネルを集計し直すと古い値を取り除いて差し替える。更新はためておき、次に順位を引くときにまとめて
+  反映する。少数なら insort（1値あたり O(N) の配列の移動。N が数万でも memmove なので速い）、
+  多数なら配列ごと作り直す（O(N log N)）。更新を何度受けても作り直しは次に引くときの1回だけ
+- 他のプロセス（worker・CLI・別のレプリカ）が保存した指標は、settings.ranking_reload_interval 秒ごとに
+  保存先の更新時刻を確かめ、変わった行だけを読み込んで反映する
+"""
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .metrics import METRIC_DEFINITIONS, RECENT_WINDOWS, WINDOW_METRIC_DEFINITIONS, window_key
+from .storage import SQLiteStore
+from .timeline import VIDEO_FORMATS
+
+# 一度に反映する行がこれより多ければ、insort で1件ずつ差し替えずに配列を作り直す
+_INSORT_MAX_ENTRIES = 64
+
+# 登録者数帯 (ラベル, 下限, 上限)。上限 None は上限なし
+SUBSCRIBER_BANDS: List[Tuple[str, int, Optional[int]]] = [
+    ("<10k", 0, 10_000),
+    ("10k-100k", 10_000, 100_000),
+    ("100k-1M", 100_000, 1_000_000),
+    ("1M+", 1_000_000, None),
+]
+
+
+def ranked_metrics(windows: Sequence[int] = RECENT_WINDOWS) -> List[str]:
+    """
+    順位をつける数値指標の一覧
+    """
+    names = ["subscriberCount", "videoCount", "viewCount"] + [name for name, *_ in METRIC_DEFINITIONS]
+    for days in windows:
+        for video_format in (None,) + VIDEO_FORMATS:
+            w = window_key(days, video_format)
+            names += [f"{name}_{w}" for name in ("total_views", "num_videos", "top_views")]
+            names += [name.format(w=w) for name, *_ in WINDOW_METRIC_DEFINITIONS]
+    return names
+
+
+RANKED_METRICS: List[str] = ranked_metrics(RECENT_WINDOWS)
+
+
+def subscriber_band(subscribers: int) -> str:
+    for label, low, high in SUBSCRIBER_BANDS:
+        if subscribers >= low and (high is None or subscribers < high):
+            return label
+    return SUBSCRIBER_BANDS[0][0]
+
+
+def _numeric_metrics(row: Dict, metrics: Sequence[str]) -> Dict[str, float]:
+    return {
+        name: row[name]
+        for name in metrics
+        if isinstance(row.get(name), (int, float)) and not isinstance(row.get(name), bool)
+    }
+
+
+class MetricStore(SQLiteStore):
+    """
+    チャンネルごとの最新の数値指標（索引の永続化先）
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS channel_metrics (
+            channel_id TEXT PRIMARY KEY,
+            title TEXT,
+            subscriber_count INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            metrics TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_channel_metrics_updated ON channel_metrics(updated_at);
+    """
+
+    def put_many(self, entries: List[Tuple[str, Optional[str], int, Dict[str, float]]]) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO channel_metrics VALUES (?, ?, ?, ?, ?)",
+            [(cid, title, subs, now, json.dumps(values)) for cid, title, subs, values in entries],
+        )
+        conn.commit()
+
+    def all(self) -> Iterable[Tuple[str, Optional[str], int, Dict[str, float]]]:
+        return self.updated_since(None)
+
+    def updated_since(self, since: Optional[float]) -> Iterable[Tuple[str, Optional[str], int, Dict[str, float]]]:
+        """
+        updated_at が since 以降の行（since が None なら全行）
+        """
+        cur = self._conn().execute(
+            "SELECT channel_id, title, subscriber_count, metrics FROM channel_metrics WHERE updated_at >= ?",
+            (since if since is not None else float("-inf"),),
+        )
+        for cid, title, subs, metrics in cur.fetchall():
+            yield cid, title, subs, json.loads(metrics)
+
+    def get_many(self, channel_ids: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """
+        {チャンネルID: 前回保存した指標}（保存されていないチャンネルは含まない）
+        """
+        ids = list(dict.fromkeys(channel_ids))
+        out: Dict[str, Dict[str, float]] = {}
+        conn = self._conn()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            cur = conn.execute(
+                f"SELECT channel_id, metrics FROM channel_metrics WHERE channel_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            out.update((cid, json.loads(metrics)) for cid, metrics in cur.fetchall())
+        return out
+
+    def last_updated(self) -> Optional[float]:
+        return self._conn().execute("SELECT MAX(updated_at) FROM channel_metrics").fetchone()[0]
+
+
+class RankingIndex:
+    """
+    指標ごと・（指標, 登録者数帯）ごとの (値, チャンネルID) のソート済み配列
+    """
+
+    def __init__(self, store: Optional[MetricStore] = None, metrics: Sequence[str] = RANKED_METRICS):
+        self.store = store
+        self.metrics = list(metrics)
+        self._lock = threading.Lock()
+        # チャンネルID → (タイトル, 登録者数帯, {指標: 値})
+        self._channels: Dict[str, Tuple[Optional[str], str, Dict[str, float]]] = {}
+        # (指標, 帯 または None) → [(値, チャンネルID)]（昇順）
+        self._sorted: Dict[Tuple[str, Optional[str]], List[Tuple[float, str]]] = {}
+        # まだソート済み配列に反映していない更新（チャンネルID → 最新の値）
+        self._pending: Dict[str, Tuple[str, Optional[str], int, Dict[str, float]]] = {}
+        # 読み込み済みの保存先の更新時刻と、最後に確かめた時刻（_reload_lock の中でだけ読み書きする）
+        self._reload_lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._checked_at = 0.0
+        self.reload(force=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._flush()
+            return len(self._channels)
+
+    def count(self, metric: str, band: Optional[str] = None) -> int:
+        """
+        指標 metric の値を持つチャンネル数（band で登録者数帯を絞り込み）
+        """
+        with self._lock:
+            self._flush()
+            return len(self._sorted.get((metric, band), ()))
+
+    def reload(self, force: bool = False) -> None:
+        """
+        保存先が他のプロセスに更新されていれば、前回の読み込み以降に変わった行だけを反映する。
+        force でなければ settings.ranking_reload_interval 秒に1回だけ確かめる。
+        確かめてから読み込み時刻を進めるまでを _reload_lock の中で行うので、同時に呼ばれても
+        同じ行を二重に読んだり読み込み時刻が戻ったりしない（force でなければ、読み込み中の他のスレッドに任せて返る）。
+        """
+        if self.store is None:
+            return
+        if not self._reload_lock.acquire(blocking=force):
+            return
+        try:
+            now = time.time()
+            if not force and now - self._checked_at < settings.ranking_reload_interval:
+                return
+            self._checked_at = now
+            last = self.store.last_updated()
+            if last is None or (self._loaded_at is not None and last <= self._loaded_at):
+                return
+            # 同じ時刻に書かれた行を取りこぼさないよう、前回の時刻ちょうどの行も読み直す（差し替えなので重複しない）
+            entries = list(self.store.updated_since(self._loaded_at))
+            with self._lock:
+                self._apply(entries)
+            self._loaded_at = last
+        finally:
+            self._reload_lock.release()
+
+    def _apply(self, entries: List[Tuple[str, Optional[str], int, Dict[str, float]]]) -> None:
+        """
+        更新をためる（_lock の中で呼ぶ）。ソート済み配列には次に引くときの _flush でまとめて反映する
+        """
+        for entry in entries:
+            self._pending[entry[0]] = entry
+
+    def _flush(self) -> None:
+        """
+        ためた更新を反映する（_lock の中で呼ぶ）。少数なら insort、多数なら _rebuild で作り直す
+        """
+        if not self._pending:
+            return
+        entries = list(self._pending.values())
+        self._pending.clear()
+        if len(entries) <= _INSORT_MAX_ENTRIES:
+            for entry in entries:
+                self._insert(*entry)
+            return
+        for cid, title, subs, values in entries:
+            self._channels[cid] = (title, subscriber_band(subs), values)
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        sorted_: Dict[Tuple[str, Optional[str]], List[Tuple[float, str]]] = {}
+        for cid, (_, band, values) in self._channels.items():
+            for name, value in values.items():
+                sorted_.setdefault((name, None), []).append((value, cid))
+                sorted_.setdefault((name, band), []).append((value, cid))
+        for arr in sorted_.values():
+            arr.sort()
+        self._sorted = sorted_
+
+    def _insert(self, cid: str, title: Optional[str], subs: int, values: Dict[str, float]) -> None:
+        """
+        1チャンネルの値を差し替える。insort は配列の移動で1値あたり O(N)（多数なら _rebuild を使う）
+        """
+        old = self._channels.get(cid)
+        if old is not None:
+            _, old_band, old_values = old
+            for name, value in old_values.items():
+                for band in (None, old_band):
+                    arr = self._sorted[(name, band)]
+                    i = bisect_left(arr, (value, cid))
+                    if i < len(arr) and arr[i] == (value, cid):
+                        del arr[i]
+        band = subscriber_band(subs)
+        self._channels[cid] = (title, band, values)
+        for name, value in values.items():
+            for key in ((name, None), (name, band)):
+                insort(self._sorted.setdefault(key, []), (value, cid))
+
+    def update(self, rows: List[Dict]) -> None:
+        """
+        1チャンネル1行の指標（compute_channels_metrics の行）を索引に反映し、保存先にも書く
+        """
+        entries = []
+        for row in rows:
+            cid = row.get("channelId")
+            if not cid:
+                continue
+            values = _numeric_metrics(row, self.metrics)
+            entries.append((cid, row.get("title"), int(row.get("subscriberCount") or 0), values))
+        with self._lock:
+            self._apply(entries)
+        if self.store is not None and entries:
+            self.store.put_many(entries)
+
+    def percentile(self, metric: str, value: float, band: Optional[str] = None) -> Optional[float]:
+        """
+        value 以下のチャンネルの割合（0〜100）。その指標のチャンネルがなければ None
+        """
+        with self._lock:
+            self._flush()
+            arr = self._sorted.get((metric, band))
+            if not arr:
+                return None
+            # (value, 最大の文字) で value と等しい値を全て含める
+            return 100.0 * bisect_right(arr, (value, "\U0010ffff")) / len(arr)
+
+    def percentiles(self, row: Dict) -> Dict[str, float]:
+        """
+        行の各指標のパーセンタイル {指標: 0〜100}（索引にない指標は含めない）
+        """
+        out: Dict[str, float] = {}
+        for name, value in _numeric_metrics(row, self.metrics).items():
+            pct = self.percentile(name, value)
+            if pct is not None:
+                out[name] = pct
+        return out
+
+    def top(self, metric: str, n: int = 10, band: Optional[str] = None) -> List[Dict]:
+        """
+        指標 metric の上位 n チャンネル（band で登録者数帯を絞り込み）: [{"channelId", "title", "subscriberBand", metric}]
+        """
+        with self._lock:
+            self._flush()
+            arr = self._sorted.get((metric, band), [])
+            picked = arr[-n:][::-1] if n > 0 else []
+            return [
+                {
+                    "channelId": cid,
+                    "title": self._channels[cid][0],
+                    "subscriberBand": self._channels[cid][1],
+                    metric: value,
+                }
+                for value, cid in picked
+            ]
+
+
+def format_rank(pct: Optional[float], total: int) -> str:
+    """
+    画面・コピー用の順位表記（例: "上位 12% / 340 ch"）。total はその指標の値を持つチャンネル数（RankingIndex.count）
+    """
+    if pct is None or total <= 1:
+        return ""
+    # 自分より大きい値のチャンネル数 + 1 が順位
+    return f"上位 {100.0 - pct + 100.0 / total:.0f}% / {total} ch"
+
+
+@functools.lru_cache(maxsize=None)
+def get_metric_store() -> MetricStore:
+    return MetricStore(settings.ranking_db_path)
+
+
+@functools.lru_cache(maxsize=None)
+def _ranking_index() -> RankingIndex:
+    return RankingIndex(get_metric_store())
+
+
+def get_ranking_index() -> RankingIndex:
+    """
+    プロセス内で共有する索引（他のプロセスの更新を取り込んでから返す）
+    """
+    index = _ranking_index()
+    index.reload()
+    return index
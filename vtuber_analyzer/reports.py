@@ -0,0 +1,121 @@
+"""
+事前計算済みレポートの保存先とウォッチリスト
+
+バックグラウンドワーカー（worker.py）がウォッチリストのチャンネルを定期的に集計してここへ保存し、
+Web アプリは保存済みのレポートが新しければ API を呼ばずにそれを表示する。
+閲覧回数も記録し、ワーカーはよく見られるチャンネルを優先して更新する。
+"""
+import functools
+import json
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from .config import settings
+from .history import snapshot_date
+from .storage import SQLiteStore
+from .utils import utcnow
+
+# 閲覧回数を数える期間（日）
+VIEW_WINDOW_DAYS = 7
+
+
+class ReportStore(SQLiteStore):
+    """
+    チャンネルごとの最新レポート（JSON）・ウォッチリスト・日別閲覧回数
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reports (
+            channel_id TEXT PRIMARY KEY,
+            computed_at REAL NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS watchlist (
+            channel_id TEXT PRIMARY KEY,
+            added_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS report_views (
+            channel_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            views INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (channel_id, day)
+        );
+    """
+
+    # ===== レポート =====
+    def put(self, channel_id: str, report: Dict, computed_at: Optional[float] = None) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO reports VALUES (?, ?, ?)",
+            (channel_id, computed_at or time.time(), json.dumps(report, ensure_ascii=False)),
+        )
+        conn.commit()
+
+    def get(self, channel_id: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        レポートを返す（max_age 秒より古ければ None）。戻り値には computed_at を含める。
+        """
+        row = self._conn().execute(
+            "SELECT computed_at, body FROM reports WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[0] > max_age:
+            return None
+        return {**json.loads(row[1]), "computed_at": row[0]}
+
+    def computed_at(self) -> Dict[str, float]:
+        cur = self._conn().execute("SELECT channel_id, computed_at FROM reports")
+        return dict(cur.fetchall())
+
+    # ===== ウォッチリスト =====
+    def watch(self, channel_ids: List[str]) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR IGNORE INTO watchlist VALUES (?, ?)", [(cid, now) for cid in channel_ids]
+        )
+        conn.commit()
+
+    def unwatch(self, channel_ids: List[str]) -> None:
+        conn = self._conn()
+        conn.executemany("DELETE FROM watchlist WHERE channel_id = ?", [(cid,) for cid in channel_ids])
+        conn.commit()
+
+    def watchlist(self) -> List[str]:
+        cur = self._conn().execute("SELECT channel_id FROM watchlist ORDER BY added_at, channel_id")
+        return [r[0] for r in cur.fetchall()]
+
+    def is_watched(self, channel_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM watchlist WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return row is not None
+
+    # ===== 閲覧回数 =====
+    def record_view(self, channel_id: str) -> None:
+        conn = self._conn()
+        conn.execute(
+            """
+            INSERT INTO report_views (channel_id, day, views) VALUES (?, ?, 1)
+            ON CONFLICT(channel_id, day) DO UPDATE SET views = views + 1
+            """,
+            (channel_id, snapshot_date()),
+        )
+        conn.commit()
+
+    def recent_views(self, days: int = VIEW_WINDOW_DAYS) -> Dict[str, int]:
+        """
+        直近 days 日の閲覧回数 {チャンネルID: 回数}
+        """
+        since = snapshot_date(utcnow() - timedelta(days=days))
+        cur = self._conn().execute(
+            "SELECT channel_id, SUM(views) FROM report_views WHERE day > ? GROUP BY channel_id", (since,)
+        )
+        return {cid: int(n) for cid, n in cur.fetchall()}
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_store() -> ReportStore:
+    return ReportStore(settings.report_db_path)
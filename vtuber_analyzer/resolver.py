@@ -0,0 +1,345 @@
+"""
+URL / ID / ハンドル / 表示名 → チャンネルID(UC〜) の解決
+
+- @handle・/c/・/user/・動画 URL は search().list（100 units）を使わず、
+  channels().list(forHandle / forUsername) や videos().list（1 unit）で解決する
+  （ハンドルが見つからなければ search へフォールバック）
+- 表示名（@ も URL もない入力）は search().list で解決する。同じ文字列のハンドルを持つ無関係な
+  チャンネルに結び付けないよう、forHandle は明示的な @handle・URL にだけ使う
+- 解決できた入力はエイリアス索引（SQLite）に保存し、次回からは API を呼ばない
+  （表示名の解決結果だけは settings.alias_query_max_age で期限切れにする）
+- 複数入力の一括解決では、動画 URL を 50 件ずつまとめて videos().list で引き、
+  独立した問い合わせは HTTP バッチにまとめる
+"""
+import functools
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from .client import api_list_batch
+from .config import settings
+from .quota import quota_cost
+from .storage import SQLiteStore
+from .tracing import annotate, traced
+
+_CHANNEL_ID = re.compile(r"^UC[0-9A-Za-z_-]{22}$")
+_VIDEO_ID = re.compile(r"^[0-9A-Za-z_-]{11}$")
+# ハンドルの後ろに付いたパス・クエリ（@foo/videos、@foo?si=…）
+_HANDLE_SUFFIX = re.compile(r"[/?#].*$")
+
+# 入力の種類ごとの解決コスト（units、search へのフォールバックは含まない）
+_LOOKUP_COST = {"id": 0, "handle": 1, "user": 1, "custom": 2, "query": 0}
+
+
+# ===== 入力の解析（API を呼ばない） =====
+def parse_channel_ref(s: str) -> Tuple[str, str]:
+    """
+    入力を (種類, 値) に分類する。
+    種類: "id"（UC〜）/ "handle"（@〜）/ "user"（/user/〜）/ "custom"（/c/〜）/ "video"（動画ID）/ "query"（その他）
+    """
+    s = (s or "").strip()
+    if _CHANNEL_ID.match(s):
+        return "id", s
+    if s.startswith("@") and " " not in s:
+        return "handle", _HANDLE_SUFFIX.sub("", s)
+
+    if "youtube.com" in s or "youtu.be" in s:
+        url = urlparse(s if "://" in s else "https://" + s)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        host = url.netloc.lower()
+        if host.endswith("youtu.be") and parts:
+            return "video", parts[0]
+        if parts:
+            head = parts[0]
+            if head == "channel" and len(parts) > 1:
+                return "id", parts[1]
+            if head.startswith("@"):
+                return "handle", head
+            if head == "user" and len(parts) > 1:
+                return "user", parts[1]
+            if head == "c" and len(parts) > 1:
+                return "custom", parts[1]
+            if head in ("shorts", "live", "embed") and len(parts) > 1:
+                return "video", parts[1]
+            if head == "watch":
+                vid = (parse_qs(url.query).get("v") or [""])[0]
+                if vid:
+                    return "video", vid
+            # youtube.com/名前（旧形式のカスタム URL）
+            if len(parts) == 1:
+                return "custom", head
+
+    return "query", s
+
+
+def local_channel_id(s: str) -> Optional[str]:
+    """
+    API を呼ばずに分かるチャンネルIDを返す（分からなければ None）
+    """
+    kind, value = parse_channel_ref(s)
+    return value if kind == "id" else None
+
+
+def alias_key(kind: str, value: str) -> str:
+    """
+    エイリアス索引のキー（ハンドル・カスタム URL・表示名は大文字小文字を区別しない）
+    """
+    if kind == "handle":
+        value = value.lstrip("@")
+    if kind != "video":
+        value = value.lower()
+    return f"{kind}:{value}"
+
+
+# ===== エイリアス索引 =====
+class AliasIndex(SQLiteStore):
+    """
+    入力（ハンドル・カスタム URL・動画ID・表示名）→ チャンネルID の対応を永続化する
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS channel_aliases (
+            alias TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            method TEXT NOT NULL,
+            resolved_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_channel_aliases_channel ON channel_aliases(channel_id);
+    """
+    _CHUNK = 500
+
+    def get_many(self, aliases: List[str], now: Optional[float] = None) -> Dict[str, str]:
+        """
+        {alias: チャンネルID}。表示名（query:）の結果は settings.alias_query_max_age を過ぎたら返さない
+        （表示名は一意でなく変わりうるので、search で引き直す）
+        """
+        query_cutoff = (now if now is not None else time.time()) - settings.alias_query_max_age
+        out: Dict[str, str] = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(aliases), self._CHUNK):
+                chunk = aliases[i : i + self._CHUNK]
+                marks = ",".join("?" * len(chunk))
+                cur = conn.execute(
+                    f"SELECT alias, channel_id FROM channel_aliases WHERE alias IN ({marks})"
+                    " AND (alias NOT LIKE 'query:%' OR resolved_at >= ?)",
+                    (*chunk, query_cutoff),
+                )
+                out.update(cur.fetchall())
+        except Exception:
+            pass
+        return out
+
+    def get(self, alias: str) -> Optional[str]:
+        return self.get_many([alias]).get(alias)
+
+    def put_many(self, resolved: Dict[str, Tuple[str, str]]) -> None:
+        """
+        resolved: {alias: (チャンネルID, 解決に使った方法)}
+        """
+        if not resolved:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO channel_aliases VALUES (?, ?, ?, ?)",
+                [(alias, cid, method, now) for alias, (cid, method) in resolved.items()],
+            )
+            conn.commit()
+        except Exception:
+            pass
+
+    def aliases_of(self, channel_id: str) -> List[str]:
+        cur = self._conn().execute(
+            "SELECT alias FROM channel_aliases WHERE channel_id = ? ORDER BY alias", (channel_id,)
+        )
+        return [r[0] for r in cur.fetchall()]
+
+
+@functools.lru_cache(maxsize=None)
+def get_alias_index() -> AliasIndex:
+    return AliasIndex(settings.alias_db_path)
+
+
+# ===== API による解決 =====
+def _lookup_steps(kind: str, value: str) -> List[Tuple[str, str, Dict]]:
+    """
+    動画以外の1件を解決する手順 [(方法, resource, params)]。
+    安い方法から順に並べ、最後に search().list（100 units）へフォールバックする。
+    表示名（query）は search だけ（同じ文字列のハンドルが別人のものであることがあるため forHandle は試さない）。
+    """
+    steps: List[Tuple[str, str, Dict]] = []
+    if kind == "handle":
+        steps.append(("forHandle", "channels", {"forHandle": value}))
+    if kind == "user":
+        steps.append(("forUsername", "channels", {"forUsername": value}))
+    if kind == "custom":
+        # /c/ のカスタム URL は API で直接引けないが、同名のハンドルかユーザー名であることが多い
+        steps.append(("forHandle", "channels", {"forHandle": "@" + value}))
+        steps.append(("forUsername", "channels", {"forUsername": value}))
+    steps.append(("search", "search", {"q": value, "type": "channel", "part": "id,snippet", "maxResults": 3}))
+    return steps
+
+
+# channels().list(forHandle / forUsername) は ID だけ引く（1 unit）
+_CHANNEL_LOOKUP_PARAMS = {"part": "id", "maxResults": 1}
+
+
+def _first_channel_id(resource: str, resp: Optional[Dict]) -> Optional[str]:
+    items = (resp or {}).get("items", [])
+    if not items:
+        return None
+    if resource == "search":
+        # 正しいパスは item["id"]["channelId"]
+        return items[0].get("id", {}).get("channelId")
+    return items[0].get("id")
+
+
+def _resolve_in_rounds(refs: Dict[str, Tuple[str, str]], api_key: str) -> Dict[str, Tuple[Optional[str], str]]:
+    """
+    {エイリアスキー: (種類, 値)} を _lookup_steps の手順ごとのラウンドで解決し、{キー: (チャンネルID, 使った方法)} を返す。
+    各ラウンドでは全入力の現在の手順を resource ごとに HTTP バッチにまとめ、解決できなかった入力だけ次の手順へ進む。
+    """
+    plans = {key: _lookup_steps(kind, value) for key, (kind, value) in refs.items()}
+    out: Dict[str, Tuple[Optional[str], str]] = {key: (None, "") for key in refs}
+    active = list(refs)
+    step = 0
+    while active:
+        by_resource: Dict[str, List[str]] = {}
+        for key in active:
+            by_resource.setdefault(plans[key][step][1], []).append(key)
+        next_active: List[str] = []
+        for resource, keys in by_resource.items():
+            extra = _CHANNEL_LOOKUP_PARAMS if resource == "channels" else {}
+            resps = api_list_batch(api_key, resource, [{**extra, **plans[key][step][2]} for key in keys])
+            for key, resp in zip(keys, resps):
+                cid = _first_channel_id(resource, resp)
+                if cid:
+                    out[key] = (cid, plans[key][step][0])
+                elif step + 1 < len(plans[key]):
+                    next_active.append(key)
+        active = next_active
+        step += 1
+    return out
+
+
+@traced("resolve")
+def resolve_many(entries: List[str], api_key: str) -> Dict[str, Optional[str]]:
+    """
+    複数の入力をまとめてチャンネルIDへ解決する。戻り値: {入力: チャンネルID または None}
+    1. UC〜・/channel/ URL はその場で
+    2. エイリアス索引にあれば API を呼ばずに
+    3. 動画 URL は 50 件ずつまとめて videos().list
+    4. ハンドル・/user/・/c/・表示名は channels().list →（だめなら）search().list を、
+       手順ごとに全入力分を HTTP バッチにまとめて引く
+    解決できたものはエイリアス索引に保存する。
+    """
+    out: Dict[str, Optional[str]] = {}
+    pending: Dict[str, Tuple[str, str]] = {}
+    for entry in entries:
+        if entry in out or entry in pending:
+            continue
+        kind, value = parse_channel_ref(entry)
+        if not value:
+            out[entry] = None
+        elif kind == "id":
+            out[entry] = value
+        else:
+            pending[entry] = (kind, value)
+    annotate(entries=len(entries))
+    if not pending:
+        return out
+
+    index = get_alias_index()
+    keys = {entry: alias_key(kind, value) for entry, (kind, value) in pending.items()}
+    known = index.get_many(list(set(keys.values())))
+    for entry in list(pending):
+        if keys[entry] in known:
+            out[entry] = known[keys[entry]]
+            del pending[entry]
+
+    learned: Dict[str, Tuple[str, str]] = {}
+
+    # 動画ID → 投稿チャンネルID（50 件ずつの videos().list を HTTP バッチで）
+    videos = sorted({value for kind, value in pending.values() if kind == "video" and _VIDEO_ID.match(value)})
+    by_video: Dict[str, str] = {}
+    params = [dict(part="snippet", id=",".join(videos[i : i + 50]), maxResults=50) for i in range(0, len(videos), 50)]
+    for resp in api_list_batch(api_key, "videos", params):
+        for it in (resp or {}).get("items", []):
+            channel_id = (it.get("snippet", {}) or {}).get("channelId")
+            if it.get("id") and channel_id:
+                by_video[it["id"]] = channel_id
+
+    # 大文字小文字違いなど同じエイリアスになる入力は1回だけ解決する
+    others: Dict[str, Tuple[str, str]] = {}
+    for entry, (kind, value) in pending.items():
+        if kind != "video":
+            others.setdefault(keys[entry], (kind, value))
+    by_key = _resolve_in_rounds(others, api_key)
+
+    for entry, (kind, value) in pending.items():
+        if kind == "video":
+            cid, method = by_video.get(value), "videos"
+        else:
+            cid, method = by_key[keys[entry]]
+        out[entry] = cid
+        if cid:
+            learned[keys[entry]] = (cid, method)
+
+    index.put_many(learned)
+    return out
+
+
+def resolve_channel_id_simple(url_or_id: str, api_key: str) -> Optional[str]:
+    """
+    URL / ID / ハンドル / 表示名 からチャンネルID(UC〜)を返す（resolve_many の1件版）
+    """
+    s = (url_or_id or "").strip()
+    if not s:
+        return None
+    return resolve_many([s], api_key).get(s)
+
+
+def resolve_locally(entries: List[str]) -> Dict[str, str]:
+    """
+    API を呼ばずに分かる {入力: チャンネルID}（UC〜 とエイリアス索引にあるもの。見積もり用）
+    """
+    out: Dict[str, str] = {}
+    refs: Dict[str, str] = {}
+    for entry in entries:
+        kind, value = parse_channel_ref(entry)
+        if kind == "id":
+            out[entry] = value
+        elif value:
+            refs[entry] = alias_key(kind, value)
+    known = get_alias_index().get_many(list(set(refs.values()))) if refs else {}
+    out.update((entry, known[key]) for entry, key in refs.items() if key in known)
+    return out
+
+
+def estimate_resolve_cost(entries: List[str]) -> int:
+    """
+    入力一覧の解決に必要なユニット数の目安（エイリアス索引にあるものは 0）。
+    表示名と /c/ は search().list を見込む（ハンドル・/user/ が見つからず search へ進む分は含まない）。
+    """
+    refs = {}
+    for entry in entries:
+        kind, value = parse_channel_ref(entry)
+        if kind != "id" and value:
+            refs[alias_key(kind, value)] = kind
+    known = get_alias_index().get_many(list(refs)) if refs else {}
+    cost = 0
+    videos = 0
+    for key, kind in refs.items():
+        if key in known:
+            continue
+        if kind == "video":
+            videos += 1
+        elif kind in ("query", "custom"):
+            cost += _LOOKUP_COST[kind] + quota_cost("search.list")
+        else:
+            cost += _LOOKUP_COST[kind]
+    return cost + math.ceil(videos / 50)
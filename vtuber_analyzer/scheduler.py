@@ -0,0 +1,169 @@
+"""
+API リクエストのスケジューラ（プロセス内で共有）
+
+- トークンバケットで送信レートを制限する
+- 5xx / 429 / 403 rateLimitExceeded などの一時的なエラーはジッター付き指数バックオフで再試行する
+- 同じキーのリクエストが同時に来たら、1回だけ実行して結果を全員で共有する（single-flight）
+
+Streamlit の各セッションは同じプロセスのスレッドとして動くため、セッションをまたいで効く。
+"""
+import functools
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, Tuple, TypeVar
+
+from .config import settings
+
+T = TypeVar("T")
+
+# 403 のうち、待てば通る（クォータ枯渇ではない）もの
+_RETRYABLE_403_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+class TokenBucket:
+    """
+    rate 個/秒で補充され、最大 capacity 個まで貯まるトークンバケット
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        トークンを1つ取得する（足りなければ補充まで待つ）。待った秒数を返す。
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先にトークンを予約し、不足分だけロック外で待つ（待ち順に公平に並ぶ）
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SingleFlight:
+    """
+    キーごとに実行中の呼び出しを1つに束ねる
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        fn() を実行して (結果, 相乗りしたか) を返す。
+        同じキーの実行中の呼び出しがあれば、それを待って同じ結果（または例外）を受け取る。
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            return fut.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def is_retryable(e: Exception) -> bool:
+    """
+    再試行すれば成功しうるエラーか（5xx、429、403 のレート制限）
+    """
+    from googleapiclient.errors import HttpError
+
+    if not isinstance(e, HttpError):
+        return False
+    status = getattr(e.resp, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    if status >= 500 or status == 429:
+        return True
+    if status == 403:
+        content = getattr(e, "content", b"") or b""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        return any(reason in content for reason in _RETRYABLE_403_REASONS)
+    return False
+
+
+def backoff_delays(retries: int, base: float, cap: float) -> Iterator[float]:
+    """
+    指数バックオフの待ち時間（full jitter: 0〜min(cap, base * 2^n) の一様乱数）
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RequestScheduler:
+    """
+    レート制限・再試行・single-flight をまとめて適用する
+    """
+
+    def __init__(self, rate: float, burst: float, max_retries: int, backoff_base: float, backoff_max: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.flights = SingleFlight()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """
+        送信レートを守りながら fn() を実行し、一時的なエラーならバックオフして再試行する
+        """
+        delays = backoff_delays(self.max_retries, self.backoff_base, self.backoff_max)
+        while True:
+            self.bucket.acquire()
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def run(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        同じ key の実行中リクエストがあれば相乗りし、なければ call(fn) を実行する。
+        (結果, 相乗りしたか) を返す。
+        """
+        return self.flights.do(key, lambda: self.call(fn))
+
+
+@functools.lru_cache(maxsize=None)
+def get_request_scheduler() -> RequestScheduler:
+    """
+    プロセス内で共有するスケジューラ
+    """
+    return RequestScheduler(
+        rate=settings.requests_per_second,
+        burst=settings.request_burst,
+        max_retries=settings.max_retries,
+        backoff_base=settings.backoff_base,
+        backoff_max=settings.backoff_max,
+    )
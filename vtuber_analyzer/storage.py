@@ -0,0 +1,35 @@
+"""
+SQLite 永続化の共通部分
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    ローカル SQLite ファイルに状態を保存するクラスの基底。
+    - sqlite3 の接続はスレッドをまたげないため、スレッドごとに接続を持つ
+    - 複数プロセスからの同時読み書きに備えて WAL を使う
+    - サブクラスは _SCHEMA にテーブル定義を書く
+    """
+
+    _SCHEMA = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self._SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,128 @@
+"""
+公開日時順に並べた動画タイムラインと、任意の直近ウィンドウの集計
+
+uploads と動画 stats を1回だけ取得してタイムラインを作り、各ウィンドウ（直近 d 日）は
+公開日時の二分探索で開始位置を求め、再生回数の累積和の差で合計を出す。
+ウィンドウを増やしても API 呼び出しは増えない（最大ウィンドウ分を1回取得するだけ）。
+動画の形式（ショート / ライブ配信 / 通常動画）ごとの集計は、その形式だけの部分タイムラインで行う。
+"""
+import heapq
+from bisect import bisect_left
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import parse_iso_datetime, utcnow
+
+# 動画の形式（get_videos_stats の format）
+FORMAT_SHORT = "short"
+FORMAT_LIVE = "live"
+FORMAT_VOD = "vod"
+VIDEO_FORMATS: Tuple[str, ...] = (FORMAT_SHORT, FORMAT_LIVE, FORMAT_VOD)
+
+
+class UploadTimeline:
+    """
+    動画を公開日時の昇順に並べ、再生回数の累積和を持つ。
+    stats が取得できなかった動画（削除済みなど）は含めない。
+    """
+
+    __slots__ = ("video_ids", "titles", "published", "formats", "views", "_prefix")
+
+    def __init__(self, uploads: Iterable[Dict], stats: Dict[str, Dict]):
+        entries: List[Tuple[float, str]] = []
+        seen = set()
+        for u in uploads:
+            vid = u.get("videoId")
+            published = parse_iso_datetime(u.get("publishedAt"))
+            if not vid or vid in seen or published is None or vid not in stats:
+                continue
+            seen.add(vid)
+            entries.append((published.timestamp(), vid))
+        entries.sort()
+
+        self.video_ids: List[str] = [vid for _, vid in entries]
+        self.titles: List[str] = [
+            (stats[vid].get("title") or "").replace("\n", " ").strip() for vid in self.video_ids
+        ]
+        self.published: List[float] = [ts for ts, _ in entries]
+        self.formats: List[Optional[str]] = [stats[vid].get("format") for vid in self.video_ids]
+        self.views = np.array([stats[vid].get("viewCount", 0) for vid in self.video_ids], dtype=np.int64)
+        self._prefix = np.concatenate(([0], np.cumsum(self.views)))
+
+    def segment(self, video_format: str) -> "UploadTimeline":
+        """
+        形式が video_format の動画だけの部分タイムライン（形式が不明な動画はどの形式にも入らない）
+        """
+        keep = [i for i, f in enumerate(self.formats) if f == video_format]
+        sub = UploadTimeline.__new__(UploadTimeline)
+        sub.video_ids = [self.video_ids[i] for i in keep]
+        sub.titles = [self.titles[i] for i in keep]
+        sub.published = [self.published[i] for i in keep]
+        sub.formats = [video_format] * len(keep)
+        sub.views = self.views[keep]
+        sub._prefix = np.concatenate(([0], np.cumsum(sub.views)))
+        return sub
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def _start(self, days: float, now_ts: float) -> int:
+        return bisect_left(self.published, now_ts - days * 86400)
+
+    def top(self, days: float, k: int = 1, now: Optional[float] = None) -> List[Tuple[str, int, str]]:
+        """
+        直近 days 日の再生回数上位 k 本を [(videoId, 再生回数, タイトル), ...] で返す
+        """
+        now_ts = now if now is not None else utcnow().timestamp()
+        start = self._start(days, now_ts)
+        idx = heapq.nlargest(k, range(start, len(self)), key=lambda i: (self.views[i], -i))
+        return [(self.video_ids[i], int(self.views[i]), self.titles[i]) for i in idx]
+
+    def window(self, days: float, top_k: int = 1, now: Optional[float] = None) -> Dict:
+        """
+        直近 days 日に公開された動画の集計。
+        {"total_views", "num_videos", "top_videos", "top_video_id", "top_views", "top_title",
+         "top_share", "avg_views_per_video"}
+        """
+        now_ts = now if now is not None else utcnow().timestamp()
+        start = self._start(days, now_ts)
+        total_views = int(self._prefix[-1] - self._prefix[start])
+        num_videos = len(self) - start
+        top_videos = self.top(days, top_k, now_ts)
+        top_video_id, top_views, top_title = top_videos[0] if top_videos else (None, 0, "")
+        return {
+            "total_views": total_views,
+            "num_videos": num_videos,
+            "top_videos": top_videos,
+            "top_video_id": top_video_id,
+            "top_views": top_views,
+            "top_title": top_title,
+            "top_share": round(top_views / total_views, 4) if total_views > 0 else 0.0,
+            "avg_views_per_video": round(total_views / num_videos, 2) if num_videos > 0 else 0.0,
+        }
+
+    def covered(self, days: float, video_ids: AbstractSet[str], now: Optional[float] = None) -> Tuple[int, int]:
+        """
+        直近 days 日に公開された動画のうち video_ids に含まれるものの (本数, 再生回数の合計)
+        """
+        now_ts = now if now is not None else utcnow().timestamp()
+        keep = [i for i in range(self._start(days, now_ts), len(self)) if self.video_ids[i] in video_ids]
+        return len(keep), (int(self.views[keep].sum()) if keep else 0)
+
+    def windows(self, days_list: Iterable[float], top_k: int = 1, now: Optional[float] = None) -> Dict[float, Dict]:
+        """
+        複数ウィンドウの集計を {日数: window() の結果} でまとめて返す（同じ基準時刻で揃える）
+        """
+        now_ts = now if now is not None else utcnow().timestamp()
+        return {days: self.window(days, top_k, now_ts) for days in days_list}
+
+    def windows_by_format(
+        self, days_list: Iterable[float], top_k: int = 1, now: Optional[float] = None
+    ) -> Dict[str, Dict[float, Dict]]:
+        """
+        形式ごとの windows() の結果 {形式: {日数: 集計}}（VIDEO_FORMATS の全形式）
+        """
+        now_ts = now if now is not None else utcnow().timestamp()
+        days_list = list(days_list)
+        return {fmt: self.segment(fmt).windows(days_list, top_k, now_ts) for fmt in VIDEO_FORMATS}
@@ -0,0 +1,243 @@
+"""
+処理段階ごとの計測（スパン）と遅い実行のログ
+
+`with span("fetch.videos_stats"):` や `@traced(...)` で各段階を囲むと、実行中のトレース（current_trace）に
+所要時間・API リクエスト数・キャッシュヒット / ミス・レスポンスサイズが記録される。
+- current_trace が None のとき span は何もしない（計測しない実行のコストはほぼゼロ）
+- submit_fetch は contextvars を引き継ぐので、ワーカースレッドのスパンも投入元のスパンの子になる
+- API 呼び出しの数値は、そのスパンと全ての祖先スパンに加算する（上位の段階で合計が見える）
+- settings.slow_run_seconds 以上かかった実行は、ローカルの遅い実行ログ（件数上限つき）に保存する
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .config import settings
+from .storage import SQLiteStore
+
+# API 呼び出しについて数える項目
+CALL_COUNTERS = ("requests", "cache_hits", "cache_misses", "revalidated", "bytes", "batches")
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "start", "duration", "attrs")
+
+    def __init__(self, span_id: int, parent: Optional["Span"], name: str, start: float, attrs: Dict):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attrs = attrs
+
+    def depth(self) -> int:
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+
+class Trace:
+    """
+    1回の実行（Web アプリの集計1回、CLI の1コマンド）のスパンの記録
+    """
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._ended: Optional[float] = None
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self._ended if self._ended is not None else time.perf_counter()) - self._t0
+
+    def open(self, name: str, parent: Optional[Span], attrs: Dict) -> Span:
+        with self._lock:
+            s = Span(len(self.spans) + 1, parent, name, time.perf_counter(), dict(attrs))
+            self.spans.append(s)
+        return s
+
+    def add(self, s: Span, key: str, n: int = 1) -> None:
+        with self._lock:
+            while s is not None:
+                s.attrs[key] = s.attrs.get(key, 0) + n
+                s = s.parent
+
+    def finish(self) -> float:
+        if self._ended is None:
+            self._ended = time.perf_counter()
+        return self.duration
+
+    def rows(self) -> List[Dict]:
+        """
+        開始順のスパン一覧（name は深さに応じて字下げ）。表示用
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        rows: List[Dict] = []
+        for s in spans:
+            rows.append(
+                {
+                    "span": "  " * s.depth() + s.name,
+                    "start_ms": round((s.start - self._t0) * 1000, 1),
+                    "duration_ms": round(s.duration * 1000, 1) if s.duration is not None else None,
+                    **{k: s.attrs.get(k, 0) for k in CALL_COUNTERS},
+                    **{k: v for k, v in s.attrs.items() if k not in CALL_COUNTERS},
+                }
+            )
+        return rows
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = [
+                {
+                    "id": s.id,
+                    "parent_id": s.parent.id if s.parent else None,
+                    "name": s.name,
+                    "start_ms": round((s.start - self._t0) * 1000, 3),
+                    "duration_ms": round(s.duration * 1000, 3) if s.duration is not None else None,
+                    "attrs": dict(s.attrs),
+                }
+                for s in self.spans
+            ]
+        return {
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": spans,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+
+# 実行中のトレースと、いま開いているスパン（submit_fetch が contextvars ごとワーカーへ引き継ぐ）
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    s = trace.open(name, _current_span.get(), attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    finally:
+        s.duration = time.perf_counter() - s.start
+        _current_span.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """
+    関数全体を1つのスパンで囲むデコレータ
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def annotate(**attrs) -> None:
+    """
+    いま開いているスパンに属性（件数など）を付ける
+    """
+    s = _current_span.get()
+    if s is not None:
+        s.attrs.update(attrs)
+
+
+def note_api_call(outcome: str, body: Optional[Dict] = None) -> None:
+    """
+    API の list 呼び出し1回を、いま開いているスパンとその祖先に記録する。
+    outcome: "hit"（キャッシュ・相乗り）/ "miss"（取得した）/ "revalidated"（304）
+    """
+    trace = current_trace.get()
+    s = _current_span.get()
+    if trace is None or s is None:
+        return
+    trace.add(s, "requests")
+    trace.add(s, {"hit": "cache_hits", "miss": "cache_misses"}.get(outcome, outcome))
+    if body is not None and outcome == "miss":
+        trace.add(s, "bytes", len(json.dumps(body, ensure_ascii=False).encode("utf-8")))
+
+
+def note_batch() -> None:
+    trace = current_trace.get()
+    s = _current_span.get()
+    if trace is not None and s is not None:
+        trace.add(s, "batches")
+
+
+# ===== 遅い実行のログ =====
+class SlowRunLog(SQLiteStore):
+    """
+    閾値を超えた実行のトレース（新しい max_entries 件だけを残す）
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS slow_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            label TEXT,
+            duration_ms REAL NOT NULL,
+            trace TEXT NOT NULL
+        );
+    """
+
+    def add(self, trace: Trace, max_entries: Optional[int] = None) -> None:
+        max_entries = max_entries or settings.slow_log_max_entries
+        body = trace.to_dict()
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO slow_runs (started_at, label, duration_ms, trace) VALUES (?, ?, ?, ?)",
+            (trace.started_at, trace.label, body["duration_ms"], json.dumps(body, ensure_ascii=False)),
+        )
+        conn.execute("DELETE FROM slow_runs WHERE id <= ?", (cur.lastrowid - max_entries,))
+        conn.commit()
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        cur = self._conn().execute(
+            "SELECT id, started_at, label, duration_ms FROM slow_runs ORDER BY id DESC LIMIT ?", (limit,)
+        )
+        return [
+            {"id": i, "started_at": started_at, "label": label, "duration_ms": duration_ms}
+            for i, started_at, label, duration_ms in cur.fetchall()
+        ]
+
+    def get(self, run_id: int) -> Optional[Dict]:
+        row = self._conn().execute("SELECT trace FROM slow_runs WHERE id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+@functools.lru_cache(maxsize=None)
+def get_slow_run_log() -> SlowRunLog:
+    return SlowRunLog(settings.slow_log_db_path)
+
+
+def finish_trace(trace: Trace) -> bool:
+    """
+    トレースを閉じ、閾値（settings.slow_run_seconds）以上かかっていれば遅い実行ログに保存する。
+    保存したかどうかを返す。
+    """
+    duration = trace.finish()
+    if settings.slow_run_seconds > 0 and duration >= settings.slow_run_seconds:
+        get_slow_run_log().add(trace)
+        return True
+    return False
@@ -0,0 +1,32 @@
+"""
+共通の小さなヘルパ
+"""
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+_ISO_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def parse_iso_datetime(raw: Optional[str]) -> Optional[datetime]:
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+
+def parse_iso_duration(raw: Optional[str]) -> Optional[int]:
+    """
+    ISO 8601 の期間（contentDetails.duration、例: PT1H2M3S）を秒数に。解釈できなければ None
+    """
+    m = _ISO_DURATION.match(raw or "")
+    if not m or raw == "P":
+        return None
+    days, hours, minutes, seconds = (int(x or 0) for x in m.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def utcnow() -> datetime:
+    return datetime.utcnow().replace(tzinfo=timezone.utc)
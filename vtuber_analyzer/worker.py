@@ -0,0 +1,146 @@
+"""
+バックグラウンドの事前計算ワーカー
+
+ウォッチリストのチャンネルを定期的に集計してレポートストアに保存する。cron から
+`vtuber-analyzer worker --once` を呼ぶか、`vtuber-analyzer worker` で常駐させる。
+更新の順番は優先度キュー（heapq）で決め、古いレポート・よく閲覧されるチャンネルほど先に更新する。
+"""
+import heapq
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .analysis import analyze_cohort, plan_quota
+from .config import settings
+from .export import CohortDetails
+from .history import get_snapshot_store
+from .metrics import top_playlists
+from .quota import QuotaError
+from .ranking import get_ranking_index
+from .reports import ReportStore, get_report_store
+
+logger = logging.getLogger(__name__)
+
+# 一度も計算していないチャンネルの優先度
+NEVER_COMPUTED = math.inf
+# 常駐ワーカーが続けて失敗したときの待ち時間の上限（秒）
+MAX_BACKOFF_SECONDS = 3600.0
+
+
+def refresh_priority(age: Optional[float], views: int, interval: float) -> float:
+    """
+    (レポートの経過秒数 ÷ 更新間隔) × (1 + log(1 + 直近の閲覧回数))。大きいほど先に更新する。
+    age が None（未計算）なら最優先。
+    """
+    if age is None:
+        return NEVER_COMPUTED
+    return age / max(interval, 1.0) * (1.0 + math.log1p(views))
+
+
+def due_channels(store: ReportStore, interval: Optional[float] = None) -> List[Tuple[float, str]]:
+    """
+    更新間隔を過ぎた（または未計算の）ウォッチリストのチャンネルを優先度の高い順に返す: [(優先度, チャンネルID)]
+    """
+    interval = interval or settings.report_refresh_interval
+    computed = store.computed_at()
+    views = store.recent_views()
+    now = time.time()
+    heap: List[Tuple[float, str]] = []
+    for cid in store.watchlist():
+        age = now - computed[cid] if cid in computed else None
+        if age is not None and age < interval:
+            continue
+        heapq.heappush(heap, (-refresh_priority(age, views.get(cid, 0), interval), cid))
+    return [(-neg, cid) for neg, cid in (heapq.heappop(heap) for _ in range(len(heap)))]
+
+
+def build_reports(
+    channel_ids: List[str], api_key: str, include_playlists: bool = True, playlist_index: bool = False
+) -> Dict[str, Dict]:
+    """
+    analyze_cohort でまとめて集計し、チャンネルごとのレポート {basic, metrics, top_playlists, growth} を返す
+    （基本情報とプレイリストは analyze_cohort が取得したものを CohortDetails で受け取る）
+    """
+    details = CohortDetails(keep_rows=False)
+    rows = analyze_cohort(
+        channel_ids,
+        api_key,
+        include_playlists=include_playlists,
+        store=get_snapshot_store(),
+        details=details,
+        ranking=get_ranking_index(),
+        playlist_index=playlist_index,
+    )
+    snapshots = get_snapshot_store()
+    reports: Dict[str, Dict] = {}
+    for row in rows:
+        cid = row["channelId"]
+        reports[cid] = {
+            "basic": details.basics[cid],
+            "metrics": row,
+            "top_playlists": top_playlists(details.top_playlists.get(cid, []), 5),
+            "growth": snapshots.growth(cid),
+        }
+    return reports
+
+
+def run_once(
+    api_key: str,
+    store: Optional[ReportStore] = None,
+    batch_size: int = 50,
+    limit: Optional[int] = None,
+    playlist_index: bool = False,
+) -> List[str]:
+    """
+    更新が必要なチャンネルを優先度順に batch_size ずつ集計して保存し、更新したチャンネルIDを返す。
+    クォータが足りなくなった時点で止める（残りは次回に持ち越す）。
+    それ以外の例外で失敗したバッチはログに残して飛ばし、次のバッチに進む（飛ばした分は次回に持ち越す）。
+    """
+    store = store or get_report_store()
+    queue = [cid for _, cid in due_channels(store)]
+    if limit is not None:
+        queue = queue[:limit]
+
+    updated: List[str] = []
+    for start in range(0, len(queue), batch_size):
+        batch = queue[start:start + batch_size]
+        try:
+            include_playlists = plan_quota(batch, True, playlist_index=playlist_index)
+            if include_playlists is None:
+                break
+            reports = build_reports(batch, api_key, include_playlists, playlist_index)
+            for cid, report in reports.items():
+                store.put(cid, report)
+                updated.append(cid)
+        except QuotaError:
+            break
+        except Exception:
+            logger.exception("worker: %d チャンネルのバッチの集計に失敗しました（次回に持ち越します）", len(batch))
+    return updated
+
+
+def run_forever(
+    api_key: str,
+    poll_interval: float = 60.0,
+    batch_size: int = 50,
+    playlist_index: bool = False,
+    iterations: Optional[int] = None,
+) -> None:
+    """
+    poll_interval 秒ごとに run_once を繰り返す（Ctrl+C で終了。iterations を渡すとその回数で終了）。
+    run_once が例外で失敗しても止まらず、続けて失敗するたびに待ち時間を倍にする（上限 MAX_BACKOFF_SECONDS）。
+    """
+    store = get_report_store()
+    failures = 0
+    done = 0
+    while iterations is None or done < iterations:
+        try:
+            run_once(api_key, store, batch_size, playlist_index=playlist_index)
+            failures = 0
+        except Exception:
+            failures += 1
+            logger.exception("worker: 更新に失敗しました（%d 回連続）", failures)
+        done += 1
+        if iterations is None or done < iterations:
+            time.sleep(min(poll_interval * 2**failures, max(poll_interval, MAX_BACKOFF_SECONDS)))